@@ -0,0 +1,280 @@
+"""
+Voice blob decoding: any container a client sends, to the 16-bit mono PCM at
+the rate the recognizer wants.
+
+sniff_format() names the container from its magic bytes. WAV, which is
+already PCM, never leaves the server process. wav_to_pcm() finds the data
+chunk in place and converts it only as far as needed. The common case
+(16-bit mono at the target rate) is a single copy of the samples.
+Everything else is downmixed first, while the data is largest, then
+widened and resampled with audioop.
+
+Compressed input (WebM/Opus from MediaRecorder, Ogg, MP4, MP3, FLAC) goes to
+a DecodeWorkerPool of long-lived processes. Each worker builds its decoder
+once. With PyAV that means libav is loaded once per worker, and clips are
+decoded, downmixed and resampled in one pass inside the worker, with no
+process started per clip. PyAV is in requirements.txt. Only when it is
+missing does the worker fall back to the ffmpeg binary, which still does the
+whole conversion in one pass (-ac 1 -ar RATE -f s16le) but is started once
+per clip, from the worker rather than from a thread of the server. Blobs and
+PCM cross the worker pipe as raw bytes.
+"""
+
+import audioop
+import importlib.util
+import io
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+
+from worker_pool import Worker, WorkerPool
+
+log = logging.getLogger("voicebot.decode")
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioDecodeError(Exception):
+    """A blob could not be decoded, or no decoder is available for it."""
+
+
+class DecodeWorkerError(AudioDecodeError):
+    """A decode job timed out, or the worker died while running it."""
+
+
+def sniff_format(blob) -> str:
+    """Container of a voice blob from its first bytes: wav, webm, ogg, flac, mp4, mp3, aac, or None"""
+    head = bytes(memoryview(blob).cast("B")[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"\x1a\x45\xdf\xa3":  # EBML header: WebM and Matroska
+        return "webm"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE6 == 0xE2):
+        return "mp3"  # ID3 tag, or an MPEG audio layer III frame sync
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xF6 == 0xF0:
+        return "aac"  # ADTS frame sync
+    return None
+
+
+def parse_wav(blob):
+    """(format tag, channels, sample rate, sample width, data) of a WAV blob; data is a
+    memoryview into the blob, cut to whole frames"""
+    view = memoryview(blob).cast("B")
+    if sniff_format(view) != "wav":
+        raise AudioDecodeError("not a WAV file")
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(view):
+        chunk_id = bytes(view[pos:pos + 4])
+        size = int.from_bytes(view[pos + 4:pos + 8], "little")
+        body = pos + 8
+        if chunk_id == b"fmt ":
+            if size < 16:
+                raise AudioDecodeError("WAV fmt chunk is too short")
+            tag, channels, rate, _, block_align, bits = struct.unpack_from("<HHIIHH", view, body)
+            if tag == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                tag = struct.unpack_from("<H", view, body + 24)[0]  # first two bytes of the SubFormat GUID
+            fmt = (tag, channels, rate, (bits + 7) // 8, block_align)
+        elif chunk_id == b"data":
+            if fmt is None:
+                raise AudioDecodeError("WAV data chunk comes before fmt")
+            # Recorders that stream WAV leave the size at 0 or 0xFFFFFFFF: the data runs to the end
+            end = len(view) if size in (0, 0xFFFFFFFF) else min(len(view), body + size)
+            tag, channels, rate, width, block_align = fmt
+            data = view[body:end]
+            if block_align:
+                data = data[:len(data) - len(data) % block_align]
+            return tag, channels, rate, width, data
+        pos = body + size + (size & 1)  # chunks are word aligned
+    raise AudioDecodeError("WAV has no data chunk")
+
+
+def wav_to_pcm(blob, sample_rate: int, convert: bool = True):
+    """16-bit mono PCM at sample_rate from a PCM WAV blob, converted in process.
+
+    Returns None for WAV this cannot convert (float samples, more than two
+    channels), which a decoder worker handles, and with convert=False for
+    anything that is not already in the target format.
+    """
+    tag, channels, rate, width, data = parse_wav(blob)
+    if tag != WAVE_FORMAT_PCM or width not in (1, 2, 3, 4) or channels not in (1, 2) or not rate:
+        return None
+    if not convert and (channels, width, rate) != (1, 2, sample_rate):
+        return None
+    pcm = data
+    if width == 1:
+        pcm = audioop.bias(pcm, 1, -128)  # 8-bit WAV is unsigned; centre it before channels are averaged
+    if channels == 2:
+        pcm = audioop.tomono(pcm, width, 0.5, 0.5)
+    if width != 2:
+        pcm = audioop.lin2lin(pcm, width, 2)
+    if rate != sample_rate:
+        pcm = audioop.ratecv(pcm, 2, 1, rate, sample_rate, None)[0]
+    return bytes(pcm)
+
+
+class PyAVDecoder:
+    """Decodes, downmixes and resamples in process with libav (pip install av)."""
+    name = "pyav"
+
+    def __init__(self, sample_rate: int):
+        import av
+        self.av = av
+        self.sample_rate = sample_rate
+
+    def decode(self, blob, fmt=None) -> bytes:
+        out = bytearray()
+        with self.av.open(io.BytesIO(blob), mode="r") as container:
+            if not container.streams.audio:
+                raise AudioDecodeError("no audio stream")
+            resampler = self.av.AudioResampler(format="s16", layout="mono", rate=self.sample_rate)
+            for frame in container.decode(container.streams.audio[0]):
+                for chunk in resampler.resample(frame) or ():
+                    out += memoryview(chunk.planes[0])[:chunk.samples * 2]
+            for chunk in resampler.resample(None) or ():  # flush what the resampler holds back
+                out += memoryview(chunk.planes[0])[:chunk.samples * 2]
+        return bytes(out)
+
+
+class FFmpegDecoder:
+    """Runs the ffmpeg binary per clip, converting to the target PCM in the same pass."""
+    name = "ffmpeg"
+
+    def __init__(self, sample_rate: int, binary: str = None, timeout: float = 60.0):
+        self.binary = binary or shutil.which("ffmpeg")
+        if not self.binary:
+            raise AudioDecodeError("ffmpeg not found")
+        self.sample_rate = sample_rate
+        self.timeout = timeout
+
+    def decode(self, blob, fmt=None) -> bytes:
+        base = [self.binary, "-hide_banner", "-loglevel", "error"]
+        output = ["-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(self.sample_rate), "pipe:1"]
+        if fmt == "mp4":
+            # MP4 often has its index at the end, which ffmpeg cannot seek to in a pipe
+            # (delete=False: Windows will not let ffmpeg open a file that is still open here)
+            with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as f:
+                f.write(blob)
+            try:
+                return self._run(base + ["-nostdin", "-i", f.name] + output, None)
+            finally:
+                os.unlink(f.name)
+        return self._run(base + ["-i", "pipe:0"] + output, blob)
+
+    def _run(self, args, stdin):
+        try:
+            result = subprocess.run(args, input=stdin, capture_output=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise AudioDecodeError(f"ffmpeg took longer than {self.timeout:.0f}s")
+        if result.returncode != 0:
+            message = result.stderr.decode(errors="replace").strip().splitlines()
+            raise AudioDecodeError(f"ffmpeg: {message[-1] if message else f'exit code {result.returncode}'}")
+        return result.stdout
+
+
+DECODERS = {"pyav": PyAVDecoder, "ffmpeg": FFmpegDecoder}
+
+
+def create_decoder(name: str, sample_rate: int):
+    """Default decoder factory: the named decoder, or for "auto" PyAV if installed, else ffmpeg"""
+    if name == "auto":
+        name = "pyav" if importlib.util.find_spec("av") is not None else "ffmpeg"
+        if name == "ffmpeg" and not shutil.which("ffmpeg"):
+            raise AudioDecodeError("no audio decoder: install PyAV (pip install av) or ffmpeg")
+    if name not in DECODERS:
+        raise ValueError(f"Unknown audio decoder '{name}' (choose from auto, {', '.join(DECODERS)})")
+    return DECODERS[name](sample_rate)
+
+
+def worker_main(conn, decoder_factory, name, sample_rate):
+    """Worker process loop: build one decoder, then decode clips until told to stop"""
+    try:
+        decoder = decoder_factory(name, sample_rate)
+    except Exception as e:
+        conn.send(("ready", False, f"Error starting audio decoder: {e}"))
+        return
+    conn.send(("ready", True, getattr(decoder, "name", name)))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        job_id, fmt = job
+        blob = conn.recv_bytes()
+        try:
+            pcm = decoder.decode(blob, fmt)
+        except Exception as e:
+            conn.send((job_id, str(e) or type(e).__name__))
+            continue
+        conn.send((job_id, None))
+        conn.send_bytes(pcm)
+
+
+class _Worker(Worker):
+    """Sends the blob and receives the PCM as raw bytes rather than pickled."""
+    def _send_job(self, job_id, payload):
+        blob, fmt = payload
+        self.conn.send((job_id, fmt))
+        self.conn.send_bytes(blob)
+
+    def _recv_reply(self):
+        reply_id, error = self.conn.recv()
+        pcm = self.conn.recv_bytes() if error is None else None
+        return reply_id, pcm, error
+
+
+class DecodeWorkerPool(WorkerPool):
+    """Pool of decoder processes, each owning one decoder."""
+    label = "audio decode"
+    error_type = DecodeWorkerError
+    worker_type = _Worker
+    log = log
+
+    def __init__(self, workers: int = 2, sample_rate: int = 16000, decoder: str = "auto",
+                 job_timeout: float = 60.0, decoder_factory=create_decoder, start_timeout: float = 30.0,
+                 start_method: str = None):
+        super().__init__(workers, job_timeout, start_timeout, start_method, thread_name_prefix="decode-worker-io")
+        self.sample_rate = sample_rate
+        self.decoder = decoder
+        self.decoder_factory = decoder_factory
+        self.clips_done = 0
+        self.failures = 0
+
+    def _worker_target(self):
+        return worker_main, (self.decoder_factory, self.decoder, self.sample_rate)
+
+    def _describe(self):
+        return f"'{self._workers[0].detail}' audio decode"
+
+    async def decode(self, blob, fmt: str = None) -> bytes:
+        """16-bit mono PCM at sample_rate for a compressed voice blob, decoded on an idle worker"""
+        try:
+            pcm, error = await self._submit((blob, fmt))
+        except DecodeWorkerError:
+            self.failures += 1
+            raise
+        if error:
+            self.failures += 1
+            raise AudioDecodeError(error)
+        self.clips_done += 1
+        return pcm
+
+    def stats(self) -> dict:
+        return {
+            "decoder": self._workers[0].detail if self._workers else self.decoder,
+            **super().stats(),
+            "clips_done": self.clips_done,
+            "failures": self.failures,
+        }
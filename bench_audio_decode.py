@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark for voice blob decoding on a corpus of webm/ogg/wav fixtures:
+latency, throughput and event-loop lag while CONCURRENCY clips decode at once.
+
+  legacy  - the previous decoder: sr.AudioFile for WAV, otherwise pydub
+            (one ffmpeg process per clip), in a default-executor thread,
+            then get_raw_data() to 16 kHz 16-bit as the recognizer would
+  current - server.decode_audio: WAV in process, everything else on the
+            long-lived DecodeWorkerPool, straight to 16 kHz mono 16-bit
+
+The corpus is every audio file in --corpus DIR, or a generated one: a few
+seconds of a speech-like signal as WAV in several layouts and, when ffmpeg
+is on PATH, encoded to WebM/Opus, Ogg/Opus and Ogg/Vorbis the way browsers
+record it. Compressed fixtures need a decoder (PyAV or ffmpeg); without one
+both variants report every clip as failed.
+
+Usage: python bench_audio_decode.py [--corpus DIR] [--concurrency N] [--rounds N]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import wave
+
+import server
+from audio_decode import sniff_format
+
+CONCURRENCY = 8
+ROUNDS = 5
+SECONDS = 4
+AUDIO_EXTENSIONS = (".wav", ".webm", ".ogg", ".opus", ".oga", ".mp4", ".m4a", ".mp3", ".flac")
+
+
+def speech_like_wav(rate, channels, width, seconds=SECONDS):
+    """Syllable-rate amplitude-modulated harmonics, roughly the spectrum of a voice"""
+    frames = bytearray()
+    peak = 2 ** (8 * width - 1) - 1
+    for i in range(int(rate * seconds)):
+        t = i / rate
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 4 * t)
+        value = envelope * sum(math.sin(2 * math.pi * f * t) / n for n, f in enumerate((140, 280, 560, 1120), 1)) / 2.1
+        sample = bytes([int(128 + value * 127)]) if width == 1 else \
+            int(value * peak).to_bytes(width, "little", signed=True)
+        frames += sample * channels
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(width)
+        wf.setframerate(rate)
+        wf.writeframes(bytes(frames))
+    return buf.getvalue()
+
+
+def generated_corpus(tempdir):
+    """{name: blob}, plus the names of fixtures that could not be made here"""
+    corpus = {
+        "wav 16k mono s16": speech_like_wav(16000, 1, 2),
+        "wav 48k stereo s16": speech_like_wav(48000, 2, 2),
+        "wav 44.1k mono u8": speech_like_wav(44100, 1, 1),
+    }
+    encodings = {
+        "webm/opus 48k": ("webm", ["-c:a", "libopus", "-b:a", "32k"]),
+        "ogg/opus 48k": ("ogg", ["-c:a", "libopus", "-b:a", "32k"]),
+        "ogg/vorbis 44.1k": ("ogg", ["-c:a", "libvorbis", "-ar", "44100", "-q:a", "3"]),
+    }
+    ffmpeg = shutil.which("ffmpeg")
+    skipped = []
+    source = os.path.join(tempdir, "source.wav")
+    with open(source, "wb") as f:
+        f.write(corpus["wav 48k stereo s16"])
+    for name, (ext, args) in encodings.items():
+        target = os.path.join(tempdir, f"{name.replace('/', '_').replace(' ', '_')}.{ext}")
+        if ffmpeg and subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-i", source] + args + [target]).returncode == 0:
+            with open(target, "rb") as f:
+                corpus[name] = f.read()
+        else:
+            skipped.append(name)
+    return corpus, skipped
+
+
+def load_corpus(directory):
+    corpus = {}
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(AUDIO_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+def legacy_decode(blob):
+    import speech_recognition as sr
+    if sniff_format(blob) == "wav":
+        with sr.AudioFile(io.BytesIO(blob)) as source:
+            audio = sr.AudioData(source.stream.read(), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+    else:
+        from pydub import AudioSegment
+        sound = AudioSegment.from_file(io.BytesIO(blob)).set_channels(1)
+        audio = sr.AudioData(sound.raw_data, sound.frame_rate, sound.sample_width)
+    return audio.get_raw_data(convert_rate=16000, convert_width=2)
+
+
+async def current_decode(blob):
+    return (await server.decode_audio(blob)).get_raw_data(convert_rate=16000, convert_width=2)
+
+
+async def legacy_decode_async(blob):
+    return await asyncio.to_thread(legacy_decode, blob)
+
+
+async def run_case(variant, name, blob, concurrency, rounds):
+    decode = current_decode if variant == "current" else legacy_decode_async
+    try:
+        await decode(blob)  # imports and worker start-up stay outside the measurement
+    except Exception:
+        pass
+    latencies, failures, errors = [], 0, set()
+    max_lag = 0.0
+    running = True
+
+    async def watch_loop():
+        nonlocal max_lag
+        loop = asyncio.get_running_loop()
+        while running:
+            expected = loop.time() + 0.005
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, loop.time() - expected)
+
+    async def one():
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            await decode(blob)
+        except Exception as e:
+            failures += 1
+            errors.add(str(e)[:120])
+            return
+        latencies.append(time.perf_counter() - start)
+
+    watcher = asyncio.create_task(watch_loop())
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    running = False
+    await watcher
+    latencies.sort()
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1) if latencies else None
+    return {"fixture": name, "format": sniff_format(blob), "kb": round(len(blob) / 1024), "variant": variant,
+            "p50_ms": percentile(0.5), "p95_ms": percentile(0.95),
+            "clips_per_s": round(len(latencies) / wall, 1), "failures": failures,
+            "max_loop_lag_ms": round(max_lag * 1000, 1), "errors": sorted(errors)}
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tempdir:
+        server.AUDIO_LOG_DIR = tempdir  # the current path keeps each blob, as the server does
+        if args.corpus:
+            corpus, skipped = load_corpus(args.corpus), []
+        else:
+            corpus, skipped = generated_corpus(tempdir)
+        results = []
+        try:
+            for name, blob in corpus.items():
+                for variant in ("legacy", "current"):
+                    results.append(await run_case(variant, name, blob, args.concurrency, args.rounds))
+        finally:
+            server.decode_pool.shutdown()
+    print(f"{'fixture':>20} {'variant':>8} {'p50':>9} {'p95':>9} {'clips/s':>8} {'loop lag':>9} failures")
+    for r in results:
+        p50 = f"{r['p50_ms']}ms" if r['p50_ms'] is not None else "-"
+        p95 = f"{r['p95_ms']}ms" if r['p95_ms'] is not None else "-"
+        print(f"{r['fixture'][:20]:>20} {r['variant']:>8} {p50:>9} {p95:>9} {r['clips_per_s']:>8} "
+              f"{r['max_loop_lag_ms']:>7}ms {r['failures']}")
+    if skipped:
+        print(f"Skipped (ffmpeg with libopus/libvorbis needed to make them): {', '.join(skipped)}")
+    print(json.dumps({"decoder": server.decode_pool.stats()["decoder"], "concurrency": args.concurrency,
+                      "rounds": args.rounds, "skipped": skipped, "results": results}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--corpus", help="directory of audio files to decode instead of the generated corpus")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    asyncio.run(main(parser.parse_args()))
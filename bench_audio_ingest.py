@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the voice-frame ingest path: peak RSS and per-message latency of
+turning a binary WebSocket frame into recognizer input, across blob sizes.
+
+  legacy  - the old path: base64-encode the frame, base64-decode it again,
+            sniff it with wave.open, then parse it with sr.AudioFile
+  current - server.decode_audio on the frame's bytes
+
+Each case runs in a fresh subprocess that reads its blob from a file in one
+allocation, so ru_maxrss growth past that point is what the ingest path costs.
+Speech recognition itself (a network call) is not included.
+
+Usage: python bench_audio_ingest.py [sizes in MB...]
+"""
+
+import base64
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+DEFAULT_SIZES_MB = [1, 5, 20]  # 20 MB is the WebSocket max_size
+ROUNDS = 5
+
+
+def make_wav(size_mb):
+    frames = b"\x01\x00\xff\xff" * (size_mb * 1024 * 1024 // 4)
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(frames)
+    return buf.getvalue()
+
+
+def legacy_ingest(frame):
+    import speech_recognition as sr
+    audio_base64 = base64.b64encode(frame).decode('utf-8')
+    audio_bytes = base64.b64decode(audio_base64)
+    with wave.open(io.BytesIO(audio_bytes), 'rb'):
+        pcm_bytes = audio_bytes
+    with sr.AudioFile(io.BytesIO(pcm_bytes)) as source:
+        return sr.Recognizer().record(source)
+
+
+_loop = None
+
+
+def current_ingest(frame):
+    global _loop
+    import asyncio
+    import server
+    _loop = _loop or asyncio.new_event_loop()  # one loop for every round, as in the server
+    return _loop.run_until_complete(server.decode_audio(frame))
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def run_case(variant, path):
+    ingest = legacy_ingest if variant == "legacy" else current_ingest
+    ingest(make_wav(1))  # import and warm up outside the measurement
+    with open(path, 'rb') as f:
+        frame = f.read()  # what websockets hands the handler for a binary frame
+    baseline = max_rss_mb()
+    latencies = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        audio = ingest(frame)
+        latencies.append(time.perf_counter() - start)
+        del audio
+    print(json.dumps({"variant": variant, "size_mb": round(len(frame) / 1024 / 1024),
+                      "peak_rss_over_blob_mb": round(max_rss_mb() - baseline, 1),
+                      "latency_ms": round(sorted(latencies)[len(latencies) // 2] * 1000, 1)}))
+
+
+def main(sizes):
+    results = []
+    for size_mb in sizes:
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(make_wav(size_mb))
+        try:
+            for variant in ["legacy", "current"]:
+                out = subprocess.run([sys.executable, __file__, "--case", variant, path],
+                                     capture_output=True, text=True, check=True).stdout
+                results.append(json.loads(out.strip().splitlines()[-1]))
+        finally:
+            os.unlink(path)
+    print(f"{'size':>6} {'variant':>8} {'extra peak RSS':>15} {'latency (p50)':>14}")
+    for r in results:
+        print(f"{r['size_mb']:>4}MB {r['variant']:>8} {r['peak_rss_over_blob_mb']:>12.1f}MB "
+              f"{r['latency_ms']:>12.1f}ms")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--case":
+        run_case(sys.argv[2], sys.argv[3])
+    else:
+        main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES_MB)
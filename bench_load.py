@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test: the real server (server.main) with fake Gemini, TTS and
+speech recognition backends, driven by many concurrent WebSocket clients.
+
+The server runs in its own process, in a scratch directory. Its Gemini client
+is given FakeGeminiTransport in place of the REST transport, so admission,
+coalescing, the response cache, conversation memory, the TTS pipeline and
+chat logging all run as in production and only the network calls are
+simulated, each with a configurable latency (+/-50% jitter) and failure rate.
+Speech recognition and the local TTS fallback are faked the same way.
+
+Client processes open --clients connections, ramped over --ramp seconds. Each
+client sends --messages messages one after another, each one picked by --mix:
+
+  text   - {"type": "text", "stream": true}: first text_delta, then text_done
+  tts    - {"type": "tts_request"}: reply text with its audio
+  audio  - a WAV recording: recognition, streamed reply audio, then the text
+
+Reported (and saved as JSON, tagged with the git commit, for comparing runs):
+  latency_ms    - p50/p95/p99/max per stage, measured by the clients
+  msgs_per_sec  - completed messages over the load window
+  loop_lag_ms   - how late the server's event loop ran a periodic timer under load
+  rss_mb        - server memory once listening, and its peak under load
+
+Usage: python bench_load.py [--clients 1000] [--messages 5] [--mix text=0.6,tts=0.2,audio=0.2]
+                            [--llm-latency 0.3] [--llm-fail 0.0] [--out PATH] [--baseline PATH]
+       (python bench_load.py --help lists every option)
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import multiprocessing
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+import zlib
+from collections import Counter, defaultdict
+from datetime import datetime
+
+import websockets
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(REPO_DIR, "bench_results")
+LAG_INTERVAL = 0.05  # seconds between the server's event-loop lag probes
+MESSAGE_TIMEOUT = 120.0  # a message without its final frame by then counts as timed out
+# Replies the server sends instead of an answer when generation fails or it is overloaded
+DEGRADED_REPLIES = ("Error", "I'm handling a lot of requests", "I'm still thinking")
+CUT_SHORT_REPLIES = ("\n\nI'm still thinking", "\n\nSorry, something went wrong while I was answering")
+STAGES = ["connect", "text_first_delta", "text_done", "tts_reply", "voice_first_audio", "voice_text", "voice_done"]
+
+
+def raise_fd_limit():
+    """Thousands of sockets need more descriptors than the usual soft limit"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def jitter(rng, seconds):
+    return seconds * rng.uniform(0.5, 1.5) if seconds > 0 else 0.0
+
+
+def make_wav(seconds, sample_rate=16000):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(b"\x10\x00\xf0\xff" * int(sample_rate * seconds / 2))
+    return buf.getvalue()
+
+
+# --- fakes, installed in the server process ---
+
+class FakeGeminiTransport:
+    """Stands in for GeminiTransport: canned replies after a delay, failing at a set rate.
+
+    Text replies are `chunks` short sentences (so the TTS pipeline splits them)
+    that differ per prompt, keeping the response and TTS caches honest. TTS
+    replies are `tts_audio_ms` of 24 kHz PCM, as the real API returns it.
+    """
+    def __init__(self, config, error_class):
+        self.config = config
+        self.error_class = error_class
+        self.rng = random.Random(config["seed"])
+
+    def _maybe_fail(self, rate):
+        if self.rng.random() < rate:
+            raise self.error_class(503, "fake backend failure")
+
+    @staticmethod
+    def _payload(part):
+        return {"candidates": [{"content": {"parts": [part]}}]}
+
+    def _sentence(self, contents, i):
+        return f"Reply {zlib.crc32(str(contents).encode()) % 1000000} sentence {i} for you. "
+
+    async def generate_content(self, model, contents, generation_config=None):
+        if "AUDIO" in (generation_config or {}).get("responseModalities", []):
+            await asyncio.sleep(jitter(self.rng, self.config["tts_latency"]))
+            self._maybe_fail(self.config["tts_fail"])
+            pcm = b"\x00\x00" * (24 * self.config["tts_audio_ms"])
+            return self._payload({"inlineData": {"mimeType": "audio/L16;codec=pcm;rate=24000",
+                                                 "data": base64.b64encode(pcm).decode()}})
+        await asyncio.sleep(jitter(self.rng, self.config["llm_latency"]))
+        self._maybe_fail(self.config["llm_fail"])
+        return self._payload({"text": "".join(self._sentence(contents, i) for i in range(self.config["chunks"]))})
+
+    async def stream_generate_content(self, model, contents, generation_config=None):
+        await asyncio.sleep(jitter(self.rng, self.config["llm_latency"]))
+        self._maybe_fail(self.config["llm_fail"])
+        for i in range(self.config["chunks"]):
+            if i:
+                await asyncio.sleep(jitter(self.rng, self.config["chunk_latency"]))
+            yield self._payload({"text": self._sentence(contents, i)})
+
+    async def aclose(self):
+        pass
+
+
+class FakeRecognizer:
+    """Stands in for speech_recognition's Recognizer; blocks its thread like the network call does"""
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config["seed"] + 1)
+        self.calls = 0
+
+    def recognize_google(self, audio):
+        self.calls += 1
+        time.sleep(jitter(self.rng, self.config["stt_latency"]))
+        if self.rng.random() < self.config["stt_fail"]:
+            raise RuntimeError("fake recognition failure")
+        return f"voice message number {self.calls}"
+
+
+class FakeLocalTTS:
+    """Stands in for the pyttsx3 worker pool used when Gemini TTS fails"""
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config["seed"] + 2)
+        self.wav = make_wav(config["tts_audio_ms"] / 1000, 24000)
+
+    async def start(self):
+        pass
+
+    async def synthesize(self, text):
+        await asyncio.sleep(jitter(self.rng, self.config["tts_latency"]))
+        return self.wav
+
+    def stats(self):
+        return {"fake": True}
+
+    def shutdown(self):
+        pass
+
+
+def percentiles(samples, scale=1.0):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * scale, 2)
+    return {"count": len(ordered), "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+            "max": round(ordered[-1] * scale, 2)}
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak only, KB on Linux
+
+
+def serve(config):
+    """Server role: run server.main() with the fakes, then write loop lag and memory stats"""
+    raise_fd_limit()
+    sys.path.insert(0, REPO_DIR)
+    import log_setup
+    log_setup.configure()  # as when server.py runs as a script
+    import server
+
+    server.PORT, server.HTTP_PORT = config["port"], config["http_port"]
+    server.gemini_client.transport = FakeGeminiTransport(config, server.GeminiAPIError)
+    server.gemini_client.initialized = True
+    server.speech_recognizer = FakeRecognizer(config)
+    server.SPEECH_RECOGNITION_AVAILABLE = True
+    server.tts_pool = FakeLocalTTS(config)
+
+    lag, rss = [], {"listening": None, "peak": 0.0}
+
+    async def monitor():
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            if server.startup_state['listening_after_s'] is not None and rss["listening"] is None:
+                rss["listening"] = rss_mb()
+            if server.active_sessions:  # only count lag while clients are connected
+                lag.append(max(0.0, loop.time() - start - LAG_INTERVAL))
+                rss["peak"] = max(rss["peak"], rss_mb())
+
+    async def run():
+        probe = asyncio.create_task(monitor())
+        try:
+            await server.main()
+        finally:
+            probe.cancel()
+        with open(config["stats_path"], "w") as f:
+            json.dump({
+                "loop_lag_ms": percentiles(lag, 1000),
+                "rss_mb": {"listening": round(rss["listening"] or 0.0, 1), "peak": round(rss["peak"], 1)},
+                "health": server.health(),
+                "llm": server.gemini_client.stats(),
+                "tts_cache": server.tts_cache.stats(),
+            }, f)
+
+    asyncio.run(run())
+
+
+# --- clients ---
+
+class Client:
+    """One WebSocket session sending its share of the message mix, recording stage latencies"""
+    def __init__(self, name, port, config, rng, results, recording):
+        self.name = name  # keeps prompts distinct, so clients are not answered from each other's cache
+        self.port = port
+        self.config = config
+        self.rng = rng
+        self.results = results
+        self.recording = recording
+        self.websocket = None
+        self.marks = []  # (stage, seconds) of the message in progress
+
+    def record(self, stage, start):
+        self.marks.append((stage, time.perf_counter() - start))
+
+    async def run(self, delay):
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        try:
+            self.websocket = await websockets.connect(f"ws://127.0.0.1:{self.port}", max_size=None, open_timeout=60)
+        except Exception as e:
+            self.results["errors"][f"connect: {type(e).__name__}"] += 1
+            return
+        async with self.websocket:
+            await self.websocket.recv()  # session frame
+            await self.send({"type": "hello", "binary_audio": True})
+            await self.websocket.recv()
+            self.results["latency"]["connect"].append(time.perf_counter() - start)
+            kinds, weights = zip(*self.config["mix"].items())
+            for n in range(self.config["messages"]):
+                kind = self.rng.choices(kinds, weights)[0]
+                self.results["sent"][kind] += 1
+                self.marks = []
+                try:
+                    outcome = await asyncio.wait_for(getattr(self, kind)(n), MESSAGE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # Late frames would be mistaken for the next message's; this session is done
+                    self.results["errors"][f"{kind}: timeout"] += 1
+                    return
+                except websockets.ConnectionClosed:
+                    self.results["errors"][f"{kind}: connection closed"] += 1
+                    return
+                if outcome == "ok":
+                    # Only answered messages count towards latency; failures are fast and would flatter it
+                    self.results["completed"][kind] += 1
+                    for stage, seconds in self.marks:
+                        self.results["latency"][stage].append(seconds)
+                else:
+                    self.results["errors"][f"{kind}: {outcome}"] += 1
+                self.results["last_done"] = max(self.results["last_done"], time.time())
+
+    @staticmethod
+    def outcome(frame):
+        """"ok", or a short description of a failed reply for the error counts"""
+        content = frame.get("content") or ""
+        cut_short = any(marker in content for marker in CUT_SHORT_REPLIES)
+        if content.startswith(DEGRADED_REPLIES) or cut_short or frame.get("tts_error"):
+            return f"error reply: {(frame.get('tts_error') or content)[:60]}"
+        return "ok"
+
+    async def text(self, n):
+        start = time.perf_counter()
+        await self.send({"type": "text", "content": f"text message {n} from {self.name}", "stream": True})
+        first = True
+        while True:
+            frame = json.loads(await self.websocket.recv())
+            if frame["type"] == "text_delta" and first:
+                first = False
+                self.record("text_first_delta", start)
+            elif frame["type"] == "text_done":
+                self.record("text_done", start)
+                return self.outcome(frame)
+            elif frame["type"] == "text":
+                return self.outcome(frame) if self.outcome(frame) != "ok" else "unexpected text frame"
+
+    async def tts(self, n):
+        start = time.perf_counter()
+        await self.send({"type": "tts_request", "text": f"speak message {n} from {self.name}"})
+        while True:
+            frame = json.loads(await self.websocket.recv())
+            if frame["type"] != "text":
+                continue
+            if "audio_id" in frame:
+                await self.websocket.recv()  # the WAV follows as a binary frame
+            self.record("tts_reply", start)
+            outcome = self.outcome(frame)
+            return "no audio" if outcome == "ok" and "audio_id" not in frame else outcome
+
+    async def audio(self, n):
+        start = time.perf_counter()
+        await self.websocket.send(self.recording)
+        text_frame, final, first_audio = None, False, True
+        while True:
+            message = await self.websocket.recv()
+            if isinstance(message, bytes):
+                continue  # audio payload after its audio_chunk header
+            frame = json.loads(message)
+            if frame["type"] == "audio_chunk":
+                if first_audio and not frame.get("final"):
+                    first_audio = False
+                    self.record("voice_first_audio", start)
+                final = final or bool(frame.get("final"))
+            elif frame["type"] == "text":
+                text_frame = frame
+                self.record("voice_text", start)
+                if not frame.get("audio_stream"):
+                    return self.outcome(frame) if self.outcome(frame) != "ok" else "no audio"
+            if text_frame is not None and final:
+                self.record("voice_done", start)
+                outcome = self.outcome(text_frame)
+                return "no audio" if outcome == "ok" and first_audio else outcome
+
+    async def send(self, frame):
+        await self.websocket.send(json.dumps(frame))
+
+
+async def run_clients(port, count, config, seed, start_at):
+    raise_fd_limit()
+    results = {"latency": defaultdict(list), "sent": Counter(), "completed": Counter(), "errors": Counter(),
+               "first_send": start_at, "last_done": 0.0}
+    audio = make_wav(config["audio_seconds"])
+    await asyncio.sleep(max(0.0, start_at - time.time()))  # client processes start together
+    clients = [Client(f"{seed}.{i}", port, config, random.Random(seed * 100003 + i), results, audio)
+               for i in range(count)]
+    await asyncio.gather(*(client.run(config["ramp"] * i / count) for i, client in enumerate(clients)))
+    results["latency"] = dict(results["latency"])
+    return results
+
+
+def client_process(args):
+    return asyncio.run(run_clients(*args))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if kind not in ("text", "tts", "audio"):
+            raise argparse.ArgumentTypeError(f"unknown message kind {kind!r} (text, tts, audio)")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def run_load(config, processes):
+    """Start the server, run the clients, stop the server; returns the merged results"""
+    with tempfile.TemporaryDirectory() as tempdir:
+        config = dict(config, port=free_port(), http_port=free_port(),
+                      stats_path=os.path.join(tempdir, "server_stats.json"))
+        env = dict(os.environ, GEMINI_API_KEY="", STT_BACKEND="google",
+                   CHAT_HISTORY_DB=os.path.join(tempdir, "history.db"))
+        # Server output goes to a file: an unread pipe would fill up and stall it
+        log_path = os.path.join(tempdir, "server.log")
+        with open(log_path, "w") as log:
+            server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", json.dumps(config)],
+                                      cwd=tempdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+            try:
+                deadline = time.monotonic() + 120
+                while True:
+                    with open(log_path) as f:
+                        if "WebSocket server running" in f.read():
+                            break
+                    if server.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError("server did not start:\n" + open(log_path).read()[-2000:])
+                    time.sleep(0.1)
+                start_at = time.time() + 1.0
+                shares = [config["clients"] // processes + (i < config["clients"] % processes) for i in range(processes)]
+                with multiprocessing.Pool(processes) as pool:
+                    parts = pool.map(client_process, [(config["port"], n, config, i, start_at)
+                                                      for i, n in enumerate(shares) if n])
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=60)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+        with open(config["stats_path"]) as f:
+            server_stats = json.load(f)
+
+    latency, sent, completed, errors = defaultdict(list), Counter(), Counter(), Counter()
+    for part in parts:
+        for stage, samples in part["latency"].items():
+            latency[stage].extend(samples)
+        sent.update(part["sent"])
+        completed.update(part["completed"])
+        errors.update(part["errors"])
+    duration = max(part["last_done"] for part in parts) - min(part["first_send"] for part in parts)
+    return {
+        "sent": dict(sent),
+        "completed": dict(completed),
+        "errors": dict(errors),
+        "duration_s": round(duration, 2),
+        "msgs_per_sec": round(sum(completed.values()) / duration, 1) if duration > 0 else 0.0,
+        "latency_ms": {stage: percentiles(latency[stage], 1000) for stage in STAGES if latency[stage]},
+        "loop_lag_ms": server_stats["loop_lag_ms"],
+        "rss_mb": server_stats["rss_mb"],
+        "server": {key: server_stats[key] for key in ("health", "llm", "tts_cache")},
+    }
+
+
+def compare(result, baseline):
+    """Print msgs/s and per-stage p50/p95/p99 next to a previous run's"""
+    print(f"📊 Compared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    old, new = baseline["msgs_per_sec"], result["msgs_per_sec"]
+    print(f"   msgs/s {old} -> {new} ({(new / old - 1) * 100:+.0f}%)" if old else f"   msgs/s {old} -> {new}")
+    for stage, stats in result["latency_ms"].items():
+        before = baseline.get("latency_ms", {}).get(stage)
+        if before and before.get("count"):
+            print(f"   {stage:18} " + "  ".join(f"{q} {before[q]} -> {stats[q]}" for q in ("p50", "p95", "p99")))
+    lag_old, lag_new = baseline.get("loop_lag_ms", {}).get("p99"), result["loop_lag_ms"].get("p99")
+    print(f"   loop lag p99 {lag_old} -> {lag_new} ms, peak RSS {baseline.get('rss_mb', {}).get('peak')} "
+          f"-> {result['rss_mb']['peak']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test with fake Gemini/TTS/STT backends")
+    parser.add_argument("--clients", type=int, default=1000, help="concurrent WebSocket sessions")
+    parser.add_argument("--messages", type=int, default=5, help="messages per session, sent one after another")
+    parser.add_argument("--mix", type=parse_mix, default="text=0.6,tts=0.2,audio=0.2",
+                        help="relative weights of text, tts and audio messages")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which sessions connect")
+    parser.add_argument("--processes", type=int, default=max(2, os.cpu_count() or 1), help="client processes")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds to the first reply chunk")
+    parser.add_argument("--chunk-latency", type=float, default=0.05, help="seconds between streamed chunks")
+    parser.add_argument("--chunks", type=int, default=4, help="sentences per reply")
+    parser.add_argument("--llm-fail", type=float, default=0.0, help="fraction of LLM calls that fail")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="seconds per synthesized sentence")
+    parser.add_argument("--tts-fail", type=float, default=0.0, help="fraction of Gemini TTS calls that fail")
+    parser.add_argument("--tts-audio-ms", type=int, default=500, help="audio per synthesized sentence")
+    parser.add_argument("--stt-latency", type=float, default=0.3, help="seconds per recognized recording")
+    parser.add_argument("--stt-fail", type=float, default=0.0, help="fraction of recognitions that fail")
+    parser.add_argument("--audio-seconds", type=float, default=1.0, help="length of each voice recording")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="results file (default: bench_results/load-<commit>-<time>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)  # server role, started by the harness
+    args = parser.parse_args()
+    if args.serve:
+        serve(json.loads(args.serve))
+        return
+
+    raise_fd_limit()
+    config = {key: getattr(args, key) for key in (
+        "clients", "messages", "mix", "ramp", "llm_latency", "chunk_latency", "chunks", "llm_fail", "tts_latency",
+        "tts_fail", "tts_audio_ms", "stt_latency", "stt_fail", "audio_seconds", "seed")}
+    print(f"🧪 {args.clients} clients x {args.messages} messages ({args.mix}) from {args.processes} client "
+          f"processes; LLM {args.llm_latency}s, TTS {args.tts_latency}s, STT {args.stt_latency}s")
+    result = {"commit": git_commit(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+              "cpus": os.cpu_count(), "config": config}
+    result.update(run_load(config, args.processes))
+
+    print(f"📊 {sum(result['completed'].values())}/{sum(result['sent'].values())} messages in "
+          f"{result['duration_s']}s: {result['msgs_per_sec']} msgs/s")
+    for stage, stats in result["latency_ms"].items():
+        print(f"   {stage:18} n={stats['count']:<6} p50 {stats['p50']:>8} ms  p95 {stats['p95']:>8} ms  "
+              f"p99 {stats['p99']:>8} ms")
+    lag = result["loop_lag_ms"]
+    print(f"   loop lag p50 {lag.get('p50')} ms, p99 {lag.get('p99')} ms, max {lag.get('max')} ms; "
+          f"RSS {result['rss_mb']['listening']} MB idle, {result['rss_mb']['peak']} MB peak")
+    if result["errors"]:
+        print(f"⚠️ Errors: {result['errors']}")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"load-{result['commit'] or 'unknown'}-"
+                                                f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"💾 Results saved to {out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Startup report: what importing server.py costs, and how long the server takes
+to accept connections in the default (lazy) mode versus --preflight.
+
+  imports  - `python -X importtime -c "import server"`: total, and the
+             slowest modules server.py pulls in directly
+  listen   - wall time from launching `server.py` until the WebSocket port
+             accepts a connection, best of RUNS
+
+The server runs in a scratch directory. GEMINI_API_KEY is passed through, so
+with a real key --preflight includes its live TTS test call; without one the
+probe fails fast and only the engine loading is measured.
+
+Usage: python bench_startup.py [--top N]
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+PORT = 8765
+HTTP_PORT = 8081
+RUNS = 3
+SERVER = os.path.abspath(os.path.join(os.path.dirname(__file__), "server.py"))
+
+
+def port_open(port):
+    with socket.socket() as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+def import_report(top):
+    """(total ms, [(module, cumulative ms)] for server.py's slowest direct imports)"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import server"],
+                            cwd=os.path.dirname(SERVER), capture_output=True, text=True)
+    total, direct = None, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 0:
+            if name.strip() == "server":
+                total = int(cumulative) / 1000
+                break
+            direct = []  # imported by site or another top-level import, not by server.py
+        elif depth == 1:
+            direct.append((name.strip(), int(cumulative) / 1000))
+    direct.sort(key=lambda item: item[1], reverse=True)
+    return total, [(name, round(ms, 1)) for name, ms in direct[:top]]
+
+
+def time_to_listen(args, tempdir):
+    """Seconds from launching the server until its WebSocket port accepts connections"""
+    env = dict(os.environ, CHAT_HISTORY_DB=os.path.join(tempdir, "history.db"))
+    with open(os.path.join(tempdir, "server.log"), "w") as log:
+        start = time.perf_counter()
+        server = subprocess.Popen([sys.executable, SERVER] + args, cwd=tempdir, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + 120
+            while not port_open(PORT):
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"server did not start; see {log.name}")
+                time.sleep(0.005)
+            return time.perf_counter() - start
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+def main():
+    top = int(sys.argv[sys.argv.index("--top") + 1]) if "--top" in sys.argv else 8
+    if port_open(PORT) or port_open(HTTP_PORT):
+        print(f"❌ Ports {PORT}/{HTTP_PORT} are in use; stop the running server first")
+        return
+    total, slowest = import_report(top)
+    print(json.dumps({"import_ms": round(total, 1) if total is not None else None, "slowest_imports_ms": slowest}))
+    with tempfile.TemporaryDirectory() as tempdir:
+        for mode, args in (("lazy", []), ("preflight", ["--preflight"])):
+            times = [time_to_listen(args, tempdir) for _ in range(RUNS)]
+            print(json.dumps({"mode": mode, "listen_ms": round(min(times) * 1000, 1),
+                              "runs_ms": [round(t * 1000, 1) for t in times]}))
+
+
+if __name__ == "__main__":
+    main()
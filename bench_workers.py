@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Load generator for the multi-process server: connection capacity and
+messages/sec with 1 worker versus one worker per core.
+
+For each worker count the real server is started (`server.py --workers N`)
+in a scratch directory with no Gemini key, so every reply is the immediate
+"not initialized" answer and the measurement is the server's own per-message
+work: JSON parsing, session bookkeeping, the reply frame and chat logging.
+Load comes from several client processes so the generator is not the
+bottleneck.
+
+  connect  - time to open CONNECTIONS concurrent WebSocket sessions
+  msgs/s   - text messages answered per second over those sessions
+
+Usage: python bench_workers.py [worker counts...]   (default: 1 and cpu_count)
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+
+PORT = 8765
+HTTP_PORT = 8081
+CONNECTIONS = 400
+MESSAGES_PER_CONNECTION = 25
+CLIENT_PROCESSES = max(2, os.cpu_count() or 1)
+
+
+def port_open(port):
+    with socket.socket() as sock:
+        return sock.connect_ex(("127.0.0.1", port)) == 0
+
+
+async def client_load(connections, messages):
+    """Open `connections` sessions at once, then send `messages` texts on each; (connect s, replies, s)"""
+    start = time.perf_counter()
+    sockets = await asyncio.gather(*(websockets.connect(f"ws://127.0.0.1:{PORT}", max_size=None)
+                                     for _ in range(connections)))
+    await asyncio.gather(*(ws.recv() for ws in sockets))  # session frames
+    connected = time.perf_counter() - start
+
+    async def chat(ws, n):
+        for i in range(messages):
+            await ws.send(json.dumps({"type": "text", "content": f"load message {n}-{i}"}))
+            await ws.recv()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(ws, n) for n, ws in enumerate(sockets)))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*(ws.close() for ws in sockets))
+    return connected, connections * messages, elapsed
+
+
+def client_process(args):
+    return asyncio.run(client_load(*args))
+
+
+def run_case(workers, tempdir):
+    env = dict(os.environ, GEMINI_API_KEY="", CHAT_HISTORY_DB=os.path.join(tempdir, f"history_{workers}.db"))
+    # Server output goes to a file: an unread pipe would fill up and stall the workers' prints
+    log_path = os.path.join(tempdir, f"server_{workers}.log")
+    log = open(log_path, "w")
+    server = subprocess.Popen([sys.executable, os.path.abspath("server.py"), "--workers", str(workers)],
+                              cwd=tempdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            with open(log_path) as f:
+                if f.read().count("WebSocket server running") >= workers:
+                    break
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"server did not start; see {log_path}")
+            time.sleep(0.2)
+        per_process = CONNECTIONS // CLIENT_PROCESSES
+        with multiprocessing.Pool(CLIENT_PROCESSES) as pool:
+            results = pool.map(client_process, [(per_process, MESSAGES_PER_CONNECTION)] * CLIENT_PROCESSES)
+        connect_s = max(r[0] for r in results)
+        messages = sum(r[1] for r in results)
+        elapsed = max(r[2] for r in results)
+        return {"workers": workers, "connections": per_process * CLIENT_PROCESSES,
+                "connect_s": round(connect_s, 3), "messages": messages,
+                "msgs_per_sec": round(messages / elapsed, 1)}
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+
+
+def main():
+    cores = os.cpu_count() or 1
+    counts = [int(arg) for arg in sys.argv[1:]] or sorted({1, cores})
+    if port_open(PORT) or port_open(HTTP_PORT):
+        print(f"❌ Ports {PORT}/{HTTP_PORT} are in use; stop the running server first")
+        return
+    print(f"📊 {CONNECTIONS} connections x {MESSAGES_PER_CONNECTION} messages from "
+          f"{CLIENT_PROCESSES} client processes, {cores} cores")
+    baseline = None
+    with tempfile.TemporaryDirectory() as tempdir:
+        for workers in counts:
+            result = run_case(workers, tempdir)
+            baseline = baseline or result["msgs_per_sec"]
+            result["speedup"] = round(result["msgs_per_sec"] / baseline, 2)
+            print(json.dumps(result))
+    if cores == 1:
+        print("⚠️ Only one core here: workers share it, so no speedup is expected on this machine")
+
+
+if __name__ == "__main__":
+    main()
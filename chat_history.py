@@ -0,0 +1,135 @@
+"""
+Indexed chat history store.
+
+chat_log.csv stays the human-readable log, but answering /chat_history from
+it means reading and parsing the whole file on every request. This store
+keeps the same rows in SQLite (WAL mode, so the HTTP thread can read while
+the log writer appends) with indexes on id, session and timestamp. Fetching
+the latest page, a session's turns, or the rows since a timestamp then costs
+time proportional to the page, not to the history.
+"""
+
+import csv
+import os
+import sqlite3
+import threading
+
+FIELDS = ["timestamp_iso", "session_id", "user_message", "bot_response", "user_audio_file", "bot_audio_file"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp_iso TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    user_message TEXT,
+    bot_response TEXT,
+    user_audio_file TEXT,
+    bot_audio_file TEXT
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+CREATE INDEX IF NOT EXISTS messages_time ON messages (timestamp_iso);
+"""
+
+
+class ChatHistoryStore:
+    """SQLite-backed chat history with cursor pagination.
+
+    Each thread gets its own connection. Rows are returned oldest first as
+    dicts with the CSV column names plus their integer "id"; a page's cursor
+    is the id of its oldest row, and passing it back as `before` fetches the
+    page preceding it. Passing the newest id seen as `after` instead returns
+    only rows appended since, for polling.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10.0)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def append(self, rows):
+        """Insert rows given as lists in FIELDS order (blocking)"""
+        rows = [list(row)[:len(FIELDS)] + [None] * (len(FIELDS) - len(row)) for row in rows]
+        db = self._connect()
+        with db:
+            db.executemany(f"INSERT INTO messages ({', '.join(FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def last_id(self) -> int:
+        """Id of the newest row (0 when empty); rows are only appended, so it changes with every write"""
+        return self._connect().execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    def import_csv(self, csv_path: str, batch_size: int = 5000) -> int:
+        """One-time import of an existing chat log; does nothing once the store has rows"""
+        if self.count() or not os.path.exists(csv_path):
+            return 0
+        imported = 0
+        with open(csv_path, encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            batch = []
+            for row in reader:
+                if not row or row == FIELDS:
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    self.append(batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                self.append(batch)
+                imported += len(batch)
+        return imported
+
+    def page(self, session_id: str = None, since: str = None, before: int = None, after: int = None,
+             limit: int = 100):
+        """The newest `limit` matching rows, oldest first, and the cursor for the page before them.
+
+        session_id filters to one session, since keeps rows with a later
+        timestamp, before (a cursor) keeps rows older than that id. The cursor
+        is None when there is nothing older. With after, the page is instead
+        the oldest `limit` rows newer than that id, and the cursor is None.
+        """
+        clauses, params = [], []
+        if session_id:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        if since:
+            clauses.append("timestamp_iso > ?")
+            params.append(since)
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        if after is not None:
+            clauses.append("id > ?")
+            params.append(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        if after is not None:
+            rows = self._connect().execute(
+                f"SELECT id, {', '.join(FIELDS)} FROM messages {where} ORDER BY id LIMIT ?",
+                params + [limit]).fetchall()
+            return [dict(row) for row in rows], None
+        rows = self._connect().execute(
+            f"SELECT id, {', '.join(FIELDS)} FROM messages {where} ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]).fetchall()
+        rows = [dict(row) for row in rows]
+        cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        rows = rows[:limit]
+        rows.reverse()
+        return rows, cursor
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
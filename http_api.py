@@ -0,0 +1,280 @@
+"""
+Small HTTP/1.1 server for the history and stats API, on the asyncio loop.
+
+The WebSocket server and the HTTP endpoints run on one event loop, so
+handlers read the same in-process state (caches, pools, the history store)
+without locks, and a slow request only occupies its own connection instead
+of blocking every other client. Connections are kept alive between requests,
+idle and slow clients are timed out, CORS preflights are answered, and
+handlers may stream their response body in chunks (optionally gzipped).
+
+Handlers are coroutine functions taking a Request and returning a Response;
+blocking work (SQLite, files) belongs in asyncio.to_thread.
+"""
+
+import asyncio
+import email.utils
+import gzip
+import json
+import logging
+import urllib.parse
+import zlib
+
+log = logging.getLogger("voicebot.http")
+
+REASONS = {200: "OK", 204: "No Content", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 408: "Request Timeout", 413: "Payload Too Large",
+           431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+           504: "Gateway Timeout"}
+
+
+class Request:
+    """A parsed request head: method, path, query (name -> list of values) and lower-cased headers."""
+    def __init__(self, method, target, version, headers):
+        self.method = method
+        self.version = version
+        self.headers = headers
+        url = urllib.parse.urlsplit(target)
+        self.path = url.path
+        self.query = urllib.parse.parse_qs(url.query)
+
+    def param(self, name, default=None):
+        return self.query.get(name, [default])[-1]
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def accepts_gzip(self) -> bool:
+        return "gzip" in self.headers.get("accept-encoding", "")
+
+    def not_modified(self, etag, mtime=None) -> bool:
+        """Whether the client's cached copy (If-None-Match, else If-Modified-Since) is current"""
+        if_none_match = self.headers.get("if-none-match")
+        if if_none_match:
+            return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        if_modified_since = self.headers.get("if-modified-since")
+        if if_modified_since and mtime is not None:
+            try:
+                return int(mtime) <= email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class Response:
+    """Status, headers and either a complete body or an async iterator of body chunks."""
+    def __init__(self, status=200, body=b"", headers=None, stream=None, content_type="application/json"):
+        self.status = status
+        self.body = body
+        self.stream = stream
+        self.headers = dict(headers or {})
+        if content_type and (body or stream is not None):
+            self.headers.setdefault("Content-Type", content_type)
+
+
+def json_response(request, body, status=200, headers=None, gzip_min_bytes=1024):
+    """Serialize body as JSON, gzipped when it is large and the client accepts gzip"""
+    data = json.dumps(body).encode("utf-8")
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    if len(data) >= gzip_min_bytes and request.accepts_gzip():
+        data = gzip.compress(data, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(status, data, headers)
+
+
+def json_array_stream(request, items, headers=None, status=200, chunk_items=100):
+    """Stream a list as one JSON array, chunk_items elements per write, gzipped if accepted.
+
+    The response never holds the whole encoded array, and the first bytes go
+    out before the last items are encoded.
+    """
+    headers = dict(headers or {})
+    headers["Vary"] = "Accept-Encoding"
+    compressor = None
+    if request.accepts_gzip():
+        compressor = zlib.compressobj(5, zlib.DEFLATED, 31)  # wbits 31: gzip container
+        headers["Content-Encoding"] = "gzip"
+
+    def encoded(text):
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    async def chunks():
+        encode = json.JSONEncoder().encode
+        yield encoded("[")
+        for start in range(0, len(items), chunk_items):
+            part = ",".join(encode(item) for item in items[start:start + chunk_items])
+            yield encoded(("," if start else "") + part)
+            await asyncio.sleep(0)  # let other connections run between chunks
+        yield encoded("]") + (compressor.flush() if compressor else b"")
+
+    return Response(status, headers=headers, stream=chunks())
+
+
+class HTTPAPIServer:
+    """Routes GET/HEAD requests to handlers; keep-alive, timeouts and CORS are handled here.
+
+    header_timeout bounds how long a client may take to send a request head
+    (and again its body, if it declares one), keepalive_timeout how long an idle kept-alive connection stays open, and
+    handler_timeout how long a handler may run before the client gets a 504.
+    Request heads over max_header_bytes get a 431, bodies over max_body_bytes a 413.
+    """
+    def __init__(self, routes: dict, cors_origin: str = "*", header_timeout: float = 10.0,
+                 keepalive_timeout: float = 15.0, handler_timeout: float = 30.0, max_header_bytes: int = 16384,
+                 max_body_bytes: int = 65536):
+        self.routes = routes
+        self.cors_origin = cors_origin
+        self.header_timeout = header_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.handler_timeout = handler_timeout
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        self._server = None
+        self._connections = {}  # writer -> task serving that connection
+        self.requests = 0
+        self.connections = 0
+        self.errors = 0
+
+    async def start(self, host: str, port: int, reuse_port: bool = False):
+        self._server = await asyncio.start_server(self._serve, host, port, limit=self.max_header_bytes,
+                                                  reuse_port=reuse_port or None)
+        return self._server
+
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+
+    async def _read_head(self, reader, timeout):
+        """Request line and headers, or None when the client closed or stayed idle"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, version = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        return Request(method.upper(), target, version.strip(), headers)
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        self._connections[writer] = asyncio.current_task()
+        timeout = self.header_timeout
+        try:
+            while True:
+                try:
+                    request = await self._read_head(reader, timeout)
+                    length = int(request.headers.get("content-length") or 0) if request else 0
+                    if length < 0:
+                        raise ValueError(f"negative Content-Length: {length}")
+                except asyncio.TimeoutError:
+                    # A client that never sends its first request gets a 408; idle kept-alive ones just close
+                    if timeout == self.header_timeout:
+                        await self._send(writer, None, Response(408, b""), keep_alive=False)
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, None, Response(431, b""), keep_alive=False)
+                    break
+                except ValueError:
+                    await self._send(writer, None, Response(400, b""), keep_alive=False)
+                    break
+                if request is None:
+                    break
+                if length > self.max_body_bytes:
+                    await self._send(writer, request, Response(413, b""), keep_alive=False)
+                    break
+                if length:
+                    try:
+                        # GET bodies are ignored, but a client may not stall halfway through one
+                        await asyncio.wait_for(reader.readexactly(length), self.header_timeout)
+                    except asyncio.TimeoutError:
+                        await self._send(writer, request, Response(408, b""), keep_alive=False)
+                        break
+                response = await self._respond(request)
+                keep_alive = request.keep_alive
+                await self._send(writer, request, response, keep_alive)
+                self.requests += 1
+                if not keep_alive:
+                    break
+                timeout = self.keepalive_timeout
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _respond(self, request):
+        if request.method == "OPTIONS":
+            return Response(204, headers={
+                "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
+                "Access-Control-Allow-Headers": request.headers.get("access-control-request-headers", ""),
+                "Access-Control-Max-Age": "600",
+            })
+        if request.method not in ("GET", "HEAD"):
+            return Response(405, headers={"Allow": "GET, HEAD, OPTIONS"})
+        handler = self.routes.get(request.path)
+        if handler is None:
+            return Response(404)
+        try:
+            return await asyncio.wait_for(handler(request), self.handler_timeout)
+        except asyncio.TimeoutError:
+            self.errors += 1
+            return json_response(request, {"error": "request timed out"}, status=504)
+        except Exception as e:
+            self.errors += 1
+            log.error("Error handling %s: %s", request.path, e)
+            return json_response(request, {"error": str(e)}, status=500)
+
+    async def _send(self, writer, request, response, keep_alive):
+        headers = dict(response.headers)
+        if self.cors_origin:
+            headers["Access-Control-Allow-Origin"] = self.cors_origin
+            headers["Access-Control-Expose-Headers"] = "ETag, Last-Modified, X-Next-Cursor"
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        if keep_alive:
+            headers["Keep-Alive"] = f"timeout={int(self.keepalive_timeout)}"
+        no_body = (request is not None and request.method == "HEAD") or response.status in (204, 304)
+        streaming = response.stream is not None and not no_body
+        if streaming:
+            headers["Transfer-Encoding"] = "chunked"
+        elif response.status != 304:
+            headers["Content-Length"] = str(len(response.body))
+        head = f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+        writer.write(head.encode("latin-1"))
+        if streaming:
+            async for chunk in response.stream:
+                if chunk:
+                    writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        elif not no_body:
+            writer.write(response.body)
+        await writer.drain()
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "open_connections": len(self._connections),
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        # Closing the transports ends idle keep-alive reads; let every connection task finish
+        tasks = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self._server.wait_closed()
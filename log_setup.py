@@ -0,0 +1,189 @@
+"""
+Leveled, structured logging that keeps console I/O off the event loop.
+
+Call sites use the standard library (`log = logging.getLogger("voicebot")`,
+`log.debug("Sent %d bytes", n)`) with %-style arguments, so a record below
+the configured level costs one level check and nothing is formatted.
+
+configure() routes every record through a bounded in-memory queue to a
+QueueListener thread that formats and writes it. The record is queued as is
+(arguments unformatted), so the caller pays for neither formatting nor the
+write; pass values, not objects the caller is about to mutate. When the
+queue is full (stdout is blocked or far behind) records are dropped and
+counted in `dropped` rather than stalling the server.
+
+Arguments are truncated at format time: long strings and reprs are cut to
+LOG_MAX_FIELD_CHARS and bytes are shown as their length, so a reply or an
+audio payload can never turn one log line into megabytes.
+
+Environment:
+  LOG_LEVEL            DEBUG, INFO (default), WARNING, ERROR
+  LOG_FORMAT           text (default) or json (one object per line)
+  LOG_MAX_FIELD_CHARS  longest argument kept in a message (default 300)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "300"))
+LOG_QUEUE_SIZE = 10000
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+# Attributes every LogRecord has; anything else came from `extra=` and is a structured field
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def truncate(value, limit: int = None) -> str:
+    """str(value), cut to `limit` characters with a note of how much was dropped;
+    bytes become their length"""
+    limit = LOG_MAX_FIELD_CHARS if limit is None else limit
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f"<{len(value)} bytes>"
+    text = value if isinstance(value, str) else str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}…[+{len(text) - limit} chars]"
+
+
+def _shorten(value, limit):
+    """A %-format argument with its text capped; numbers pass through for %d/%f"""
+    if isinstance(value, (int, float)) or value is None:
+        return value
+    return truncate(value, limit)
+
+
+class TruncatingFormatter(logging.Formatter):
+    """Formats messages with each argument cut to max_field_chars."""
+
+    def __init__(self, fmt=TEXT_FORMAT, max_field_chars: int = None, **kwargs):
+        super().__init__(fmt, **kwargs)
+        self.max_field_chars = LOG_MAX_FIELD_CHARS if max_field_chars is None else max_field_chars
+
+    def formatMessage(self, record):
+        return super().formatMessage(record) + "".join(
+            f" {key}={truncate(value, self.max_field_chars)}" for key, value in _fields(record).items())
+
+    def format(self, record):
+        record.message = _message(record, self.max_field_chars)
+        record.asctime = self.formatTime(record, self.datefmt)
+        text = self.formatMessage(record)
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, logger, msg, any `extra=` fields, exc."""
+
+    def __init__(self, max_field_chars: int = None):
+        super().__init__()
+        self.max_field_chars = LOG_MAX_FIELD_CHARS if max_field_chars is None else max_field_chars
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": _message(record, self.max_field_chars),
+        }
+        for key, value in _fields(record).items():
+            entry[key] = value if isinstance(value, (int, float, bool)) or value is None \
+                else truncate(value, self.max_field_chars)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _message(record, limit: int) -> str:
+    """record.getMessage() with every argument truncated first"""
+    msg = str(record.msg)
+    args = record.args
+    if not args:
+        return truncate(msg, limit * 10)  # a message built by the caller is still capped
+    if isinstance(args, dict):
+        args = {key: _shorten(value, limit) for key, value in args.items()}
+    else:
+        args = tuple(_shorten(value, limit) for value in args)
+    try:
+        return msg % args
+    except (TypeError, ValueError) as e:
+        return f"{msg} {args!r} (bad log arguments: {e})"
+
+
+def _fields(record) -> dict:
+    """Structured fields passed with `extra=`"""
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that enqueues records unformatted and drops them when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock_dropped = threading.Lock()
+
+    def prepare(self, record):
+        # The stock handler formats here, on the caller's thread; the listener formats instead
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock_dropped:
+                self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # The queue may still be full when stopping; wait for room rather than failing
+        self.queue.put(self._sentinel)
+
+
+_listener = None
+_handler = None
+
+
+def configure(level: str = None, fmt: str = None, stream=None):
+    """Send all logging through a background writer thread (once per process).
+
+    Returns the queue handler, whose `dropped` counts records lost to a full queue."""
+    global _listener, _handler
+    if _handler is not None:
+        return _handler
+    output = logging.StreamHandler(stream if stream is not None else sys.stdout)
+    output.setFormatter(JSONFormatter() if (fmt or LOG_FORMAT) == "json" else TruncatingFormatter())
+    _handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    root = logging.getLogger()
+    root.handlers[:] = [_handler]
+    root.setLevel((level or LOG_LEVEL).upper())
+    _listener = _Listener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+    return _handler
+
+
+def dropped() -> int:
+    """Records dropped because the writer thread fell behind"""
+    return _handler.dropped if _handler is not None else 0
+
+
+def shutdown():
+    """Write out everything still queued and stop the writer thread."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_handler)
+    _listener = _handler = None
@@ -0,0 +1,194 @@
+"""
+Event-loop stall detection and stack sampling.
+
+LoopWatchdog runs a heartbeat task on the event loop and a checker thread
+beside it. The heartbeat measures loop lag (how late each tick wakes up). If
+no beat arrives for `threshold` seconds, something is running on the loop
+without yielding. The checker thread then grabs the loop thread's stack from
+sys._current_frames(), along with the task that was running, so the report
+names the code that froze every connection rather than just the fact.
+
+StackSampler is an opt-in sampling profiler. A thread records the stack of
+the loop thread (or of every thread) every few milliseconds and counts
+identical stacks. folded() returns them in the collapsed-stack format
+("root;caller;callee count") that flamegraph.pl, speedscope and inferno
+read.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+log = logging.getLogger("voicebot.loop")
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def fold(frame) -> str:
+    """A frame and its callers as one collapsed-stack line, outermost first"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class LoopWatchdog:
+    """Measures event-loop lag and reports stalls with the stack that caused them.
+
+    on_lag(seconds) is called on the loop after every beat (for a histogram).
+    stats() reports the stall count, the worst lag and the last few stalls.
+    """
+    def __init__(self, threshold: float = 0.25, interval: float = 0.05, on_lag=None, keep: int = 10):
+        self.threshold = threshold
+        self.interval = interval
+        self.on_lag = on_lag
+        self.stalls = 0
+        self.max_lag = 0.0
+        self.recent = collections.deque(maxlen=keep)
+        self._beat = time.monotonic()
+        self._loop_thread = None
+        self._stalled = None  # report of the stall in progress, set by the checker thread
+        self._lock = threading.Lock()
+
+    async def run(self):
+        """Heartbeat; run as a task for as long as the loop should be watched"""
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        stop = threading.Event()
+        checker = threading.Thread(target=self._check, args=(loop, stop), name="loop-watchdog", daemon=True)
+        checker.start()
+        try:
+            while True:
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, loop.time() - expected)
+                self._beat = time.monotonic()
+                self.max_lag = max(self.max_lag, lag)
+                with self._lock:
+                    stalled, self._stalled = self._stalled, None
+                if stalled is not None:
+                    stalled["duration_s"] = round(lag + self.interval, 3)
+                    log.warning("Event loop stall ended after %.0f ms", stalled["duration_s"] * 1000)
+                if self.on_lag is not None:
+                    self.on_lag(lag)
+        finally:
+            stop.set()
+
+    def _check(self, loop, stop):
+        while not stop.wait(self.interval):
+            blocked = time.monotonic() - self._beat
+            if blocked < self.threshold or self._stalled is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            task = asyncio.current_task(loop)
+            report = {
+                "at": time.time(),
+                "duration_s": None,  # filled in when the loop recovers
+                "task": task.get_name() if task is not None else None,
+                "coroutine": getattr(task.get_coro(), "__qualname__", None) if task is not None else None,
+                "stack": traceback.format_stack(frame),
+            }
+            del frame
+            with self._lock:
+                self._stalled = report
+                self.stalls += 1
+                self.recent.append(report)
+            # Logged now rather than on recovery, so a loop that never recovers still shows up
+            log.warning("Event loop blocked for %.0f ms in task %s (%s):\n%s", blocked * 1000,
+                        report["task"], report["coroutine"], "".join(report["stack"][-12:]).rstrip())
+
+    def stats(self) -> dict:
+        with self._lock:
+            recent = [dict(r, stack=r["stack"][-12:]) for r in self.recent]
+            return {
+                "threshold_s": self.threshold,
+                "stalls": self.stalls,
+                "max_lag_s": round(self.max_lag, 4),
+                "blocked_now_s": round(time.monotonic() - self._beat, 3) if self._stalled else 0.0,
+                "recent": recent,
+            }
+
+
+class StackSampler:
+    """Samples stacks every `interval` seconds and counts them as folded stacks.
+
+    thread_id limits sampling to one thread (the event loop's); None samples
+    every thread, each stack rooted at the thread's name.
+    """
+    def __init__(self, thread_id: int = None, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frames = {self.thread_id: frames[self.thread_id]} if self.thread_id in frames else {}
+            names = {t.ident: t.name for t in threading.enumerate()} if self.thread_id is None else {}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = fold(frame)
+                if self.thread_id is None:
+                    stack = f"{str(names.get(ident, ident)).replace(' ', '_')};{stack}"
+                self.counts[stack] += 1
+            self.samples += 1
+            del frames
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.counts.items()))
+
+
+_profiling = 0
+_switch_interval = None
+
+
+async def profile(seconds: float, thread_id: int = None, interval: float = 0.005) -> StackSampler:
+    """Sample for `seconds` while the caller's loop keeps running; returns the stopped sampler.
+
+    The sampler only runs when it gets the GIL. Busy code on the loop gives the GIL up
+    every switch interval (5 ms), and the loop gives it up in every select(). Left
+    alone, samples pile up in select() and miss work done in short slices between
+    awaits, so the switch interval is lowered while any profile is running.
+    """
+    global _profiling, _switch_interval
+    if _profiling == 0:
+        _switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(_switch_interval, interval / 20))
+    _profiling += 1
+    sampler = StackSampler(thread_id, interval).start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.to_thread(sampler.stop)
+        _profiling -= 1
+        if _profiling == 0:
+            sys.setswitchinterval(_switch_interval)
+    return sampler
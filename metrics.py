@@ -0,0 +1,195 @@
+"""
+In-process metrics for the /metrics endpoint, in the Prometheus text format.
+
+Counters and histograms are updated where the work happens (histogram.time()
+wraps a stage of a turn: decoding, recognition, Gemini, TTS, log writes,
+socket sends). Values that already live elsewhere (queue depths, cache hit
+counts, open sessions) are registered as callbacks and read at scrape time,
+so the hot path does not pay for them. Updates take a per-metric lock
+because some stages run on worker threads.
+
+Each server process has its own registry; with --workers, every scrape
+reports the one worker that accepted the connection.
+"""
+
+import asyncio
+import contextlib
+import math
+import threading
+import time
+
+# Seconds; covers cache hits (sub-millisecond) up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self):
+        """(suffix, label values, extra label pairs, value) for every series"""
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+    """A value that only goes up: events, errors, bytes."""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    """Distribution of durations in seconds, as cumulative buckets plus sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + seconds)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            value = self._values.get(self._key(labels))
+        return sum(value[0]) if value else 0
+
+    @contextlib.contextmanager
+    def time(self, errors: Counter = None, **labels):
+        """Observe how long the block takes. The yielded span can be marked failed
+        (span.failed = True) for work that reports errors by return value;
+        exceptions mark it failed too. Failed spans also increment `errors`.
+        Cancelled work was stopped, not finished, and records nothing."""
+        span = Span()
+        start = time.perf_counter()
+        try:
+            yield span
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except BaseException:
+            span.failed = True
+            self._finish(span, start, errors, labels)
+            raise
+        self._finish(span, start, errors, labels)
+
+    def _finish(self, span, start, errors, labels):
+        self.observe(time.perf_counter() - start, **labels)
+        if span.failed and errors is not None:
+            errors.inc(**labels)
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        out = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                out.append(("_bucket", key, (f'le="{_number(bound)}"',), cumulative))
+            out.append(("_sum", key, (), total))
+            out.append(("_count", key, (), cumulative))
+        return out
+
+
+class Span:
+    """Handle for one timed block; see Histogram.time()."""
+    __slots__ = ("failed",)
+
+    def __init__(self):
+        self.failed = False
+
+
+class Callback(_Metric):
+    """A gauge or counter read from existing state when scraped.
+
+    fn returns a number, or a dict mapping label values (a tuple, or a single
+    value for one label) to numbers.
+    """
+    def __init__(self, name: str, help: str, fn, kind: str = "gauge", labels=()):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if not isinstance(value, dict):
+            return [("", (), (), value)]
+        return [("", key if isinstance(key, tuple) else (key,), (), v) for key, v in sorted(value.items())]
+
+
+class MetricsRegistry:
+    """Creates metrics under a common name prefix and renders them all for a scrape."""
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels=()) -> Counter:
+        return self._add(Counter(self.prefix + name, help, labels))
+
+    def histogram(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self.prefix + name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, fn, kind: str = "gauge", labels=()) -> Callback:
+        return self._add(Callback(self.prefix + name, help, fn, kind, labels))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                # One broken callback should not take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, key, extra, value in samples:
+                lines.append(f"{metric.name}{suffix}{_labels(metric.label_names, key, extra)} {_number(value)}")
+        return "\n".join(lines) + "\n"
@@ -1,47 +1,81 @@
+import time
+SERVER_IMPORT_STARTED = time.perf_counter()
+
 import os
+import re
 import asyncio
 import csv
 import json
 import base64
-import tempfile
 import wave
 import io
 from datetime import datetime
 import uuid
+import hashlib
+import contextlib
+import email.utils
+import argparse
+import signal
+import sys
+import itertools
+import struct
+import importlib
+import importlib.util
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 import websockets
-from http.server import BaseHTTPRequestHandler, HTTPServer
-import threading
-import speech_recognition as sr
-import pyttsx3
 import threading
 import queue
-from pydub import AudioSegment
-import time
 
-# Try different import approaches for Gemini
-try:
-    from google import genai
-    GEMINI_AVAILABLE = True
-    USE_GOOGLE_AI = True
-    USE_VERTEX_AI = False
-except ImportError:
+from tts_worker import TTSWorkerPool
+from stt_stream import ClipRecognizer, EnergyVAD, VoiceStream
+from stt_worker import STTWorkerPool
+from audio_decode import AudioDecodeError, DecodeWorkerPool, sniff_format, wav_to_pcm
+from chat_history import ChatHistoryStore
+from http_api import HTTPAPIServer, Response, json_array_stream, json_response
+import log_setup
+from loop_monitor import LoopWatchdog, profile
+from metrics import MetricsRegistry
+from supervisor import Supervisor, reuse_port_supported
+
+if TYPE_CHECKING:
+    import speech_recognition as sr  # imported on first use at runtime (slow to import)
+
+log = logging.getLogger("voicebot")
+if __name__ == "__main__":
+    log_setup.configure()  # before the module-level setup below logs anything
+
+def module_available(name: str) -> bool:
+    """Whether `name` can be imported, found without importing it"""
     try:
-        import google.generativeai as genai
-        GEMINI_AVAILABLE = True
-        USE_GOOGLE_AI = True
-        USE_VERTEX_AI = False
-    except ImportError:
-        try:
-            import vertexai
-            from vertexai.generative_models import GenerativeModel
-            GEMINI_AVAILABLE = True
-            USE_VERTEX_AI = True
-            USE_GOOGLE_AI = False
-        except ImportError:
-            GEMINI_AVAILABLE = False
-            USE_VERTEX_AI = False
-            USE_GOOGLE_AI = False
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+# Heavy optional libraries (the Gemini SDK alone takes ~0.5s) are only located here and
+# imported on first use: load_gemini_sdk(), httpx in GeminiTransport, and
+# speech_recognition in the audio functions. `--preflight` loads them all up front.
+# Try different import approaches for Gemini: google.genai, then google.generativeai, then Vertex AI
+GEMINI_SDK = next((name for name in ("google.genai", "google.generativeai", "vertexai.generative_models")
+                   if module_available(name)), None)
+GEMINI_AVAILABLE = GEMINI_SDK is not None
+USE_VERTEX_AI = GEMINI_SDK == "vertexai.generative_models"
+USE_GOOGLE_AI = GEMINI_AVAILABLE and not USE_VERTEX_AI
+genai = None  # set by load_gemini_sdk()
+
+def load_gemini_sdk():
+    """Import the Gemini SDK found at startup (once); None if there is none"""
+    global genai
+    if genai is None and GEMINI_SDK is not None:
+        genai = importlib.import_module(GEMINI_SDK)
+    return genai
+
+# Async HTTP client for the native Gemini REST transport
+HTTPX_AVAILABLE = module_available("httpx")
+SPEECH_RECOGNITION_AVAILABLE = module_available("speech_recognition")
 
 # Try to load environment variables
 try:
@@ -52,7 +86,30 @@ except ImportError:
 
 # ---------- CONFIG ----------
 PORT = 8765
+HTTP_PORT = 8081  # chat history and stats API, served from the same event loop
+HTTP_CORS_ORIGIN = "*"  # client.html is usually opened from file:// or another port
+HTTP_KEEPALIVE_TIMEOUT = 15.0
+HTTP_HANDLER_TIMEOUT = 30.0
+# With more than one worker, a supervisor runs that many server processes sharing the ports (SO_REUSEPORT)
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', "1"))
+# Replies are generated off each connection's read loop, one job at a time
+SESSION_MAX_PENDING = 4  # generation jobs waiting per connection before new ones are refused
+SESSION_SUPERSEDE = True  # a new user message cancels the reply still being worked on for the previous one
+# Engines load on first use and the TTS probe runs after the ports are open; preflight loads and
+# probes everything before listening (also: python server.py --preflight)
+SERVER_PREFLIGHT = os.getenv('SERVER_PREFLIGHT', "").lower() in ("1", "true", "yes")
+WORKER_SHUTDOWN_GRACE = 10.0  # seconds a worker gets to flush logs and close connections
 LOG_FILE = "chat_log.csv"
+# Chat log rows are queued and appended by one writer task in batches
+CHAT_LOG_FLUSH_INTERVAL = 0.25  # seconds a row may wait for more rows to join its batch
+CHAT_LOG_MAX_BATCH = 256  # rows per write
+CHAT_LOG_MAX_QUEUE = 10000  # rows waiting to be written before loggers are made to wait
+CHAT_LOG_FSYNC = "batch"  # "batch" (fsync after every write), "interval" (at most once a second) or "never"
+# Indexed copy of the chat log that /chat_history pages through
+CHAT_HISTORY_DB = os.getenv('CHAT_HISTORY_DB', "chat_history.db")
+CHAT_HISTORY_PAGE_SIZE = 100  # rows per /chat_history page unless ?limit= says otherwise
+CHAT_HISTORY_MAX_PAGE = 1000
+HTTP_GZIP_MIN_BYTES = 1024  # compress JSON responses at least this large when the client accepts gzip
 AUDIO_LOG_DIR = "audio_logs"
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')  # Your API key from Google AI Studio
 # Prefer faster Flash model; will fall back if unavailable
@@ -61,72 +118,639 @@ PREFERRED_GEMINI_MODELS = [
     "gemini-2.0-flash",
     "gemini-1.5-flash",
 ]
+# Failed models are skipped for BASE seconds, doubling per consecutive failure up to MAX
+MODEL_FAILURE_BACKOFF_BASE = 30.0
+MODEL_FAILURE_BACKOFF_MAX = 600.0
+# Exact-match response cache in front of Gemini (set RESPONSE_CACHE_DIR to persist across restarts)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_ENTRIES = 256
+RESPONSE_CACHE_TTL = 3600.0  # seconds
+RESPONSE_CACHE_DIR = os.getenv('RESPONSE_CACHE_DIR')
+# Gemini calls run on their own thread pool so a burst cannot starve logging/STT work
+LLM_MAX_WORKERS = 8
+LLM_MAX_CONCURRENCY = 8  # upstream calls allowed at once
+LLM_MAX_QUEUE = 32  # requests allowed to wait for a slot before new ones are rejected
+LLM_BUSY_MESSAGE = "I'm handling a lot of requests right now. Please try again in a moment."
+LLM_TIMEOUT_MESSAGE = "I'm still thinking; here is a brief answer while I finish processing."
+LLM_INTERRUPTED_MESSAGE = "Sorry, something went wrong while I was answering, so this reply is incomplete."
+# Native async transport: one pooled keep-alive HTTP client shared by text, TTS and the startup probe
+GEMINI_API_BASE = os.getenv('GEMINI_API_BASE', "https://generativelanguage.googleapis.com/v1beta/")
+GEMINI_HTTP_MAX_CONNECTIONS = 20
+GEMINI_HTTP_KEEPALIVE_EXPIRY = 60.0  # seconds an idle pooled connection is kept open
+# Per-session conversation memory; token counts are estimated at ~4 characters per token
+CONVERSATION_HISTORY_TOKENS = 600  # recent turns kept verbatim in each prompt
+CONVERSATION_SUMMARY_TOKENS = 150  # older turns are folded into a summary of at most this size
+CONVERSATION_MAX_SESSIONS = 1000
+CONVERSATION_IDLE_TTL = 1800.0  # seconds before an idle session's memory is dropped
+# Local (pyttsx3) TTS fallback runs in worker processes, each with its own engine
+LOCAL_TTS_WORKERS = max(1, min(4, os.cpu_count() or 1))
+LOCAL_TTS_JOB_TIMEOUT = 30.0  # seconds before a stuck worker is killed and replaced
+LOCAL_TTS_RATE = 150  # Speed of speech
+LOCAL_TTS_VOLUME = 0.9  # Volume level (0.0 to 1.0)
 # TTS model for voice integration
 TTS_MODEL = "gemini-2.5-flash-preview-tts"
 # Toggle to enable TTS for voice responses only
 ENABLE_TTS_FOR_VOICE = True  # Enable TTS only for voice input responses
+# Speak voice replies sentence by sentence while the text is still being generated
+TTS_PIPELINE_ENABLED = True
+TTS_PIPELINE_CONCURRENCY = 3  # sentences synthesized at once per reply
+TTS_MIN_SENTENCE_CHARS = 20  # shorter fragments are merged into the next sentence
+# Synthesized speech is cached by (text, voice, rate, backend); each distinct clip is stored once
+# under TTS_CACHE_DIR, named by its content hash, and log rows point at that shared file
+TTS_CACHE_MEMORY_BYTES = 32 * 1024 * 1024
+TTS_CACHE_DIR = os.path.join(AUDIO_LOG_DIR, "tts_cache")
+# Streaming voice input: 16-bit mono PCM chunks while the user talks, endpointed by energy VAD
+STT_STREAM_SAMPLE_RATE = 16000
+STT_STREAM_BUFFER_SECONDS = 30.0  # per-session ring buffer; also the longest single utterance
+STT_VAD_THRESHOLD = 300  # minimum RMS treated as speech
+STT_VAD_ENDPOINT_MS = 600  # trailing silence that ends an utterance
+# Speech-to-text backend: "google" (network, default) or a local model run in warm worker
+# processes: "vosk" (STT_MODEL = model directory) or "whisper" (STT_MODEL = size, e.g. base.en)
+STT_BACKEND = os.getenv('STT_BACKEND', "google")
+STT_MODEL = os.getenv('STT_MODEL')
+STT_WORKERS = max(1, min(4, os.cpu_count() or 1))
+STT_MAX_BATCH = 8  # utterances from different sessions recognized in one worker call
+STT_BATCH_WINDOW = 0.02  # seconds to wait for more utterances before dispatching a batch
+STT_SAMPLE_RATE = 16000  # local models take 16 kHz mono PCM
+# Voice blobs are decoded to 16-bit mono PCM at this rate, what both STT paths want. WAV is
+# converted in process; compressed containers go to long-lived decoder processes using
+# PyAV if installed, else ffmpeg ("auto"), or the one named in AUDIO_DECODER
+DECODE_SAMPLE_RATE = STT_SAMPLE_RATE
+DECODE_WORKERS = 2
+AUDIO_DECODER = os.getenv('AUDIO_DECODER', "auto")
+# Work that holds the event loop longer than this is reported with its stack (0 turns the watchdog off)
+LOOP_STALL_THRESHOLD = float(os.getenv('LOOP_STALL_THRESHOLD_MS', "250")) / 1000
+# /debug/profile samples the running server's stacks into flamegraph input; off unless enabled
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', "").lower() in ("1", "true", "yes")
+PROFILER_MAX_SECONDS = HTTP_HANDLER_TIMEOUT - 5
+PROFILER_INTERVAL = 0.005  # seconds between stack samples
 # ----------------------------
 
 # Create audio logs directory
 if not os.path.exists(AUDIO_LOG_DIR):
     os.makedirs(AUDIO_LOG_DIR)
 
+# Metrics served on /metrics; gauges read from existing state are registered next to http_api
+metrics = MetricsRegistry(prefix="voicebot_")
+STAGE_SECONDS = metrics.histogram("stage_seconds", "Time spent in each stage of a turn", ["stage"])
+STAGE_ERRORS = metrics.counter("stage_errors_total", "Stages that ended in an error", ["stage"])
+MESSAGES_RECEIVED = metrics.counter("messages_received_total", "WebSocket messages received", ["type"])
+FRAMES_SENT = metrics.counter("frames_sent_total", "WebSocket frames sent", ["kind"])
+BYTES_SENT = metrics.counter("sent_bytes_total", "WebSocket payload bytes sent", ["kind"])
+TTS_FALLBACKS = metrics.counter("tts_local_fallbacks_total", "Replies spoken by the local engine after Gemini TTS failed")
+AUDIO_DECODES = metrics.counter("audio_decodes_total", "Voice blobs decoded, by container and where",
+                                ["format", "path"])
+LOOP_LAG = metrics.histogram("event_loop_lag_seconds", "How late the event loop ran a timer scheduled by the watchdog")
+loop_watchdog = LoopWatchdog(threshold=LOOP_STALL_THRESHOLD, on_lag=LOOP_LAG.observe)
+
+def stage(name):
+    """Time a stage of a turn into STAGE_SECONDS; failures also count in STAGE_ERRORS"""
+    return STAGE_SECONDS.time(errors=STAGE_ERRORS, stage=name)
+
 # Initialize Speech Recognition
 def initialize_speech_recognition():
     """Initialize speech recognition"""
     try:
+        import speech_recognition as sr
         recognizer = sr.Recognizer()
-        print("Speech recognition initialized successfully")
+        log.info("Speech recognition initialized successfully")
         return recognizer
     except Exception as e:
-        print(f"Error initializing speech recognition: {e}")
+        log.error("Error initializing speech recognition: %s", e)
         return None
 
-# Initialize TTS engine
-def initialize_tts():
-    """Initialize text-to-speech engine"""
-    try:
-        engine = pyttsx3.init()
-        # Configure TTS settings
-        engine.setProperty('rate', 150)  # Speed of speech
-        engine.setProperty('volume', 0.9)  # Volume level (0.0 to 1.0)
-        
-        # Get available voices and set a good one
-        voices = engine.getProperty('voices')
-        if voices:
-            # Try to find a female voice, otherwise use the first available
-            for voice in voices:
-                if 'female' in voice.name.lower() or 'zira' in voice.name.lower():
-                    engine.setProperty('voice', voice.id)
-                    break
+def get_speech_recognizer():
+    """The shared recognizer, created on first use"""
+    global speech_recognizer
+    if speech_recognizer is None:
+        speech_recognizer = initialize_speech_recognition()
+    return speech_recognizer
+
+class ModelSelector:
+    """Chooses which Gemini model to call, remembering what worked and what failed.
+
+    The last model that succeeded is tried first. A model that fails is put on
+    a negative cache for a backoff period that doubles with each consecutive
+    failure, so a degraded model does not cost a failed round-trip on every
+    request. Methods are called from worker threads, hence the lock.
+    """
+    def __init__(self, models: list, backoff_base: float = MODEL_FAILURE_BACKOFF_BASE,
+                 backoff_max: float = MODEL_FAILURE_BACKOFF_MAX, clock=time.monotonic):
+        self.models = list(models)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.last_good = None
+        self._failures = {}  # model name -> (consecutive failures, retry-after timestamp)
+        self._lock = threading.Lock()
+
+    def candidates(self) -> list:
+        """Models to try, in order: last good model, then healthy models, then
+        (only if nothing else is left) the failed model whose backoff ends first."""
+        with self._lock:
+            now = self.clock()
+            ordered = list(self.models)
+            if self.last_good in ordered:
+                ordered.remove(self.last_good)
+                ordered.insert(0, self.last_good)
+            healthy = [m for m in ordered if m not in self._failures or self._failures[m][1] <= now]
+            if healthy:
+                return healthy
+            return [min(ordered, key=lambda m: self._failures[m][1])] if ordered else []
+
+    def record_success(self, model: str):
+        with self._lock:
+            self.last_good = model
+            self._failures.pop(model, None)
+
+    def record_failure(self, model: str):
+        with self._lock:
+            count = self._failures.get(model, (0, 0.0))[0] + 1
+            delay = min(self.backoff_base * (2 ** (count - 1)), self.backoff_max)
+            self._failures[model] = (count, self.clock() + delay)
+            if self.last_good == model:
+                self.last_good = None
+            log.warning("Model %s failed %d time(s) in a row; skipping it for %.0fs", model, count, delay)
+
+class ResponseCache:
+    """Exact-match LRU cache of generated replies with TTL and an optional disk tier.
+
+    Keys are a hash of the normalized prompt, the model list and the generation
+    config. The memory tier is bounded by max_entries and evicts least recently
+    used entries; the disk tier stores one small JSON file per key in disk_dir
+    so answers survive restarts. Each entry remembers how long the original
+    generation took, which lets stats() report the latency saved by hits.
+    """
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL,
+                 disk_dir: str = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (stored_at, response, generation seconds)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        """Case-, whitespace- and trailing-punctuation-insensitive form of a prompt"""
+        return " ".join(prompt.lower().split()).rstrip("?!. ")
+
+    @staticmethod
+    def make_key(prompt: str, models, config: dict) -> str:
+        raw = json.dumps([ResponseCache.normalize(prompt), list(models), config], sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Memory-tier lookup; returns the cached reply or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, response, cost = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += cost
+            return response
+
+    def get_disk(self, key: str):
+        """Disk-tier lookup (blocking); promotes hits into the memory tier"""
+        if not self.disk_dir:
+            return None
+        path = os.path.join(self.disk_dir, key + ".json")
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["stored_at"] > self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        self.put(key, entry["response"], entry.get("cost", 0.0), stored_at=entry["stored_at"])
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+            self.saved_seconds += entry.get("cost", 0.0)
+        return entry["response"]
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, key: str, response: str, cost: float = 0.0, stored_at: float = None):
+        with self._lock:
+            self._entries[key] = (stored_at or time.time(), response, cost)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put_disk(self, key: str, response: str, cost: float = 0.0):
+        """Write an entry to the disk tier (blocking); atomic via rename"""
+        if not self.disk_dir:
+            return
+        path = os.path.join(self.disk_dir, key + ".json")
+        tmp_path = f"{path}.{os.getpid()}.tmp"  # worker processes may write the same key
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"stored_at": time.time(), "response": response, "cost": cost}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning("Could not write response cache entry: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "evictions": self.evictions,
+                "api_calls_saved": self.hits,
+                "latency_saved_seconds": round(self.saved_seconds, 3),
+            }
+
+class TTSAudioCache:
+    """Synthesized-speech cache with a memory LRU and a content-addressed disk store.
+
+    Keys are a hash of the whitespace-normalized text plus the voice, rate and
+    backend that produced the audio. The memory tier is bounded by total audio
+    bytes. On disk every distinct clip is written once as <sha256 of audio>.wav
+    and a small index file per key names its blob, so a reply that is spoken
+    again (or produces identical audio under another key) reuses the same file.
+    """
+    def __init__(self, store_dir: str = TTS_CACHE_DIR, max_memory_bytes: int = TTS_CACHE_MEMORY_BYTES):
+        self.store_dir = store_dir
+        self.index_dir = os.path.join(store_dir, "index")
+        self.max_memory_bytes = max_memory_bytes
+        self._entries = OrderedDict()  # key -> (audio bytes, blob path)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.blobs_written = 0
+        self.blobs_deduplicated = 0
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate, backend: str) -> str:
+        raw = json.dumps([" ".join(text.split()), voice, rate, backend])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Memory-tier lookup; returns (audio, blob path) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_disk(self, key: str):
+        """Disk-tier lookup (blocking); promotes hits into the memory tier"""
+        try:
+            with open(os.path.join(self.index_dir, key), encoding='utf-8') as f:
+                blob_path = os.path.join(self.store_dir, f.read().strip() + ".wav")
+            with open(blob_path, 'rb') as f:
+                audio = f.read()
+        except OSError:
+            return None
+        self._remember(key, audio, blob_path)
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+        return audio, blob_path
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def store(self, key: str, audio: bytes):
+        """Add freshly synthesized audio to both tiers (blocking); returns the blob path or None"""
+        digest = hashlib.sha256(audio).hexdigest()
+        blob_path = os.path.join(self.store_dir, digest + ".wav")
+        try:
+            if os.path.exists(blob_path):
+                with self._lock:
+                    self.blobs_deduplicated += 1
             else:
-                engine.setProperty('voice', voices[0].id)
-        
-        print("TTS engine initialized successfully")
-        return engine
-    except Exception as e:
-        print(f"Error initializing TTS engine: {e}")
-        return None
+                tmp_path = f"{blob_path}.{uuid.uuid4().hex}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(audio)
+                os.replace(tmp_path, blob_path)
+                with self._lock:
+                    self.blobs_written += 1
+            index_path = os.path.join(self.index_dir, key)
+            tmp_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(digest)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            log.warning("Could not store TTS audio: %s", e)
+            blob_path = None
+        self._remember(key, audio, blob_path)
+        return blob_path
+
+    def _remember(self, key: str, audio: bytes, blob_path: str):
+        if len(audio) > self.max_memory_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old[0])
+            self._entries[key] = (audio, blob_path)
+            self._memory_bytes += len(audio)
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "memory_bytes": self._memory_bytes,
+                "evictions": self.evictions,
+                "blobs_written": self.blobs_written,
+                "blobs_deduplicated": self.blobs_deduplicated,
+            }
+
+class GeminiAPIError(Exception):
+    """Non-2xx response from the Gemini REST API."""
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code}: {message}")
+        self.status_code = status_code
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = 24000, channels: int = 1, sample_width: int = 2) -> bytes:
+    """Wrap raw little-endian PCM (what Gemini TTS returns) in a WAV container"""
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(sample_width)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm)
+    return buf.getvalue()
+
+class GeminiTransport:
+    """Async REST transport for the Gemini API.
+
+    All requests go through one httpx.AsyncClient whose connection pool keeps
+    TLS connections alive between calls, so nothing blocks the event loop and
+    repeated calls skip the TCP/TLS handshake. base_url can point at a local
+    stand-in server for offline testing.
+    """
+    def __init__(self, api_key: str, base_url: str = GEMINI_API_BASE,
+                 max_connections: int = GEMINI_HTTP_MAX_CONNECTIONS,
+                 keepalive_expiry: float = GEMINI_HTTP_KEEPALIVE_EXPIRY, timeout: float = 30.0):
+        import httpx
+        self.api_key = api_key
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_connections,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = timeout
+        self._http = None
+
+    @property
+    def http(self):
+        # Created lazily so the client belongs to the running event loop
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"x-goog-api-key": self.api_key or ""},
+                limits=self.limits,
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+            )
+        return self._http
+
+    @staticmethod
+    def _body(contents, generation_config: dict = None) -> dict:
+        if isinstance(contents, str):
+            contents = [{"role": "user", "parts": [{"text": contents}]}]
+        body = {"contents": contents}
+        if generation_config:
+            body["generationConfig"] = generation_config
+        return body
+
+    @staticmethod
+    def _raise_for_status(resp, content: bytes):
+        if resp.status_code >= 400:
+            try:
+                message = json.loads(content)["error"]["message"]
+            except Exception:
+                message = content[:200].decode('utf-8', 'replace')
+            raise GeminiAPIError(resp.status_code, message)
+
+    async def generate_content(self, model: str, contents, generation_config: dict = None) -> dict:
+        resp = await self.http.post(f"models/{model}:generateContent",
+                                    json=self._body(contents, generation_config))
+        self._raise_for_status(resp, resp.content)
+        return resp.json()
+
+    async def stream_generate_content(self, model: str, contents, generation_config: dict = None):
+        """Yield response payloads from the server-sent-events streaming endpoint"""
+        async with self.http.stream("POST", f"models/{model}:streamGenerateContent",
+                                    params={"alt": "sse"},
+                                    json=self._body(contents, generation_config)) as resp:
+            if resp.status_code >= 400:
+                self._raise_for_status(resp, await resp.aread())
+            async for line in resp.aiter_lines():
+                if line.startswith("data:"):
+                    yield json.loads(line[5:])
+
+    @staticmethod
+    def _parts(payload: dict) -> list:
+        parts = []
+        for cand in payload.get("candidates") or []:
+            parts.extend((cand.get("content") or {}).get("parts") or [])
+        return parts
+
+    @staticmethod
+    def response_text(payload: dict) -> str:
+        return "".join(p["text"] for p in GeminiTransport._parts(payload) if isinstance(p.get("text"), str))
+
+    @staticmethod
+    def response_audio(payload: dict):
+        """Return (audio bytes, mime type) from the first inline audio part, or (None, None)"""
+        for part in GeminiTransport._parts(payload):
+            inline = part.get("inlineData") or part.get("inline_data")
+            if inline and inline.get("data"):
+                return base64.b64decode(inline["data"]), inline.get("mimeType") or inline.get("mime_type")
+        return None, None
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+class LLMOverloadedError(Exception):
+    """Raised when the Gemini admission queue is full."""
+
+class _InFlight:
+    """One upstream generation shared by every caller asking the same prompt."""
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+class _SharedStream:
+    """Fan-out of one upstream stream to every caller asking the same prompt.
+
+    Chunks are kept so that a caller joining late replays what it missed.
+    """
+    def __init__(self):
+        self.task = None
+        self.followers = 0
+        self.chunks = []
+        self.done = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, chunk=None, done=False):
+        async with self._changed:
+            if chunk is not None:
+                self.chunks.append(chunk)
+            self.done = self.done or done
+            self._changed.notify_all()
+
+    async def follow(self):
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.chunks) or self.done)
+                new_chunks = self.chunks[index:]
+            index += len(new_chunks)
+            for chunk in new_chunks:
+                yield chunk
+            if self.done and index >= len(self.chunks):
+                return
 
 class GeminiClient:
-    """Async wrapper for Gemini text generation with lazy initialization."""
-    def __init__(self, api_key: str, preferred_models: list, max_tokens: int = 128, temperature: float = 0.7):
+    """Async wrapper for Gemini text generation with lazy initialization.
+
+    When httpx is available, calls go through the native async GeminiTransport;
+    otherwise the blocking SDK runs on a dedicated executor. Either way calls
+    wait behind an admission semaphore with a bounded queue, and identical
+    in-flight prompts are coalesced so concurrent callers share one call.
+    """
+    def __init__(self, api_key: str, preferred_models: list, max_tokens: int = 128, temperature: float = 0.7,
+                 response_cache: ResponseCache = None, max_workers: int = LLM_MAX_WORKERS,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_queue: int = LLM_MAX_QUEUE):
         self.api_key = api_key
         self.preferred_models = preferred_models
         self.max_tokens = max_tokens
         self.temperature = temperature
         self.model = None
+        self.transport = None
         self.initialized = False
+        self.model_selector = ModelSelector(preferred_models)
+        self.response_cache = response_cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._admission = None  # created on first use so it binds to the running loop
+        self._queued = 0
+        self._active = 0
+        self._inflight = {}  # request key -> _InFlight
+        self._streams = {}  # request key -> _SharedStream
+        self.coalesced = 0
+        self.rejected = 0
+
+    async def _run_blocking(self, fn, *args):
+        """Run a blocking SDK call on the Gemini executor"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    @contextlib.asynccontextmanager
+    async def _admission_slot(self):
+        """Hold one of max_concurrency upstream slots; reject when too many are waiting"""
+        if self._admission is None:
+            self._admission = asyncio.Semaphore(self.max_concurrency)
+        if self._admission.locked() and self._queued >= self.max_queue:
+            self.rejected += 1
+            raise LLMOverloadedError(f"{self._queued} requests already waiting")
+        self._queued += 1
+        try:
+            await self._admission.acquire()
+        finally:
+            self._queued -= 1
+        self._active += 1
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._admission.release()
+
+    def stats(self) -> dict:
+        return {
+            "active_calls": self._active,
+            "queued": self._queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
+
+    def _request_key(self, prompt: str) -> str:
+        return ResponseCache.make_key(prompt, self.preferred_models, self._generation_config())
+
+    def _generation_config(self) -> dict:
+        return {
+            "candidate_count": 1,
+            "max_output_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": 0.95,
+        }
+
+    async def _cache_lookup(self, key):
+        if key is None:
+            return None
+        cached = self.response_cache.get(key)
+        if cached is None and self.response_cache.disk_dir:
+            cached = await asyncio.to_thread(self.response_cache.get_disk, key)
+        if cached is None:
+            self.response_cache.record_miss()
+        return cached
+
+    def _cache_store(self, key, response: str, cost: float):
+        if key is None or not response:
+            return
+        self.response_cache.put(key, response, cost)
+        if self.response_cache.disk_dir:
+            asyncio.create_task(asyncio.to_thread(self.response_cache.put_disk, key, response, cost))
 
     def _init_blocking(self):
         try:
+            genai = load_gemini_sdk()
+            if genai is None:
+                log.error("Error initializing Gemini: no Gemini SDK installed (pip install google-genai)")
+                return False
             # Try new google.genai library first
             if hasattr(genai, 'Client'):
                 # New API
                 self.client = genai.Client(api_key=self.api_key)
                 self.model = None  # Not needed for new API
                 self.initialized = True
-                print(f"Using new Google GenAI API")
+                log.info("Using new Google GenAI API")
                 return True
             else:
                 # Fallback to old API
@@ -136,7 +760,7 @@ class GeminiClient:
                     try:
                         self.model = genai.GenerativeModel(name)
                         self.initialized = True
-                        print(f"Using Gemini model: {name}")
+                        log.info("Using Gemini model: %s", name)
                         return True
                     except Exception as e:
                         last_error = e
@@ -145,87 +769,119 @@ class GeminiClient:
                     raise last_error
                 return False
         except Exception as e:
-            print(f"Error initializing Gemini: {e}")
+            log.error("Error initializing Gemini: %s", e)
             return False
 
     async def ensure_initialized(self) -> bool:
-        if self.initialized and self.model is not None:
+        if self.initialized:
+            return True
+        if HTTPX_AVAILABLE and self.api_key:
+            # Importing httpx and building the client (which loads CA certificates) stay off the loop
+            transport = await self._run_blocking(GeminiTransport, self.api_key)
+            await self._run_blocking(lambda: transport.http)
+            self.transport = transport
+            self.initialized = True
+            log.info("Using async Gemini REST transport")
             return True
         try:
-            return await asyncio.to_thread(self._init_blocking)
+            return await self._run_blocking(self._init_blocking)
         except Exception as e:
-            print(f"Error initializing Gemini: {e}")
+            log.error("Error initializing Gemini: %s", e)
             self.initialized = False
             self.model = None
             return False
 
     async def generate(self, prompt: str) -> str:
+        """Reply text for prompt, or an error/busy message; timed as the "llm" stage"""
+        with stage("llm") as span:
+            text = await self._generate(prompt)
+            span.failed = is_generation_error(text)
+        return text
+
+    async def _generate(self, prompt: str) -> str:
         ok = await self.ensure_initialized()
         if not ok:
             return "Error: Gemini model not initialized. Please check your API key configuration."
+        key = self._request_key(prompt)
+        cache_key = key if self.response_cache is not None else None
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            log.debug("Response cache hit for prompt: %.50s", prompt)
+            return cached
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            entry = _InFlight(asyncio.ensure_future(self._generate_upstream(prompt, cache_key)))
+            self._inflight[key] = entry
+
+            def _forget(_task, key=key, entry=entry):
+                if self._inflight.get(key) is entry:
+                    del self._inflight[key]
+            entry.task.add_done_callback(_forget)
+        else:
+            self.coalesced += 1
+            log.debug("Coalesced with in-flight request for prompt: %.50s", prompt)
+        entry.waiters += 1
+        try:
+            # shield: one caller giving up must not cancel the call for the others
+            return await asyncio.shield(entry.task)
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0 and not entry.task.done():
+                entry.task.cancel()
+
+    async def _generate_upstream(self, prompt: str, cache_key) -> str:
+        failures = []
         def _gen():
             try:
                 # Try new API first
                 if hasattr(self, 'client'):
                     try:
-                        print(f"Calling new Google GenAI API with prompt: {prompt[:100]}...")
-                        # Try different model names in order of preference
-                        models_to_try = [
-                            "gemini-2.5-flash",
-                            "gemini-2.0-flash-exp",
-                            "gemini-2.0-flash",
-                            "gemini-1.5-flash"
-                        ]
+                        log.debug("Calling new Google GenAI API with prompt: %.100s", prompt)
+                        # Last working model first; models in backoff are skipped
+                        models_to_try = self.model_selector.candidates()
                         
                         last_error = None
                         resp = None
                         for model_name in models_to_try:
                             try:
-                                print(f"Trying model: {model_name}")
+                                log.debug("Trying model: %s", model_name)
                                 resp = self.client.models.generate_content(
                                     model=model_name,
                                     contents=prompt
                                 )
-                                print(f"Successfully used model: {model_name}")
+                                self.model_selector.record_success(model_name)
+                                log.debug("Successfully used model: %s", model_name)
                                 break
                             except Exception as e:
-                                print(f"Failed with model {model_name}: {e}")
+                                log.warning("Failed with model %s: %s", model_name, e)
+                                self.model_selector.record_failure(model_name)
                                 last_error = e
                                 continue
                         else:
                             # If all models failed
                             raise last_error or Exception("All models failed")
                         
-                        print(f"API response received: {type(resp)}")
-                        print(f"Response attributes: {dir(resp)}")
+                        log.debug("API response received: %s", type(resp).__name__)
                         # New API has simple .text accessor
                         if hasattr(resp, 'text'):
                             result = resp.text if resp.text else ""
-                            print(f"Text extracted: {result[:100]}...")
+                            log.debug("Text extracted: %.100s", result)
                             return result
                         else:
-                            print(f"Response has no 'text' attribute. Full response: {resp}")
+                            log.warning("Response has no 'text' attribute: %s", resp)
                             return str(resp)
                     except Exception as e:
-                        print(f"Error calling new Google GenAI API: {e}")
+                        log.error("Error calling new Google GenAI API: %s", e)
                         raise e
                 else:
                     # Fallback to old API
-                    cfg = {
-                        "candidate_count": 1,
-                        "max_output_tokens": self.max_tokens,
-                        "temperature": self.temperature,
-                        "top_p": 0.95,
-                    }
+                    cfg = self._generation_config()
                     resp = self.model.generate_content(prompt, generation_config=cfg)
                     
-                    # Debug: Log response structure for troubleshooting
-                    print(f"Response type: {type(resp)}")
-                    print(f"Response attributes: {dir(resp)}")
-                    if hasattr(resp, 'parts'):
-                        print(f"Response has {len(resp.parts)} parts")
-                    if hasattr(resp, 'candidates'):
-                        print(f"Response has {len(resp.candidates)} candidates")
+                    if log.isEnabledFor(logging.DEBUG):
+                        log.debug("Response %s: %s parts, %s candidates", type(resp).__name__,
+                                  len(getattr(resp, 'parts', None) or ()), len(getattr(resp, 'candidates', None) or ()))
                     
                     # Robust text extraction: support multi-part responses
                     def extract_text(r) -> str:
@@ -272,53 +928,443 @@ class GeminiClient:
                             return "No text content found in response"
                             
                         except Exception as e:
-                            print(f"Error extracting text from response: {e}")
+                            log.error("Error extracting text from response: %s", e)
                             return f"Error extracting response: {e}"
                     text = extract_text(resp)
                     return text if text else ""
             except Exception as e:
-                print(f"Error in text generation: {e}")
+                log.error("Error in text generation: %s", e)
+                failures.append(e)
                 return f"Error generating response: {e}"
         try:
-            return await asyncio.wait_for(asyncio.to_thread(_gen), timeout=30.0)  # Increased timeout to 30 seconds
+            async with self._admission_slot():
+                started = time.perf_counter()
+                if self.transport is not None:
+                    call = self._generate_native(prompt)
+                else:
+                    call = self._run_blocking(_gen)
+                result = await asyncio.wait_for(call, timeout=30.0)  # Increased timeout to 30 seconds
+            if not failures:
+                self._cache_store(cache_key, result, time.perf_counter() - started)
+            return result
+        except LLMOverloadedError as e:
+            log.warning("Rejecting Gemini request, admission queue full: %s", e)
+            return LLM_BUSY_MESSAGE
         except asyncio.TimeoutError:
-            return "I'm still thinking; here is a brief answer while I finish processing."
+            return LLM_TIMEOUT_MESSAGE
         except Exception as e:
+            log.error("Error in text generation: %s", e)
             return f"Error generating response: {e}"
 
-# Initialize all models
-speech_recognizer = initialize_speech_recognition()
-tts_engine = initialize_tts()
-gemini_client = GeminiClient(GEMINI_API_KEY, PREFERRED_GEMINI_MODELS, max_tokens=128, temperature=0.7)
+    async def _generate_native(self, prompt: str) -> str:
+        last_error = None
+        for model_name in self.model_selector.candidates():
+            try:
+                payload = await self.transport.generate_content(model_name, prompt)
+            except Exception as e:
+                log.warning("Failed with model %s: %s", model_name, e)
+                self.model_selector.record_failure(model_name)
+                last_error = e
+                continue
+            self.model_selector.record_success(model_name)
+            return GeminiTransport.response_text(payload)
+        raise last_error or Exception("All models failed")
+
+    async def _stream_native(self, prompt: str):
+        last_error = None
+        for model_name in self.model_selector.candidates():
+            started = False
+            try:
+                async for payload in self.transport.stream_generate_content(model_name, prompt):
+                    text = GeminiTransport.response_text(payload)
+                    if text:
+                        if not started:
+                            self.model_selector.record_success(model_name)
+                        started = True
+                        yield text
+                return
+            except Exception as e:
+                # Once text has reached the caller we cannot switch models
+                if started:
+                    raise
+                log.warning("Failed streaming with model %s: %s", model_name, e)
+                self.model_selector.record_failure(model_name)
+                last_error = e
+        raise last_error or Exception("All models failed")
+
+    def _stream_blocking(self, prompt: str):
+        """Blocking generator yielding text chunks from the streaming SDK call."""
+        if hasattr(self, 'client'):
+            last_error = None
+            for model_name in self.model_selector.candidates():
+                started = False
+                try:
+                    log.debug("Streaming with model: %s", model_name)
+                    for chunk in self.client.models.generate_content_stream(
+                        model=model_name,
+                        contents=prompt
+                    ):
+                        text = getattr(chunk, 'text', None)
+                        if text:
+                            if not started:
+                                self.model_selector.record_success(model_name)
+                            started = True
+                            yield text
+                    return
+                except Exception as e:
+                    # Once text has reached the caller we cannot switch models
+                    if started:
+                        raise
+                    log.warning("Failed streaming with model %s: %s", model_name, e)
+                    self.model_selector.record_failure(model_name)
+                    last_error = e
+                    continue
+            raise last_error or Exception("All models failed")
+        else:
+            cfg = self._generation_config()
+            for chunk in self.model.generate_content(prompt, generation_config=cfg, stream=True):
+                try:
+                    text = chunk.text
+                except Exception:
+                    # Chunks without text parts (e.g. safety metadata) raise on .text
+                    continue
+                if text:
+                    yield text
+
+    async def generate_stream(self, prompt: str, timeout: float = 30.0):
+        """Async iterator over response text chunks as Gemini produces them.
+
+        The blocking SDK stream runs in a worker thread and hands chunks to the
+        event loop through a queue, so the first chunk can be forwarded to the
+        client while the rest of the reply is still being generated. Callers
+        streaming the same prompt at the same time share one upstream stream.
+        """
+        ok = await self.ensure_initialized()
+        if not ok:
+            yield "Error: Gemini model not initialized. Please check your API key configuration."
+            return
+
+        key = self._request_key(prompt)
+        cache_key = key if self.response_cache is not None else None
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            log.debug("Response cache hit for prompt: %.50s", prompt)
+            yield cached
+            return
+
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream()
+            shared.task = asyncio.ensure_future(self._stream_upstream(prompt, cache_key, shared, timeout))
+            self._streams[key] = shared
+
+            def _forget(_task, key=key, shared=shared):
+                if self._streams.get(key) is shared:
+                    del self._streams[key]
+            shared.task.add_done_callback(_forget)
+        else:
+            self.coalesced += 1
+            log.debug("Coalesced with in-flight stream for prompt: %.50s", prompt)
+        shared.followers += 1
+        try:
+            async for chunk in shared.follow():
+                yield chunk
+        finally:
+            shared.followers -= 1
+            if shared.followers == 0 and not shared.task.done():
+                # Nobody is listening anymore; stop the upstream stream
+                shared.task.cancel()
+
+    async def _stream_upstream(self, prompt: str, cache_key, shared: _SharedStream, timeout: float):
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        stop = threading.Event()
+        finished = object()
+
+        def _put(item):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed; nobody is listening anymore
+                pass
+
+        def _produce():
+            try:
+                for text in self._stream_blocking(prompt):
+                    if stop.is_set():
+                        break
+                    _put(text)
+            except Exception as e:
+                _put(e)
+            finally:
+                _put(finished)
+
+        async def _pump():
+            try:
+                async for text in self._stream_native(prompt):
+                    chunks.put_nowait(text)
+            except Exception as e:
+                chunks.put_nowait(e)
+            finally:
+                chunks.put_nowait(finished)
+
+        received = []
+        pump = None
+        try:
+            async with self._admission_slot():
+                if self.transport is not None:
+                    pump = asyncio.ensure_future(_pump())
+                else:
+                    loop.run_in_executor(self.executor, _produce)
+                started = time.perf_counter()
+                deadline = loop.time() + timeout
+                while True:
+                    item = await asyncio.wait_for(chunks.get(), timeout=max(0.0, deadline - loop.time()))
+                    if item is finished:
+                        # Only complete, error-free replies are cached
+                        self._cache_store(cache_key, "".join(received), time.perf_counter() - started)
+                        break
+                    if isinstance(item, Exception):
+                        if received:
+                            # Mark the reply as cut short rather than passing it off as complete
+                            log.error("Error in streaming generation after %d chunks: %s", len(received), item)
+                            await shared.publish(f"\n\n{LLM_INTERRUPTED_MESSAGE}")
+                        else:
+                            log.error("Error in streaming generation: %s", item)
+                            await shared.publish(f"Error generating response: {item}")
+                        break
+                    received.append(item)
+                    await shared.publish(item)
+        except LLMOverloadedError as e:
+            log.warning("Rejecting Gemini stream, admission queue full: %s", e)
+            await shared.publish(LLM_BUSY_MESSAGE)
+        except asyncio.TimeoutError:
+            if received:
+                # Mark the reply as cut short rather than passing it off as complete
+                log.warning("Gemini stream timed out after %d chunks", len(received))
+                await shared.publish(f"\n\n{LLM_TIMEOUT_MESSAGE}")
+            else:
+                await shared.publish(LLM_TIMEOUT_MESSAGE)
+        finally:
+            # Tell the producer to stop pulling chunks if the consumer went away
+            stop.set()
+            if pump is not None:
+                pump.cancel()
+            await shared.publish(done=True)
+
+    def _synthesize_blocking(self, text: str, model: str):
+        """SDK fallback for TTS; returns (audio bytes, mime type)"""
+        if not hasattr(self, 'client'):
+            raise RuntimeError("Gemini client not available for TTS")
+        resp = self.client.models.generate_content(
+            model=model,
+            contents=text,
+            config={"response_modalities": ["AUDIO"]}
+        )
+        for cand in getattr(resp, 'candidates', None) or []:
+            content = getattr(cand, 'content', None)
+            for part in getattr(content, 'parts', None) or []:
+                inline = getattr(part, 'inline_data', None)
+                if inline is not None and inline.data:
+                    return inline.data, inline.mime_type
+                if getattr(part, 'audio', None):
+                    return part.audio, None
+        return None, None
+
+    async def synthesize_speech(self, text: str, model: str = TTS_MODEL) -> bytes:
+        """Generate speech for text with the Gemini TTS model; returns WAV bytes"""
+        ok = await self.ensure_initialized()
+        if not ok:
+            raise RuntimeError("Gemini client not initialized")
+        async with self._admission_slot():
+            if self.transport is not None:
+                payload = await self.transport.generate_content(
+                    model, text, generation_config={"responseModalities": ["AUDIO"]})
+                audio, mime_type = GeminiTransport.response_audio(payload)
+            else:
+                audio, mime_type = await self._run_blocking(self._synthesize_blocking, text, model)
+        if not audio:
+            raise ValueError("TTS response has no audio content")
+        # Gemini TTS returns raw 16-bit PCM, e.g. "audio/L16;codec=pcm;rate=24000"
+        if mime_type and ("L16" in mime_type or "pcm" in mime_type):
+            rate = 24000
+            for param in mime_type.split(";"):
+                if param.strip().startswith("rate="):
+                    rate = int(param.strip()[5:])
+            audio = pcm_to_wav(audio, sample_rate=rate)
+        return audio
+
+    async def aclose(self):
+        if self.transport is not None:
+            await self.transport.aclose()
+        self.executor.shutdown(wait=False)
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class Conversation:
+    """Memory of one session: a running summary plus the most recent turns."""
+    def __init__(self):
+        self.summary = ""
+        self.turns = []  # (user text, bot text, estimated tokens)
+        self.history_tokens = 0
+        self.pending = []  # turns pushed out of the window, not yet summarized
+        self.summarizing = None
+        self.last_used = time.monotonic()
+
+class ConversationStore:
+    """Per-session conversation memory with a bounded prompt size.
+
+    Each prompt carries the session's summary and as many recent turns as fit
+    in history_tokens. Turns that slide out of the window are folded into the
+    summary in the background by summarizer(previous_summary, turns), so the
+    prompt stays the same size however long the conversation runs. Sessions
+    are evicted least-recently-used beyond max_sessions or after idle_ttl.
+    """
+    def __init__(self, summarizer=None, history_tokens: int = CONVERSATION_HISTORY_TOKENS,
+                 summary_tokens: int = CONVERSATION_SUMMARY_TOKENS, max_sessions: int = CONVERSATION_MAX_SESSIONS,
+                 idle_ttl: float = CONVERSATION_IDLE_TTL, clock=time.monotonic):
+        self.summarizer = summarizer
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self._sessions = OrderedDict()  # session id -> Conversation
+        self.evictions = 0
+
+    def _get(self, session_id: str, create: bool = False):
+        self._prune()
+        conv = self._sessions.get(session_id)
+        if conv is None and create:
+            conv = self._sessions[session_id] = Conversation()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+        if conv is not None:
+            conv.last_used = self.clock()
+            self._sessions.move_to_end(session_id)
+        return conv
+
+    def _prune(self):
+        """Drop sessions idle for longer than idle_ttl (oldest are at the front)"""
+        now = self.clock()
+        while self._sessions:
+            session_id, conv = next(iter(self._sessions.items()))
+            if now - conv.last_used <= self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def build_prompt(self, session_id: str, user_msg: str) -> str:
+        """Prompt for the next turn: summary, recent turns and the new message"""
+        conv = self._get(session_id)
+        if conv is None or (not conv.summary and not conv.turns):
+            return user_msg
+        lines = []
+        if conv.summary:
+            lines.append(f"Summary of the earlier conversation: {conv.summary}")
+            lines.append("")
+        for user_text, bot_text, _ in conv.turns:
+            lines.append(f"User: {user_text}")
+            lines.append(f"Assistant: {bot_text}")
+        lines.append(f"User: {user_msg}")
+        lines.append("Assistant:")
+        return "\n".join(lines)
+
+    def add_turn(self, session_id: str, user_msg: str, bot_text: str):
+        conv = self._get(session_id, create=True)
+        tokens = estimate_tokens(user_msg) + estimate_tokens(bot_text)
+        conv.turns.append((user_msg, bot_text, tokens))
+        conv.history_tokens += tokens
+        # Slide the window; the newest turn always stays even if it alone is over budget
+        while conv.history_tokens > self.history_tokens and len(conv.turns) > 1:
+            old = conv.turns.pop(0)
+            conv.history_tokens -= old[2]
+            conv.pending.append(old)
+        if conv.pending and conv.summarizing is None:
+            conv.summarizing = asyncio.create_task(self._summarize(conv))
+
+    async def _summarize(self, conv: Conversation):
+        try:
+            while conv.pending:
+                turns, conv.pending = conv.pending, []
+                summary = None
+                if self.summarizer is not None:
+                    try:
+                        summary = await self.summarizer(conv.summary, [(u, b) for u, b, _ in turns])
+                    except Exception as e:
+                        log.warning("Error summarizing conversation: %s", e)
+                    if not summary:
+                        # Keep the old summary and retry these turns with the next ones
+                        conv.pending = turns + conv.pending
+                        if sum(t[2] for t in conv.pending) <= self.history_tokens:
+                            break
+                        # Still failing with a window's worth waiting: stop the backlog growing
+                        turns, conv.pending = conv.pending, []
+                if not summary:
+                    # Extractive fallback: keep what the user asked about
+                    asked = "; ".join(u for u, _, _ in turns)
+                    summary = f"{conv.summary} The user also asked: {asked}".strip()
+                conv.summary = self._truncate(summary.strip(), self.summary_tokens)
+        finally:
+            conv.summarizing = None
+
+    @staticmethod
+    def _truncate(text: str, max_tokens: int) -> str:
+        max_chars = max_tokens * 4
+        return text if len(text) <= max_chars else text[:max_chars - 3].rstrip() + "..."
+
+    def drop(self, session_id: str):
+        conv = self._sessions.pop(session_id, None)
+        if conv is not None and conv.summarizing is not None:
+            conv.summarizing.cancel()
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "evictions": self.evictions}
+
+async def summarize_with_gemini(previous_summary: str, turns: list) -> str:
+    """Summarizer for ConversationStore backed by the shared Gemini client"""
+    transcript = "\n".join(f"User: {u}\nAssistant: {b}" for u, b in turns)
+    words = CONVERSATION_SUMMARY_TOKENS * 3 // 4
+    prompt = (f"Update this conversation summary in at most {words} words, keeping names, "
+              f"facts and preferences the user shared.\n\nCurrent summary: {previous_summary or '(none)'}"
+              f"\n\nNew turns:\n{transcript}\n\nUpdated summary:")
+    summary = await gemini_client.generate(prompt)
+    if is_generation_error(summary):
+        return None
+    return summary
+
+# Initialize all models (engines, SDK clients and worker processes start on first use)
+speech_recognizer = None  # see get_speech_recognizer()
+# Worker processes start on first use, not at import
+tts_pool = TTSWorkerPool(workers=LOCAL_TTS_WORKERS, job_timeout=LOCAL_TTS_JOB_TIMEOUT,
+                         rate=LOCAL_TTS_RATE, volume=LOCAL_TTS_VOLUME)
+tts_cache = TTSAudioCache()
+stt_pool = None if STT_BACKEND == "google" else STTWorkerPool(
+    STT_BACKEND, STT_MODEL, workers=STT_WORKERS, max_batch=STT_MAX_BATCH, batch_window=STT_BATCH_WINDOW)
+decode_pool = DecodeWorkerPool(workers=DECODE_WORKERS, sample_rate=DECODE_SAMPLE_RATE, decoder=AUDIO_DECODER)
+response_cache = ResponseCache(disk_dir=RESPONSE_CACHE_DIR) if RESPONSE_CACHE_ENABLED else None
+gemini_client = GeminiClient(GEMINI_API_KEY, PREFERRED_GEMINI_MODELS, max_tokens=128, temperature=0.7,
+                             response_cache=response_cache)
+conversation_store = ConversationStore(summarizer=summarize_with_gemini)
+
+def is_generation_error(bot_text: str) -> bool:
+    """Replies that should not become part of the conversation memory"""
+    return (bot_text.startswith("Error") or bot_text == LLM_BUSY_MESSAGE
+            or bot_text.endswith((LLM_TIMEOUT_MESSAGE, LLM_INTERRUPTED_MESSAGE)))
 
 # Test TTS model availability
 async def test_tts_model():
     """Test if the TTS model is available and working"""
     try:
-        # Ensure Gemini client is initialized
-        await gemini_client.ensure_initialized()
-        
-        if not hasattr(gemini_client, 'client'):
-            print("❌ Gemini client not available for TTS testing")
-            return False
-        
-        print(f"🧪 Testing TTS model: {TTS_MODEL}")
-        
-        # Try a simple test call - TTS model expects AUDIO output, not TEXT
-        test_resp = gemini_client.client.models.generate_content(
-            model=TTS_MODEL,
-            contents=[{
-                "role": "user",
-                "parts": [{"text": "Hello"}]
-            }]
-        )
-        
-        print(f"✅ TTS model test successful: {type(test_resp)}")
-        print(f"📋 TTS response attributes: {dir(test_resp)}")
+        log.info("🧪 Testing TTS model: %s", TTS_MODEL)
+        audio = await gemini_client.synthesize_speech("Hello")
+        log.info("✅ TTS model test successful: %d bytes of audio", len(audio))
         return True
         
     except Exception as e:
-        print(f"❌ TTS model test failed: {e}")
+        log.warning("❌ TTS model test failed: %s", e)
         return False
 
 # Audio processing functions
@@ -334,217 +1380,574 @@ def is_websocket_open(websocket):
             # If we can't determine, assume it's open and let the send operation fail naturally
             return True
 
-def process_audio_data(audio_base64, session_id):
-    """Convert base64 audio data to text using Google Speech Recognition, fully in-memory to avoid file locks."""
-    try:
-        # Decode base64 audio data
-        audio_bytes = base64.b64decode(audio_base64)
+async def decode_audio(audio) -> "sr.AudioData":
+    """Decode a voice blob (bytes or memoryview) into recognizer input: 16-bit mono
+    PCM at DECODE_SAMPLE_RATE.
 
-        # Save original user audio bytes for logging (as .wav even if container differs)
-        try:
-            audio_filename = f"{AUDIO_LOG_DIR}/user_audio_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-            with open(audio_filename, 'wb') as audio_file:
-                audio_file.write(audio_bytes)
-        except Exception as e:
-            print(f"Warning: could not write user audio log: {e}")
+    PCM WAV is converted in process; other containers (and WAV the fast path
+    cannot convert) go to the decode worker pool. Raises AudioDecodeError.
+    """
+    import speech_recognition as sr
+    fmt = sniff_format(audio)
+    pcm = None
+    if fmt == "wav":
+        # Already in the target format it is one copy, cheaper than a thread hop
+        pcm = wav_to_pcm(audio, DECODE_SAMPLE_RATE, convert=False)
+        if pcm is None:
+            pcm = await asyncio.to_thread(wav_to_pcm, audio, DECODE_SAMPLE_RATE)
+    AUDIO_DECODES.inc(format=fmt or "unknown", path="in_process" if pcm is not None else "worker")
+    if pcm is None:
+        pcm = await decode_pool.decode(audio, fmt)
+    return sr.AudioData(pcm, DECODE_SAMPLE_RATE, 2)
 
-        # Attempt to open as WAV directly (guard against missing file/ffmpeg issues)
-        pcm_bytes: bytes
-        try:
-            with wave.open(io.BytesIO(audio_bytes), 'rb') as wf:
-                pcm_bytes = audio_bytes
-        except Exception:
-            try:
-                # Prefer pydub if ffmpeg available; otherwise raise a clear error
-                sound = AudioSegment.from_file(io.BytesIO(audio_bytes))
-                buf = io.BytesIO()
-                sound.export(buf, format='wav')
-                pcm_bytes = buf.getvalue()
-            except FileNotFoundError as e:
-                return "Error processing audio: ffmpeg or codecs not found. Please install ffmpeg and restart."
-            except Exception as e:
-                return f"Error processing audio: {e}"
+def save_user_audio(audio_bytes, session_id):
+    """Keep the user's original voice blob under AUDIO_LOG_DIR (as .wav even if the container differs)"""
+    try:
+        audio_filename = f"{AUDIO_LOG_DIR}/user_audio_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
+        with open(audio_filename, 'wb') as audio_file:
+            audio_file.write(audio_bytes)
+    except Exception as e:
+        log.warning("Could not write user audio log: %s", e)
 
-        # SpeechRecognition from memory
-        if not speech_recognizer:
-            return "Error: Speech recognition not available"
+async def process_audio_data(audio_bytes, session_id):
+    """Log a voice blob (bytes or memoryview) and decode it in memory.
 
-        with sr.AudioFile(io.BytesIO(pcm_bytes)) as source:
-            audio = speech_recognizer.record(source)
-            transcribed_text = speech_recognizer.recognize_google(audio)
-            print(f"Transcribed: {transcribed_text}")
-            return transcribed_text
+    Returns sr.AudioData ready for recognition, or an "Error ..." string.
+    """
+    try:
+        await asyncio.to_thread(save_user_audio, audio_bytes, session_id)
+        return await decode_audio(audio_bytes)
+    except AudioDecodeError as e:
+        return f"Error processing audio: {e}"
+    except Exception as e:
+        log.error("Error processing audio: %s", e)
+        return f"Error processing audio: {e}"
 
+async def recognize_speech(audio: "sr.AudioData") -> str:
+    """Transcribe a decoded utterance with the configured STT backend; returns text or an "Error ..." string"""
+    with stage("stt") as span:
+        transcribed_text = await _recognize_speech(audio)
+        span.failed = transcribed_text.startswith("Error")
+    return transcribed_text
+
+async def _recognize_speech(audio: "sr.AudioData") -> str:
+    try:
+        if stt_pool is not None:
+            pcm = audio.get_raw_data(convert_rate=STT_SAMPLE_RATE, convert_width=2)
+            transcribed_text = await stt_pool.transcribe(pcm, STT_SAMPLE_RATE)
+        elif SPEECH_RECOGNITION_AVAILABLE and (recognizer := get_speech_recognizer()):
+            transcribed_text = await asyncio.to_thread(recognizer.recognize_google, audio)
+        else:
+            return "Error: Speech recognition not available"
     except Exception as e:
-        print(f"Error processing audio: {e}")
+        log.error("Error processing audio: %s", e)
         return f"Error processing audio: {e}"
+    log.debug("Transcribed: %s", transcribed_text)
+    return transcribed_text
+
+async def transcribe_pcm(pcm: bytes, sample_rate: int) -> str:
+    """Whole-utterance recognition of 16-bit mono PCM; empty string if nothing was understood"""
+    import speech_recognition as sr
+    transcribed_text = await recognize_speech(sr.AudioData(pcm, sample_rate, 2))
+    return "" if transcribed_text.startswith("Error") else transcribed_text
+
+# Recognizer used for streamed voice input; swap in anything with the stt_stream interface
+stream_recognizer = ClipRecognizer(transcribe_pcm)
+voice_streams = {}  # session_id -> VoiceStream while the client is streaming microphone audio
+
+def open_voice_stream(websocket, session_id, sample_rate=STT_STREAM_SAMPLE_RATE):
+    """Start streaming recognition for a session; transcripts are pushed to the client as they form"""
+    async def on_partial(text):
+        if is_websocket_open(websocket):
+            await websocket.send(json.dumps({"type": "transcript_partial", "content": text, "session_id": session_id}))
+
+    async def on_final(text):
+        # Runs as a dispatcher job (submitted at the endpoint), so the reply is part of it
+        log.debug("🎙️ Utterance endpointed: %s", text)
+        if is_websocket_open(websocket):
+            await websocket.send(json.dumps({"type": "transcript_final", "content": text, "session_id": session_id}))
+        await process_text_message(websocket, text, session_id, enable_tts=ENABLE_TTS_FOR_VOICE)
+
+    vad = EnergyVAD(sample_rate, threshold=STT_VAD_THRESHOLD, endpoint_ms=STT_VAD_ENDPOINT_MS)
+    # Final recognition runs on the session's dispatcher; the read loop only runs the VAD
+    voice_streams[session_id] = VoiceStream(stream_recognizer, on_partial, on_final, sample_rate=sample_rate,
+                                            buffer_seconds=STT_STREAM_BUFFER_SECONDS, vad=vad,
+                                            submit=get_dispatcher(websocket, session_id).submit)
+    return voice_streams[session_id]
+
+def audio_log_name(path):
+    """How an audio file is referenced in the chat log: relative to AUDIO_LOG_DIR, or N/A"""
+    return os.path.relpath(path, AUDIO_LOG_DIR) if path else "N/A"
 
-def text_to_speech(text, session_id):
-    """Convert text to speech and return as base64 audio data"""
+async def cached_tts(text, voice, rate, backend, synthesize):
+    """Return (audio bytes, blob path) for text, calling synthesize(text) only on a cache miss"""
+    key = TTSAudioCache.make_key(text, voice, rate, backend)
+    hit = tts_cache.get(key) or await asyncio.to_thread(tts_cache.get_disk, key)
+    if hit:
+        log.debug("🔁 TTS cache hit (%s): %.50s", backend, text)
+        return hit
+    tts_cache.record_miss()
+    audio_data = await synthesize(text)
+    blob_path = await asyncio.to_thread(tts_cache.store, key, audio_data)
+    return audio_data, blob_path
+
+async def text_to_speech(text, session_id):
+    """Convert text to speech with the local TTS worker pool.
+
+    Returns (audio_data, error, audio_file): WAV bytes, and the shared cache
+    blob the audio is stored in, as it should appear in the chat log.
+    """
     try:
-        if not tts_engine:
-            return None, "Error: TTS engine not available"
-        
-        # Create a temporary file for the audio output
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-            temp_file_path = temp_file.name
-        
-        try:
-            # Generate speech
-            tts_engine.save_to_file(text, temp_file_path)
-            tts_engine.runAndWait()
-            
-            # Read the generated audio file with retries (Windows can briefly lock the file)
-            audio_data = None
-            for _ in range(10):
-                try:
-                    with open(temp_file_path, 'rb') as audio_file:
-                        audio_data = audio_file.read()
-                    break
-                except PermissionError:
-                    time.sleep(0.1)
-                except Exception as e:
-                    raise e
-            if audio_data is None:
-                return None, "Error: Could not read generated TTS file"
-            
-            # Save the audio file for logging
-            audio_filename = f"{AUDIO_LOG_DIR}/bot_audio_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-            try:
-                with open(audio_filename, 'wb') as audio_file:
-                    audio_file.write(audio_data)
-            except Exception as e:
-                print(f"Warning: could not save bot audio log: {e}")
-            
-            # Convert to base64
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            return audio_base64, None
-            
-        finally:
-            # Clean up temporary file with retries
-            for _ in range(10):
-                try:
-                    if os.path.exists(temp_file_path):
-                        os.unlink(temp_file_path)
-                    break
-                except PermissionError:
-                    time.sleep(0.1)
-                except Exception:
-                    break
-                
+        with stage("tts_local"):
+            audio_data, blob_path = await cached_tts(text, "default", LOCAL_TTS_RATE, "local", tts_pool.synthesize)
     except Exception as e:
-        print(f"Error in text-to-speech: {e}")
-        return None, f"Error in text-to-speech: {e}"
+        log.error("Error in text-to-speech: %s", e)
+        return None, f"Error in text-to-speech: {e}", None
+    return audio_data, None, audio_log_name(blob_path)
 
 async def generate_tts_with_gemini(text, session_id):
-    """Generate TTS using Gemini TTS model"""
+    """Generate TTS using Gemini TTS model; returns (audio_data, error, audio_file)"""
     try:
-        if not hasattr(gemini_client, 'client'):
-            return None, "Error: Gemini client not available for TTS"
-        
-        print(f"Generating TTS with Gemini TTS model: {text[:100]}...")
-        
-        # Use the TTS model for voice generation
-        # Use the correct TTS API format - TTS model expects AUDIO output
-        resp = None
+        log.debug("Generating TTS with Gemini TTS model: %.100s", text)
         try:
-            # Try the new Google GenAI API format for TTS
-            resp = gemini_client.client.models.generate_content(
-                model=TTS_MODEL,
-                contents=[{
-                    "role": "user",
-                    "parts": [{"text": text}]
-                }]
-            )
-            print(f"TTS API call successful")
+            with stage("tts_gemini"):
+                audio_data, blob_path = await cached_tts(text, TTS_MODEL, None, "gemini", gemini_client.synthesize_speech)
+            log.debug("TTS API call successful")
         except Exception as e:
-            print(f"TTS API call failed: {e}")
-            # Try alternative format
-            try:
-                resp = gemini_client.client.models.generate_content(
-                    model=TTS_MODEL,
-                    contents=text
-                )
-                print(f"TTS API call successful with alternative format")
-            except Exception as alt_error:
-                print(f"TTS API call failed with alternative format: {alt_error}")
-                return None, f"TTS API call failed: {alt_error}"
-        
-        print(f"TTS response received: {type(resp)}")
-        print(f"TTS response attributes: {dir(resp)}")
-        
-        # Extract audio data from response - try multiple approaches
-        audio_data = None
-        
-        # Method 1: Direct audio attribute
-        if hasattr(resp, 'audio') and resp.audio:
-            audio_data = resp.audio
-            print("Found audio in direct 'audio' attribute")
-        
-        # Method 2: Check candidates structure
-        elif hasattr(resp, 'candidates') and resp.candidates:
-            print(f"Checking {len(resp.candidates)} candidates for audio")
-            for i, candidate in enumerate(resp.candidates):
-                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                    for j, part in enumerate(candidate.content.parts):
-                        if hasattr(part, 'audio') and part.audio:
-                            audio_data = part.audio
-                            print(f"Found audio in candidate {i}, part {j}")
-                            break
-                    if audio_data:
-                        break
-        
-        if audio_data:
-            # Convert to base64 for transmission
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-            
-            # Save the audio file for logging
-            audio_filename = f"{AUDIO_LOG_DIR}/bot_audio_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav"
-            try:
-                with open(audio_filename, 'wb') as audio_file:
-                    audio_file.write(audio_data)
-                print(f"Saved TTS audio: {audio_filename}")
-            except Exception as e:
-                print(f"Warning: could not save bot audio log: {e}")
-            
-            return audio_base64, None
-        else:
-            error_msg = f"TTS response has no audio content. Response: {resp}"
-            print(error_msg)
-            return None, error_msg
+            log.warning("TTS API call failed: %s", e)
+            return None, f"TTS API call failed: {e}", None
+        return audio_data, None, audio_log_name(blob_path)
             
     except Exception as e:
-        print(f"Error in Gemini TTS: {e}")
-        return None, f"Error in Gemini TTS: {e}"
-
-# Ensure CSV has header (create if missing or wrong format)
-if not os.path.exists(LOG_FILE):
-    with open(LOG_FILE, mode="w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp_iso", "session_id", "user_message", "bot_response", "user_audio_file", "bot_audio_file"])
-else:
+        log.error("Error in Gemini TTS: %s", e)
+        return None, f"Error in Gemini TTS: {e}", None
+
+async def synthesize_reply_audio(text, session_id):
+    """Speak text with Gemini TTS, falling back to the local engine; returns (audio_data, error, audio_file)"""
+    try:
+        audio_data, tts_error, audio_file = await generate_tts_with_gemini(text, session_id)
+        if tts_error:
+            log.warning("Gemini TTS failed, falling back to local TTS: %s", tts_error)
+            TTS_FALLBACKS.inc()
+            audio_data, tts_error, audio_file = await text_to_speech(text, session_id)
+    except Exception as e:
+        log.warning("Error with Gemini TTS, using local TTS: %s", e)
+        TTS_FALLBACKS.inc()
+        audio_data, tts_error, audio_file = await text_to_speech(text, session_id)
+    return audio_data, tts_error, audio_file
+
+# Clients that sent {"type": "hello", "binary_audio": true} get reply audio as raw
+# binary frames; the lock keeps each header/binary pair adjacent on the socket
+binary_audio_locks = {}  # session_id -> asyncio.Lock
+_audio_ids = itertools.count()
+AUDIO_ID = struct.Struct(">I")  # prefix of each binary audio frame, matching its header's audio_id
+
+async def send_with_audio(websocket, session_id, frame: dict, audio_data: bytes):
+    """Send a JSON frame together with reply audio.
+
+    Negotiated clients get the frame as a small header carrying audio_id and
+    audio_bytes, followed by one binary frame: the audio_id as 4 big-endian
+    bytes, then the WAV. Other clients get the audio base64-encoded in the
+    frame's "audio" field.
+    """
+    lock = binary_audio_locks.get(session_id)
+    if lock is None:
+        frame["audio"] = base64.b64encode(audio_data).decode('utf-8')
+        await websocket.send(json.dumps(frame))
+        return
+    audio_id = next(_audio_ids) % 0xFFFFFFFF + 1  # 1 .. 2**32 - 1; 0 never appears
+    frame["audio_id"] = audio_id
+    frame["audio_bytes"] = len(audio_data)
+    # Shielded, lock included: a reply cancelled mid-send must not leave a header without its audio
+    pair = asyncio.ensure_future(_send_audio_pair(lock, websocket, json.dumps(frame),
+                                                  AUDIO_ID.pack(audio_id) + audio_data))
+    pair.add_done_callback(lambda task: task.cancelled() or task.exception())
+    await asyncio.shield(pair)
+
+async def _send_audio_pair(lock, websocket, header: str, payload: bytes):
+    async with lock:
+        await websocket.send(header)
+        await websocket.send(payload)
+
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+|\n+')
+
+class SentenceSplitter:
+    """Cuts streamed text into sentences as soon as each one is complete."""
+    def __init__(self, min_chars: int = TTS_MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text: str) -> list:
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            sentence = self.buffer[start:match.end()].strip()
+            # Too-short fragments ("Hi.", "Dr.") stay buffered and join the next sentence
+            if len(sentence) >= self.min_chars:
+                sentences.append(sentence)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        rest, self.buffer = self.buffer.strip(), ""
+        return rest
+
+class SpeechPipeline:
+    """Synthesizes a reply sentence by sentence while it is still being generated.
+
+    Up to `concurrency` sentences are synthesized at once, and the audio goes
+    out as audio_chunk frames in sentence order, ending with a frame marked
+    final. Time to first audio becomes first sentence + its TTS, instead of
+    the full reply + TTS of the whole text.
+    """
+    def __init__(self, websocket, session_id, concurrency: int = TTS_PIPELINE_CONCURRENCY):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.splitter = SentenceSplitter()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._jobs = asyncio.Queue()  # synthesis tasks in sentence order, then None
+        self._tasks = []
+        self._sender = None
+        self.chunks_sent = 0
+        self.errors = []
+        self.audio_files = []  # cache blobs of the spoken sentences, in order
+
+    def feed(self, delta: str):
+        for sentence in self.splitter.feed(delta):
+            self._enqueue(sentence)
+
+    def _enqueue(self, sentence: str):
+        task = asyncio.ensure_future(self._synthesize(sentence))
+        self._tasks.append(task)
+        self._jobs.put_nowait(task)
+        if self._sender is None:
+            self._sender = asyncio.ensure_future(self._send_in_order())
+
+    async def _synthesize(self, sentence: str):
+        async with self._slots:
+            return await synthesize_reply_audio(sentence, self.session_id)
+
+    async def _send_in_order(self):
+        while True:
+            task = await self._jobs.get()
+            if task is None:
+                break
+            audio_data, tts_error, audio_file = await task
+            if not audio_data:
+                self.errors.append(tts_error)
+                continue
+            self.audio_files.append(audio_file)
+            if is_websocket_open(self.websocket):
+                await send_with_audio(self.websocket, self.session_id, {
+                    "type": "audio_chunk",
+                    "session_id": self.session_id,
+                    "seq": self.chunks_sent
+                }, audio_data)
+                self.chunks_sent += 1
+        if is_websocket_open(self.websocket):
+            await self.websocket.send(json.dumps({
+                "type": "audio_chunk",
+                "session_id": self.session_id,
+                "seq": self.chunks_sent,
+                "final": True,
+                "tts_error": self.errors[0] if self.errors and not self.chunks_sent else None
+            }))
+
+    def close(self, fallback_text: str = None):
+        """No more text is coming: speak what is buffered (or fallback_text if nothing was)"""
+        rest = self.splitter.flush()
+        if rest:
+            self._enqueue(rest)
+        elif not self._tasks and fallback_text:
+            self._enqueue(fallback_text)
+        self._jobs.put_nowait(None)
+        if self._sender is None:
+            self._sender = asyncio.ensure_future(self._send_in_order())
+
+    async def wait(self) -> int:
+        """Wait until every audio chunk has been sent; returns how many were"""
+        if self._sender is not None:
+            await self._sender
+        return self.chunks_sent
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._sender is not None:
+            self._sender.cancel()
+
+LOG_HEADER = ["timestamp_iso", "session_id", "user_message", "bot_response", "user_audio_file", "bot_audio_file"]
+
+def ensure_log_header(path):
+    """Ensure a chat log CSV has the header (create if missing, back up a legacy format)"""
+    if not os.path.exists(path):
+        with open(path, mode="w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(LOG_HEADER)
+        return
     try:
-        with open(LOG_FILE, encoding='utf-8') as f:
+        with open(path, encoding='utf-8') as f:
             first_line = f.readline()
-        expected_header = ",".join(["timestamp_iso", "session_id", "user_message", "bot_response", "user_audio_file", "bot_audio_file"]) + "\n"
+        expected_header = ",".join(LOG_HEADER) + "\n"
         if first_line != expected_header:
-            backup_path = LOG_FILE + ".backup"
+            backup_path = path + ".backup"
             try:
-                os.replace(LOG_FILE, backup_path)
-                with open(LOG_FILE, mode="w", newline="", encoding="utf-8") as f:
+                os.replace(path, backup_path)
+                with open(path, mode="w", newline="", encoding="utf-8") as f:
                     writer = csv.writer(f)
-                    writer.writerow(["timestamp_iso", "session_id", "user_message", "bot_response", "user_audio_file", "bot_audio_file"])
-                print(f"Backed up legacy log format to {backup_path} and wrote new header.")
+                    writer.writerow(LOG_HEADER)
+                log.info("Backed up legacy log format to %s and wrote new header.", backup_path)
             except Exception as e:
-                print(f"Warning: could not backup/initialize new CSV header: {e}")
+                log.warning("Could not backup/initialize new CSV header: %s", e)
     except Exception as e:
-        print(f"Warning: could not validate CSV header: {e}")
+        log.warning("Could not validate CSV header: %s", e)
+
+def log_shard_path(path, worker_index):
+    """chat_log.csv -> chat_log.worker2.csv: each worker process appends to its own file"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.worker{worker_index}{ext}"
+
+ensure_log_header(LOG_FILE)
+
+try:
+    history_store = ChatHistoryStore(CHAT_HISTORY_DB)
+except Exception as e:
+    history_store = None
+    log.warning("Chat history index unavailable, /chat_history disabled: %s", e)
+
+class ChatLogWriter:
+    """The one writer of the chat log CSV and the chat history index.
+
+    Rows are appended in exactly the order log() was called. A single
+    long-lived task takes rows off a bounded queue, waits up to flush_interval
+    for more to arrive, and appends the whole batch with one open, one write
+    and (per the fsync policy) one fsync, on one thread hop. When the queue is
+    full because the disk is slow, log() waits for room instead of piling up
+    memory. close() writes every queued row before returning.
+    """
+    def __init__(self, path: str = None, flush_interval: float = CHAT_LOG_FLUSH_INTERVAL,
+                 max_batch: int = CHAT_LOG_MAX_BATCH, max_queue: int = CHAT_LOG_MAX_QUEUE,
+                 fsync: str = CHAT_LOG_FSYNC):
+        self.path = path  # None: the module's LOG_FILE at write time
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.fsync = fsync
+        self._queue = None
+        self._task = None
+        self._last_fsync = 0.0
+        self.rows_written = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(self.max_queue)
+            self._task = asyncio.ensure_future(self._run())
+
+    async def log(self, row: list):
+        """Queue one row for appending; waits only while the queue is full"""
+        self._ensure_started()
+        await self._queue.put(row)
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            if batch[0] is not None and self._queue.qsize() < self.max_batch:
+                # Let more rows join this batch instead of writing each one separately
+                await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.max_batch and batch[-1] is not None and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            stop = batch[-1] is None
+            rows = batch[:-1] if stop else batch
+            try:
+                if rows:
+                    await asyncio.to_thread(self._write_batch, rows)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        with stage("log_write") as span:
+            errors = self.errors
+            self._append(batch)
+            span.failed = self.errors > errors
+
+    def _append(self, batch):
+        try:
+            with open(self.path or LOG_FILE, mode="a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerows(batch)
+                f.flush()
+                now = time.monotonic()
+                if self.fsync == "batch" or (self.fsync == "interval" and now - self._last_fsync >= 1.0):
+                    try:
+                        os.fsync(f.fileno())
+                        self.fsyncs += 1
+                        self._last_fsync = now
+                    except OSError:
+                        pass
+            self.rows_written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            log.error("Error logging %d rows to CSV: %s", len(batch), e)
+        if history_store is not None:
+            try:
+                history_store.append(batch)
+            except Exception as e:
+                self.errors += 1
+                log.error("Error indexing %d chat history rows: %s", len(batch), e)
+
+    async def flush(self):
+        """Wait until every row queued so far has been written"""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+
+    async def close(self):
+        """Write all queued rows, then stop the writer task"""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+
+    def stats(self) -> dict:
+        return {
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "errors": self.errors,
+        }
+
+chat_log = ChatLogWriter()
+
+class SessionDispatcher:
+    """Runs one connection's reply jobs off its read loop.
+
+    The read loop hands each chat message, voice recording or TTS request to
+    submit() and goes straight back to reading, so control frames such as
+    ping are answered while a reply is still being generated. Jobs run one at
+    a time in arrival order from a queue of at most max_pending; when it is
+    full the new job is refused. With supersede, a new job cancels the one in
+    progress and drops those still waiting, since the user has moved on.
+    close() cancels everything once the socket is gone, so no Gemini or TTS
+    work keeps running for a disconnected client. Each cancelled job gets a
+    "cancelled" frame so the client can finish its partial reply.
+    """
+    def __init__(self, websocket, session_id, max_pending: int = SESSION_MAX_PENDING,
+                 supersede: bool = SESSION_SUPERSEDE):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.supersede = supersede
+        self._queue = asyncio.Queue(max_pending)
+        self._runner = None
+        self._current = None  # task running the job in progress
+        self._closed = False
+
+    def pending(self) -> int:
+        """Jobs waiting or running"""
+        return self._queue.qsize() + (self._current is not None)
+
+    def submit(self, fn, *args, **kwargs) -> bool:
+        """Queue fn(*args, **kwargs) to run after earlier jobs; returns False if it was refused"""
+        if self._closed:
+            return False
+        if self.supersede:
+            self._cancel_jobs("superseded")
+        if self._queue.full():
+            dispatch_totals["rejected"] += 1
+            asyncio.ensure_future(self._notify("text", content="Still working on your earlier messages; "
+                                                                "please wait a moment and try again."))
+            return False
+        self._queue.put_nowait((fn, args, kwargs))
+        dispatch_totals["jobs"] += 1
+        if self._runner is None:
+            self._runner = asyncio.ensure_future(self._run())
+        return True
+
+    async def _run(self):
+        while True:
+            fn, args, kwargs = await self._queue.get()
+            self._current = asyncio.ensure_future(fn(*args, **kwargs))
+            try:
+                await self._current
+            except asyncio.CancelledError:
+                if self._closed:
+                    raise
+                # Only the job was cancelled (superseded); keep serving the queue
+            except Exception as e:
+                log.error("Error in %s for session %s: %s", getattr(fn, '__name__', 'job'), self.session_id, e)
+                await self._notify("text", content=f"Error processing message: {e}")
+            finally:
+                self._current = None
+                self._queue.task_done()
+
+    def _cancel_jobs(self, reason):
+        while not self._queue.empty():
+            self._queue.get_nowait()
+            self._queue.task_done()
+            dispatch_totals[reason] += 1
+            asyncio.ensure_future(self._notify("cancelled", reason=reason))
+        if self._current is not None and not self._current.done():
+            self._current.cancel()
+            dispatch_totals[reason] += 1
+            asyncio.ensure_future(self._notify("cancelled", reason=reason))
+
+    async def _notify(self, frame_type, **fields):
+        if not self._closed and is_websocket_open(self.websocket):
+            with contextlib.suppress(Exception):
+                await self.websocket.send(json.dumps({"type": frame_type, "session_id": self.session_id, **fields}))
+
+    async def join(self):
+        """Wait until every queued job has finished"""
+        await self._queue.join()
+
+    async def close(self):
+        """The connection is gone: cancel the job in progress and drop the rest"""
+        self._cancel_jobs("abandoned")
+        self._closed = True
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+
+session_dispatchers = {}  # session_id -> SessionDispatcher
+dispatch_totals = {"jobs": 0, "superseded": 0, "abandoned": 0, "rejected": 0}
+
+def get_dispatcher(websocket, session_id) -> SessionDispatcher:
+    dispatcher = session_dispatchers.get(session_id)
+    if dispatcher is None:
+        dispatcher = session_dispatchers[session_id] = SessionDispatcher(websocket, session_id)
+    return dispatcher
+
+active_sessions = set()  # session ids of open WebSocket connections
+SERVER_STARTED = time.monotonic()
+# Filled in as startup progresses; reported by /health
+startup_state = {"import_s": None, "listening_after_s": None, "tts_available": None}
+
+def instrument_send(websocket):
+    """Time every send on this connection as the "ws_send" stage and count frames and bytes"""
+    send = websocket.send
+
+    async def timed_send(message, *args, **kwargs):
+        with stage("ws_send"):
+            await send(message, *args, **kwargs)
+        kind = "text" if isinstance(message, str) else "binary"
+        FRAMES_SENT.inc(kind=kind)
+        BYTES_SENT.inc(len(message), kind=kind)
+    websocket.send = timed_send
 
 async def handle_connection(websocket):
     """Handle WebSocket connections and chat messages"""
+    instrument_send(websocket)
     # Generate unique session ID for this connection
     session_id = str(uuid.uuid4())[:8]
-    print(f"New connection with session ID: {session_id}")
+    log.info("New connection with session ID: %s", session_id)
     # Send session immediately so frontend updates without waiting for first response
     try:
         await websocket.send(json.dumps({
@@ -555,6 +1958,28 @@ async def handle_connection(websocket):
     except Exception:
         pass
     
+    active_sessions.add(session_id)
+    try:
+        await serve_messages(websocket, session_id)
+    finally:
+        dispatcher = session_dispatchers.pop(session_id, None)
+        if dispatcher is not None:
+            await dispatcher.close()
+        # Session ids are per connection, so its memory is useless once the socket closes
+        active_sessions.discard(session_id)
+        conversation_store.drop(session_id)
+        binary_audio_locks.pop(session_id, None)
+        voice_streams.pop(session_id, None)
+
+MESSAGE_TYPES = {"text", "tts_request", "hello", "ping", "audio_stream_start", "audio_stream_end"}
+
+async def serve_messages(websocket, session_id):
+    """Read messages for one connection until it closes.
+
+    Control frames are answered here, in order; replies that need Gemini,
+    TTS or speech recognition go to the session's dispatcher.
+    """
+    dispatcher = get_dispatcher(websocket, session_id)
     async for message in websocket:
         try:
             # Parse the message
@@ -562,50 +1987,30 @@ async def handle_connection(websocket):
                 try:
                     # Try to parse as JSON first (for special commands)
                     data = json.loads(message)
+                    MESSAGES_RECEIVED.inc(type=data.get("type") if data.get("type") in MESSAGE_TYPES else "other")
                     if data.get("type") == "tts_request" and data.get("text"):
                         # Handle TTS request with Gemini TTS model
-                        try:
-                            # Generate text response first
-                            bot_text = await gemini_client.generate(data["text"])
-                            bot_text = bot_text.strip() if isinstance(bot_text, str) else str(bot_text)
-                            
-                            if not bot_text:
-                                bot_text = "I couldn't generate a response. Please try again."
-                            
-                            # Generate TTS using Gemini TTS model
-                            audio_base64, tts_error = await generate_tts_with_gemini(bot_text, session_id)
-                            
-                            # Send response with audio
-                            response_data = {
-                                "type": "text",
-                                "content": bot_text,
-                                "session_id": session_id
-                            }
-                            
-                            if audio_base64:
-                                response_data["audio"] = audio_base64
-                            elif tts_error:
-                                response_data["tts_error"] = tts_error
-                            
-                            print(f"Sending TTS response: {response_data}")
-                            await websocket.send(json.dumps(response_data))
-                            
-                            # Log the interaction
-                            def _log_tts_row():
-                                try:
-                                    with open(LOG_FILE, mode="a", newline="", encoding="utf-8") as f:
-                                        writer = csv.writer(f)
-                                        writer.writerow([datetime.now().isoformat(), session_id, data["text"], bot_text, "N/A", f"bot_audio_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav" if audio_base64 else "N/A"])
-                                except Exception as e:
-                                    print(f"Error logging TTS row: {e}")
-                            asyncio.create_task(asyncio.to_thread(_log_tts_row))
-                            
-                        except Exception as e:
-                            error_response = f"Error processing TTS request: {e}"
-                            await websocket.send(json.dumps({
-                                "type": "text",
-                                "content": error_response
-                            }))
+                        dispatcher.submit(process_tts_request, websocket, data["text"], session_id)
+                        continue
+                    elif data.get("type") == "hello":
+                        # Capability negotiation: opt in to binary audio frames
+                        if data.get("binary_audio"):
+                            binary_audio_locks.setdefault(session_id, asyncio.Lock())
+                        await websocket.send(json.dumps({
+                            "type": "hello",
+                            "session_id": session_id,
+                            "binary_audio": session_id in binary_audio_locks
+                        }))
+                        continue
+                    elif data.get("type") == "audio_stream_start":
+                        # Microphone audio follows as binary PCM chunks until audio_stream_end
+                        open_voice_stream(websocket, session_id,
+                                          int(data.get("sample_rate") or STT_STREAM_SAMPLE_RATE))
+                        continue
+                    elif data.get("type") == "audio_stream_end":
+                        stream = voice_streams.pop(session_id, None)
+                        if stream is not None:
+                            await stream.end()
                         continue
                     elif data.get("type") == "ping":
                         # Handle keep-alive ping
@@ -615,7 +2020,7 @@ async def handle_connection(websocket):
                                 "content": "keep-alive-ack"
                             }))
                         except Exception as e:
-                            print(f"Error sending pong: {e}")
+                            log.warning("Error sending pong: %s", e)
                         continue
                     elif data.get("type") == "text":
                         # Handle text message from structured format
@@ -626,10 +2031,13 @@ async def handle_connection(websocket):
                                 "content": "Please send a non-empty message."
                             }))
                             continue
-                        await process_text_message(websocket, user_msg, session_id, enable_tts=False)
+                        # Clients that understand text_delta/text_done frames opt in with "stream": true
+                        dispatcher.submit(process_text_message, websocket, user_msg, session_id, enable_tts=False,
+                                          stream=bool(data.get("stream")))
                         continue
                 except json.JSONDecodeError:
                     # Handle plain text message (backward compatibility)
+                    MESSAGES_RECEIVED.inc(type="plain_text")
                     user_msg = message.strip()
                     if not user_msg:
                         await websocket.send(json.dumps({
@@ -639,110 +2047,189 @@ async def handle_connection(websocket):
                         continue
                     
                     # Process text message without TTS for faster responses
-                    await process_text_message(websocket, user_msg, session_id, enable_tts=False)
+                    dispatcher.submit(process_text_message, websocket, user_msg, session_id, enable_tts=False)
                 
+            elif session_id in voice_streams:
+                # A chunk of streamed microphone audio
+                MESSAGES_RECEIVED.inc(type="audio_stream_chunk")
+                await voice_streams[session_id].feed(message)
             else:
-                # Handle binary audio message
-                await process_audio_message(websocket, message, session_id)
+                # Handle binary audio message (one complete recording)
+                MESSAGES_RECEIVED.inc(type="audio")
+                dispatcher.submit(process_audio_message, websocket, message, session_id)
                 
         except Exception as e:
             error_response = f"Error processing message: {e}"
-            print(f"Error in handle_connection: {e}")
+            log.error("Error in handle_connection: %s", e)
             await websocket.send(json.dumps({
                 "type": "text",
                 "content": error_response
             }))
 
-async def process_text_message(websocket, user_msg, session_id, enable_tts=False):
-    """Process text message and generate response"""
+async def process_tts_request(websocket, text, session_id):
+    """Answer a tts_request: generate a reply and speak it with Gemini TTS"""
+    try:
+        # Generate text response first
+        prompt = conversation_store.build_prompt(session_id, text)
+        bot_text = await gemini_client.generate(prompt)
+        bot_text = bot_text.strip() if isinstance(bot_text, str) else str(bot_text)
+
+        if not bot_text:
+            bot_text = "I couldn't generate a response. Please try again."
+        elif not is_generation_error(bot_text):
+            conversation_store.add_turn(session_id, text, bot_text)
+
+        # Generate TTS using Gemini TTS model
+        audio_data, tts_error, bot_audio_file = await generate_tts_with_gemini(bot_text, session_id)
+
+        # Send response with audio
+        response_data = {
+            "type": "text",
+            "content": bot_text,
+            "session_id": session_id
+        }
+
+        log.debug("Sending TTS response: %d chars, %d audio bytes",
+                  len(bot_text), len(audio_data) if audio_data else 0)
+        if audio_data:
+            await send_with_audio(websocket, session_id, response_data, audio_data)
+        else:
+            if tts_error:
+                response_data["tts_error"] = tts_error
+            await websocket.send(json.dumps(response_data))
+
+        # Log the interaction
+        await chat_log.log([datetime.now().isoformat(), session_id, text, bot_text, "N/A", bot_audio_file or "N/A"])
+
+    except Exception as e:
+        error_response = f"Error processing TTS request: {e}"
+        await websocket.send(json.dumps({
+            "type": "text",
+            "content": error_response
+        }))
+
+async def stream_text_response(websocket, prompt, user_msg, session_id, send_deltas=True, on_delta=None):
+    """Consume Gemini output as it is generated, optionally forwarding text_delta
+    frames and passing each chunk to on_delta; returns the full text"""
+    parts = []
+    with stage("llm_stream") as span:
+        started = time.perf_counter()
+        async for delta in gemini_client.generate_stream(prompt):
+            if not parts:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage="llm_first_delta")
+            if not is_websocket_open(websocket):
+                log.info("❌ WebSocket closed while streaming response for: %.50s", user_msg)
+                break
+            parts.append(delta)
+            if on_delta is not None:
+                on_delta(delta)
+            if send_deltas:
+                await websocket.send(json.dumps({
+                    "type": "text_delta",
+                    "delta": delta,
+                    "session_id": session_id
+                }))
+        span.failed = is_generation_error("".join(parts))
+    return "".join(parts)
+
+async def process_text_message(websocket, user_msg, session_id, enable_tts=False, stream=False):
+    """Process text message and generate response.
+
+    With stream=True the reply is sent incrementally as text_delta frames and
+    finished with a text_done frame carrying the full text (and audio, if any);
+    otherwise a single text frame is sent once generation completes. With TTS
+    and TTS_PIPELINE_ENABLED, speech is streamed as ordered audio_chunk frames
+    instead of one audio payload on the final frame.
+    """
+    pipeline = None
     try:
         # Check if WebSocket is still open before processing
         if not is_websocket_open(websocket):
-            print(f"❌ WebSocket closed, cannot send response for: {user_msg[:50]}...")
+            log.info("❌ WebSocket closed, cannot send response for: %.50s", user_msg)
             return
             
-        bot_text = await gemini_client.generate(user_msg)
+        # Earlier turns of this session travel with the message, within a fixed token budget
+        prompt = conversation_store.build_prompt(session_id, user_msg)
+        if enable_tts and TTS_PIPELINE_ENABLED:
+            pipeline = SpeechPipeline(websocket, session_id)
+        if stream or pipeline is not None:
+            bot_text = await stream_text_response(websocket, prompt, user_msg, session_id, send_deltas=stream,
+                                                  on_delta=pipeline.feed if pipeline is not None else None)
+        else:
+            bot_text = await gemini_client.generate(prompt)
         bot_text = bot_text.strip() if isinstance(bot_text, str) else str(bot_text)
         if not bot_text:
             bot_text = "I couldn't generate a response. Please try again."
+        elif not is_generation_error(bot_text):
+            conversation_store.add_turn(session_id, user_msg, bot_text)
 
         # Convert text response to speech using Gemini TTS if requested
-        audio_base64, tts_error = (None, None)
-        if enable_tts:
-            try:
-                print(f"Generating TTS for voice response: {bot_text[:100]}...")
-                # Try Gemini TTS first
-                audio_base64, tts_error = await generate_tts_with_gemini(bot_text, session_id)
-                if tts_error:
-                    print(f"Gemini TTS failed, falling back to local TTS: {tts_error}")
-                    # Fallback to local TTS
-                    audio_base64, tts_error = await asyncio.to_thread(text_to_speech, bot_text, session_id)
-            except Exception as e:
-                print(f"Error with Gemini TTS, using local TTS: {e}")
-                # Fallback to local TTS
-                audio_base64, tts_error = await asyncio.to_thread(text_to_speech, bot_text, session_id)
+        audio_data, tts_error, bot_audio_file = (None, None, None)
+        if pipeline is not None:
+            # Sentences are already being synthesized; speak whatever text is left
+            pipeline.close(fallback_text=bot_text)
+        elif enable_tts:
+            log.debug("Generating TTS for voice response: %.100s", bot_text)
+            audio_data, tts_error, bot_audio_file = await synthesize_reply_audio(bot_text, session_id)
         
         # Get audio filenames for logging
         user_audio_file = "N/A"  # Text input, no audio
-        bot_audio_file = f"bot_audio_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav" if audio_base64 else "N/A"
         
-        # Log to CSV in background so response can be sent immediately
-        def _log_row():
-            try:
-                with open(LOG_FILE, mode="a", newline="", encoding="utf-8") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([datetime.now().isoformat(), session_id, user_msg, bot_text, user_audio_file, bot_audio_file])
-                    f.flush()
-                    try:
-                        os.fsync(f.fileno())
-                    except Exception:
-                        pass
-            except Exception as e:
-                print(f"Error logging to CSV: {e}")
-        asyncio.create_task(asyncio.to_thread(_log_row))
+        # Queue the CSV row now, so the turn is recorded even if the client leaves mid-reply;
+        # streamed speech is still being synthesized, so its clips are not named yet
+        await chat_log.log([datetime.now().isoformat(), session_id, user_msg, bot_text, user_audio_file,
+                            bot_audio_file or "N/A"])
 
         # Send response back to browser
         response_data = {
-            "type": "text",
+            "type": "text_done" if stream else "text",
             "content": bot_text,
             "session_id": session_id
         }
         
-        if audio_base64:
-            response_data["audio"] = audio_base64
-        elif tts_error:
+        if tts_error and not audio_data:
             response_data["tts_error"] = tts_error
+        elif pipeline is not None:
+            # Audio follows (or already started) as audio_chunk frames
+            response_data["audio_stream"] = True
         
-        print(f"Sending response: {response_data}")
+        log.debug("Sending response: %d chars, %d audio bytes", len(bot_text), len(audio_data) if audio_data else 0)
         
         # Check if WebSocket is still open before sending
         if not is_websocket_open(websocket):
-            print(f"❌ WebSocket closed before sending response for: {user_msg[:50]}...")
+            log.info("❌ WebSocket closed before sending response for: %.50s", user_msg)
             return
             
         try:
-            await websocket.send(json.dumps(response_data))
-            print(f"✅ Response sent successfully to WebSocket")
+            if audio_data:
+                await send_with_audio(websocket, session_id, response_data, audio_data)
+            else:
+                await websocket.send(json.dumps(response_data))
+            log.debug("✅ Response sent successfully to WebSocket")
         except Exception as send_error:
-            print(f"❌ Error sending response to WebSocket: {send_error}")
+            log.warning("❌ Error sending response to WebSocket: %s", send_error)
             # Try to send just the text if the full response fails
             try:
                 if is_websocket_open(websocket):
                     simple_response = {
-                        "type": "text",
+                        "type": "text_done" if stream else "text",
                         "content": bot_text,
                         "session_id": session_id
                     }
                     await websocket.send(json.dumps(simple_response))
-                    print(f"✅ Simple response sent successfully")
+                    log.debug("✅ Simple response sent successfully")
                 else:
-                    print(f"❌ WebSocket closed, cannot send simple response")
+                    log.info("❌ WebSocket closed, cannot send simple response")
             except Exception as simple_error:
-                print(f"❌ Simple response also failed: {simple_error}")
+                log.warning("❌ Simple response also failed: %s", simple_error)
+        
+        if pipeline is not None:
+            chunks = await pipeline.wait()
+            log.debug("✅ Streamed %d audio chunks: %s", chunks, ";".join(pipeline.audio_files))
         
     except Exception as e:
         bot_text = f"Error generating response: {e}"
-        print(f"❌ Error in process_text_message: {e}")
+        log.error("❌ Error in process_text_message: %s", e)
         
         # Only try to send error if WebSocket is still open
         if is_websocket_open(websocket):
@@ -752,29 +2239,27 @@ async def process_text_message(websocket, user_msg, session_id, enable_tts=False
                     "content": bot_text
                 }))
             except Exception as send_error:
-                print(f"❌ Could not send error response: {send_error}")
+                log.warning("❌ Could not send error response: %s", send_error)
         else:
-            print(f"❌ WebSocket closed, cannot send error response")
+            log.info("❌ WebSocket closed, cannot send error response")
+    finally:
+        if pipeline is not None:
+            # No-op when finished; stops synthesis if the request was abandoned
+            pipeline.cancel()
 
 async def process_audio_message(websocket, audio_data, session_id):
     """Process audio message and generate response"""
     try:
-        # Convert audio to base64
-        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-        
-        # Transcribe audio to text off the event loop (blocking I/O + CPU)
-        transcribed_text = await asyncio.to_thread(process_audio_data, audio_base64, session_id)
+        # Decode off the event loop (a thread for WAV, a decode worker otherwise); the
+        # frame's bytes are passed through as-is, never re-encoded
+        with stage("decode") as span:
+            audio = await process_audio_data(audio_data, session_id)
+            span.failed = isinstance(audio, str)
+        transcribed_text = audio if isinstance(audio, str) else await recognize_speech(audio)
         
         if isinstance(transcribed_text, str) and transcribed_text.startswith("Error"):
             # Log the failed audio attempt as a row so history shows the issue
-            def _log_error_row():
-                try:
-                    with open(LOG_FILE, mode="a", newline="", encoding="utf-8") as f:
-                        writer = csv.writer(f)
-                        writer.writerow([datetime.now().isoformat(), session_id, "[voice message]", transcribed_text, f"user_audio_{session_id}.wav", "N/A"])
-                except Exception as e:
-                    print(f"Error logging audio error to CSV: {e}")
-            asyncio.create_task(asyncio.to_thread(_log_error_row))
+            await chat_log.log([datetime.now().isoformat(), session_id, "[voice message]", transcribed_text, f"user_audio_{session_id}.wav", "N/A"])
 
             await websocket.send(json.dumps({
                 "type": "text",
@@ -782,10 +2267,10 @@ async def process_audio_message(websocket, audio_data, session_id):
             }))
             return
         
-        print(f"🔄 Processing transcribed text: {transcribed_text}")
+        log.debug("🔄 Processing transcribed text: %s", transcribed_text)
         # Process the transcribed text with TTS enabled for voice responses
         await process_text_message(websocket, transcribed_text, session_id, enable_tts=ENABLE_TTS_FOR_VOICE)
-        print(f"✅ Voice message processing completed")
+        log.debug("✅ Voice message processing completed")
         
     except Exception as e:
         error_response = f"Error processing audio: {e}"
@@ -794,81 +2279,279 @@ async def process_audio_message(websocket, audio_data, session_id):
             "content": error_response
         }))
 
-async def main():
-    """Main function to start the WebSocket server"""
+async def test_tts_in_background():
+    """Startup TTS probe run after the server is listening; the result goes to /health"""
+    log.info("Testing TTS model availability...")
+    startup_state['tts_available'] = tts_available = await test_tts_model()
+    if tts_available:
+        log.info("✅ TTS model is available and working")
+    else:
+        log.warning("❌ TTS model is not available - voice responses will not have audio")
+
+async def warm_up_stt():
+    """Load the local speech model so no utterance pays for it"""
+    log.info("Loading '%s' speech-to-text model in %d worker processes...", STT_BACKEND, STT_WORKERS)
+    await stt_pool.start()
+    if not stt_pool.available:
+        log.error("❌ Local speech-to-text unavailable: %s", stt_pool.error)
+
+async def preflight():
+    """Old eager startup: load every engine and probe TTS before accepting connections"""
+    log.info("🧪 Preflight: loading speech recognition, Gemini and TTS before listening...")
+    if SPEECH_RECOGNITION_AVAILABLE:
+        get_speech_recognizer()
+    if speech_recognizer is None:
+        log.warning("Speech recognition not initialized. Speech-to-text will not work.")
+    await tts_pool.start()
+    await decode_pool.start()
+    if stt_pool is not None:
+        await warm_up_stt()
+    # Wait for Gemini client to initialize first
+    await gemini_client.ensure_initialized()
+    await test_tts_in_background()
+
+async def main(worker_index: int = None, eager: bool = False):
+    """Main function to start the WebSocket server.
+
+    worker_index is set when running as one of several supervised workers:
+    the ports are then shared with the other workers and chat rows go to
+    this worker's own log shard. By default engines load on first use and
+    the TTS probe runs once the server is listening; eager (--preflight)
+    does all of that before the ports are opened.
+    """
+    global LOG_FILE
+    shared = worker_index is not None
+    if shared:
+        LOG_FILE = log_shard_path(LOG_FILE, worker_index)
+        ensure_log_header(LOG_FILE)
     if not GEMINI_API_KEY:
-        print("Warning: GEMINI_API_KEY missing.")
+        log.warning("GEMINI_API_KEY missing.")
     
-    if speech_recognizer is None:
-        print("Warning: Speech recognition not initialized. Speech-to-text will not work.")
+    if not SPEECH_RECOGNITION_AVAILABLE and stt_pool is None:
+        log.warning("speech_recognition is not installed. Speech-to-text will not work.")
     
-    if tts_engine is None:
-        print("Warning: TTS engine not initialized. Text-to-speech will not work.")
+    log.info("Local TTS fallback: %d worker processes (started on first use)", LOCAL_TTS_WORKERS)
     
-    # Test TTS model availability
-    print("Testing TTS model availability...")
-    # Wait for Gemini client to initialize first
-    await gemini_client.ensure_initialized()
-    tts_available = await test_tts_model()
-    if tts_available:
-        print("✅ TTS model is available and working")
-    else:
-        print("❌ TTS model is not available - voice responses will not have audio")
+    if eager:
+        await preflight()
     
-    # Increase max_size to support voice blobs and set robust ping settings
-    async with websockets.serve(
-        handle_connection,
-        "127.0.0.1",
-        PORT,
-        max_size=20 * 1024 * 1024,  # 20 MB
-        ping_interval=20,
-        ping_timeout=20,
-    ):
-        print(f"WebSocket server running at ws://127.0.0.1:{PORT}")
-        print(f"Chat logs will be saved to: {LOG_FILE}")
-        print(f"Audio logs will be saved to: {AUDIO_LOG_DIR}/")
-        print("Voice features enabled: Speech-to-Text and Text-to-Speech")
-        if GEMINI_API_KEY:
-            print(f"Using Gemini API key: {GEMINI_API_KEY[:10]}...")
-        else:
-            print("Warning: GEMINI_API_KEY not set. Please set it in your environment variables.")
-            print("You can get a free API key from: https://makersuite.google.com/app/apikey")
-        await asyncio.Future()  # run forever
+    if history_store is not None and not shared:  # the supervisor imports before starting workers
+        imported = await asyncio.to_thread(history_store.import_csv, LOG_FILE)
+        if imported:
+            log.info("📚 Indexed %d existing chat log rows into %s", imported, CHAT_HISTORY_DB)
 
+    try:
+        await http_api.start("127.0.0.1", HTTP_PORT, reuse_port=shared)
+        log.info("HTTP server running at http://127.0.0.1:%d/chat_history", HTTP_PORT)
+    except OSError as e:
+        log.warning("HTTP server failed to start on port %d: %s", HTTP_PORT, e)
+        log.warning("You can still use the WebSocket server for chat functionality.")
 
-# --- HTTP Server for chat history ---
-class ChatLogHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == '/chat_history':
+    background = []
+    try:
+        # Increase max_size to support voice blobs and set robust ping settings
+        async with websockets.serve(
+            handle_connection,
+            "127.0.0.1",
+            PORT,
+            max_size=20 * 1024 * 1024,  # 20 MB
+            ping_interval=20,
+            ping_timeout=20,
+            reuse_port=shared,
+        ):
+            log.info("WebSocket server running at ws://127.0.0.1:%d", PORT)
+            startup_state['listening_after_s'] = round(time.perf_counter() - SERVER_IMPORT_STARTED, 3)
+            log.info("⏱️ Listening %.0f ms after startup (imports took %.0f ms)",
+                     startup_state['listening_after_s'] * 1000, startup_state['import_s'] * 1000)
+            if LOOP_STALL_THRESHOLD > 0:
+                background.append(asyncio.create_task(loop_watchdog.run()))
+            if not eager:
+                # Warm-ups run behind the open ports; first use waits on them if they have not finished
+                if stt_pool is not None:
+                    background.append(asyncio.create_task(warm_up_stt()))
+                background.append(asyncio.create_task(test_tts_in_background()))
+                background.append(asyncio.create_task(decode_pool.start()))
+            log.info("Chat logs will be saved to: %s", LOG_FILE)
+            log.info("Audio logs will be saved to: %s/", AUDIO_LOG_DIR)
+            log.info("Voice features enabled: Speech-to-Text and Text-to-Speech")
+            if GEMINI_API_KEY:
+                log.info("Using Gemini API key: %.10s...", GEMINI_API_KEY)
+            else:
+                log.warning("GEMINI_API_KEY not set. Please set it in your environment variables.")
+                log.warning("You can get a free API key from: https://makersuite.google.com/app/apikey")
+            # Run until SIGTERM/SIGINT (the supervisor stops workers with SIGTERM)
+            stop = asyncio.get_running_loop().create_future()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                try:
+                    asyncio.get_running_loop().add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+                except (NotImplementedError, RuntimeError):
+                    pass  # Windows: Ctrl+C still raises KeyboardInterrupt
             try:
-                with open(LOG_FILE, encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    history = list(reader)
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(history).encode('utf-8'))
-            except Exception as e:
-                self.send_response(500)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({'error': str(e)}).encode('utf-8'))
-        else:
-            self.send_response(404)
-            self.end_headers()
+                await stop
+                log.info("🛑 Shutting down: closing connections, then flushing the chat log...")
+            finally:
+                for task in background:
+                    task.cancel()
+                await http_api.close()
+        # Leaving the serve block closed every connection and waited for its handler
+    finally:
+        # Handlers close their own dispatchers; only then can no turn log another row
+        for dispatcher in list(session_dispatchers.values()):
+            await dispatcher.close()
+        await chat_log.close()
+        await gemini_client.aclose()
+        tts_pool.shutdown()
+        decode_pool.shutdown()
+        if stt_pool is not None:
+            stt_pool.shutdown()
 
-def start_http_server():
+
+# --- HTTP API: chat history and stats ---
+async def http_chat_history(request):
+    """One page of history, newest rows last.
+
+    ?limit= rows (default CHAT_HISTORY_PAGE_SIZE), ?session_id= one session,
+    ?since= rows after an ISO timestamp, ?cursor= the X-Next-Cursor of the
+    previous response to fetch the rows before it, or ?after= the newest
+    id the client has to fetch only rows logged since. The ETag changes
+    with every logged row, so unchanged polls get a bodyless 304.
+    """
+    if history_store is None:
+        return json_response(request, {'error': 'chat history index unavailable'}, status=503)
     try:
-        httpd = HTTPServer(('127.0.0.1', 8081), ChatLogHandler)
-        print('HTTP server running at http://127.0.0.1:8081/chat_history')
-        httpd.serve_forever()
-    except PermissionError:
-        print('Warning: Port 8081 is not available. HTTP server disabled.')
-        print('You can still use the WebSocket server for chat functionality.')
-    except Exception as e:
-        print(f'Warning: HTTP server failed to start: {e}')
-        print('You can still use the WebSocket server for chat functionality.')
+        limit = int(request.param('limit') or CHAT_HISTORY_PAGE_SIZE)
+        cursor = int(request.param('cursor')) if request.param('cursor') else None
+        after = int(request.param('after')) if request.param('after') else None
+        if not 0 < limit <= CHAT_HISTORY_MAX_PAGE:
+            raise ValueError(f"limit must be between 1 and {CHAT_HISTORY_MAX_PAGE}")
+    except ValueError as e:
+        return json_response(request, {'error': f'Bad query: {e}'}, status=400)
+
+    etag = f'W/"{await asyncio.to_thread(history_store.last_id)}"'
+    try:
+        mtime = os.path.getmtime(LOG_FILE)
+    except OSError:
+        mtime = None
+    validators = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if mtime is not None:
+        validators['Last-Modified'] = email.utils.formatdate(mtime, usegmt=True)
+    if request.not_modified(etag, mtime):
+        return Response(304, headers=validators)
+    rows, next_cursor = await asyncio.to_thread(
+        history_store.page, session_id=request.param('session_id'), since=request.param('since'),
+        before=cursor, after=after, limit=limit)
+    if next_cursor is not None:
+        validators['X-Next-Cursor'] = str(next_cursor)
+    return json_array_stream(request, rows, headers=validators)
+
+def stats_endpoint(stats):
+    """Route handler answering with stats() as JSON"""
+    async def handler(request):
+        return json_response(request, stats(), gzip_min_bytes=HTTP_GZIP_MIN_BYTES)
+    return handler
+
+def health():
+    return {
+        'status': 'ok',
+        'uptime_s': round(time.monotonic() - SERVER_STARTED, 1),
+        'websocket_sessions': len(active_sessions),
+        'voice_streams': len(voice_streams),
+        'reply_jobs': dict(dispatch_totals),
+        'startup': dict(startup_state),
+        'http': http_api.stats(),
+    }
+
+async def http_profile(request):
+    """Sample the running server's stacks for ?seconds= (default 10) and return them as
+    folded stacks for flamegraph.pl or speedscope; ?threads=all samples every thread,
+    not just the event loop. Only served with PROFILER_ENABLED."""
+    if not PROFILER_ENABLED:
+        return json_response(request, {'error': 'profiler disabled; set PROFILER_ENABLED=1'}, status=404)
+    try:
+        seconds = float(request.param('seconds') or 10)
+        if not 0 < seconds <= PROFILER_MAX_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {PROFILER_MAX_SECONDS:.0f}")
+    except ValueError as e:
+        return json_response(request, {'error': f'Bad query: {e}'}, status=400)
+    thread_id = None if request.param('threads') == 'all' else threading.get_ident()
+    sampler = await profile(seconds, thread_id, PROFILER_INTERVAL)
+    return Response(body=sampler.folded().encode(), content_type="text/plain; charset=utf-8",
+                    headers={'X-Samples': str(sampler.samples)})
+
+async def http_metrics(request):
+    return Response(body=metrics.render().encode(), content_type=metrics.CONTENT_TYPE)
+
+# Gauges and counters kept elsewhere, read when /metrics is scraped
+metrics.callback("uptime_seconds", "Seconds since the server started", lambda: round(time.monotonic() - SERVER_STARTED, 3))
+metrics.callback("websocket_sessions", "Open WebSocket connections", lambda: len(active_sessions))
+metrics.callback("voice_streams", "Sessions streaming microphone audio", lambda: len(voice_streams))
+metrics.callback("reply_jobs_pending", "Reply jobs waiting or running across sessions",
+                 lambda: sum(d.pending() for d in list(session_dispatchers.values())))
+metrics.callback("reply_jobs_total", "Reply jobs by outcome", lambda: dict(dispatch_totals), "counter", ["outcome"])
+metrics.callback("llm_calls_active", "Gemini calls in progress", lambda: gemini_client.stats()["active_calls"])
+metrics.callback("llm_calls_queued", "Gemini calls waiting for an admission slot", lambda: gemini_client.stats()["queued"])
+metrics.callback("llm_coalesced_total", "Gemini requests answered by an identical in-flight call",
+                 lambda: gemini_client.coalesced, "counter")
+metrics.callback("llm_rejected_total", "Gemini requests refused because the admission queue was full",
+                 lambda: gemini_client.rejected, "counter")
+metrics.callback("response_cache_lookups_total", "Response cache lookups by result",
+                 lambda: {"memory_hit": response_cache.hits - response_cache.disk_hits,
+                          "disk_hit": response_cache.disk_hits, "miss": response_cache.misses}
+                 if response_cache else {}, "counter", ["result"])
+metrics.callback("tts_cache_lookups_total", "TTS audio cache lookups by result",
+                 lambda: {"hit": tts_cache.hits, "miss": tts_cache.misses}, "counter", ["result"])
+metrics.callback("chat_log_rows_queued", "Chat log rows waiting to be written", lambda: chat_log.stats()["queued"])
+metrics.callback("stt_clips_queued", "Utterances waiting for a local STT worker",
+                 lambda: stt_pool.stats()["queued"] if stt_pool is not None else 0)
+metrics.callback("http_requests_total", "HTTP API requests served", lambda: http_api.stats()["requests"], "counter")
+metrics.callback("event_loop_stalls_total", "Times the event loop was blocked past LOOP_STALL_THRESHOLD_MS",
+                 lambda: loop_watchdog.stalls, "counter")
+metrics.callback("log_records_dropped_total", "Log records dropped because the log writer fell behind",
+                 log_setup.dropped, "counter")
+
+http_api = HTTPAPIServer({
+    '/chat_history': http_chat_history,
+    '/metrics': http_metrics,
+    '/loop_stats': stats_endpoint(lambda: loop_watchdog.stats()),
+    '/debug/profile': http_profile,
+    '/health': stats_endpoint(health),
+    '/tts_cache_stats': stats_endpoint(lambda: tts_cache.stats()),
+    '/decode_stats': stats_endpoint(lambda: decode_pool.stats()),
+    '/stt_stats': stats_endpoint(lambda: stt_pool.stats() if stt_pool is not None else {'backend': STT_BACKEND}),
+    '/llm_stats': stats_endpoint(lambda: gemini_client.stats()),
+    '/cache_stats': stats_endpoint(lambda: response_cache.stats() if response_cache else {'enabled': False}),
+}, cors_origin=HTTP_CORS_ORIGIN, keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT, handler_timeout=HTTP_HANDLER_TIMEOUT)
+
+def run_workers(workers: int, eager: bool = False) -> int:
+    """Supervisor mode: run `workers` server processes on the shared ports and keep them running"""
+    if not reuse_port_supported():
+        log.warning("⚠️ SO_REUSEPORT is not available on this platform; running a single server process")
+        asyncio.run(main(eager=eager))
+        return 0
+    if history_store is not None:
+        # Once, here, rather than racing in every worker
+        imported = history_store.import_csv(LOG_FILE)
+        if imported:
+            log.info("📚 Indexed %d existing chat log rows into %s", imported, CHAT_HISTORY_DB)
+    log.info("Starting %d server workers on ws://127.0.0.1:%d and http://127.0.0.1:%d", workers, PORT, HTTP_PORT)
+    extra = ["--preflight"] if eager else []
+    supervisor = Supervisor(lambda index: [sys.executable, os.path.abspath(__file__), "--worker-index", str(index)] + extra,
+                            workers, grace=WORKER_SHUTDOWN_GRACE)
+    return supervisor.run()
+
+startup_state['import_s'] = round(time.perf_counter() - SERVER_IMPORT_STARTED, 3)
 
 if __name__ == "__main__":
-    threading.Thread(target=start_http_server, daemon=True).start()
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="AI voice chatbot server")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="server processes sharing the ports (default: SERVER_WORKERS or 1)")
+    parser.add_argument("--preflight", action="store_true", default=SERVER_PREFLIGHT,
+                        help="load every engine and test TTS before listening (default: on first use)")
+    parser.add_argument("--worker-index", type=int, help=argparse.SUPPRESS)  # set by the supervisor
+    args = parser.parse_args()
+    if args.worker_index is not None:
+        asyncio.run(main(worker_index=args.worker_index, eager=args.preflight))
+    elif args.workers > 1:
+        sys.exit(run_workers(args.workers, eager=args.preflight))
+    else:
+        asyncio.run(main(eager=args.preflight))
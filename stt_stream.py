@@ -0,0 +1,283 @@
+"""
+Streaming speech-to-text for chunked microphone input.
+
+The client sends 16-bit mono PCM in small binary frames while the user is
+still talking. Each session keeps the recent audio in a ring buffer, an energy
+based voice-activity detector finds where an utterance starts and ends, and
+the recognizer is fed incrementally so partial transcripts are available
+during speech and the final one right after the endpoint.
+
+Recognizers are pluggable: anything with a start(sample_rate) method that
+returns a stream with accept(pcm) -> partial text (or None) and
+finish() -> final text; either may be a coroutine function. ClipRecognizer
+adapts a whole-clip function such as Google recognition or the local STT
+worker pool; StubRecognizer is a deterministic local stand-in for offline
+tests.
+"""
+
+import asyncio
+import audioop
+import inspect
+import time
+
+
+class PCMRingBuffer:
+    """Fixed-capacity byte ring holding the most recent audio of a session."""
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._end = 0  # total bytes ever written
+        self.dropped = 0
+
+    def write(self, data):
+        data = memoryview(data)
+        if len(data) > self.capacity:
+            self.dropped += len(data) - self.capacity
+            data = data[-self.capacity:]
+        start = self._end % self.capacity
+        first = min(len(data), self.capacity - start)
+        self._buf[start:start + first] = data[:first]
+        self._buf[:len(data) - first] = data[first:]
+        self._end += len(data)
+
+    def __len__(self):
+        return min(self._end, self.capacity)
+
+    def tail(self, size: int) -> bytes:
+        """The last `size` bytes written (fewer if the ring holds less)"""
+        size = min(size, len(self))
+        start = (self._end - size) % self.capacity
+        if start + size <= self.capacity:
+            return bytes(self._buf[start:start + size])
+        return bytes(self._buf[start:]) + bytes(self._buf[:size - (self.capacity - start)])
+
+
+class EnergyVAD:
+    """Frame-level voice activity detection on RMS energy with onset and hangover.
+
+    Speech starts after `onset_frames` consecutive loud frames and ends after
+    `endpoint_ms` of quiet frames. The threshold adapts upwards to a noisy
+    room: a frame is loud when its RMS exceeds both `threshold` and
+    `noise_ratio` times the running noise floor.
+    """
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 20, threshold: int = 300,
+                 noise_ratio: float = 3.0, onset_frames: int = 3, endpoint_ms: int = 600):
+        self.frame_bytes = sample_rate * frame_ms // 1000 * 2
+        self.frame_ms = frame_ms
+        self.threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.onset_frames = onset_frames
+        self.endpoint_frames = max(1, endpoint_ms // frame_ms)
+        self.noise_floor = float(threshold) / noise_ratio
+        self.in_speech = False
+        self._loud = 0
+        self._quiet = 0
+
+    def is_loud(self, frame) -> bool:
+        rms = audioop.rms(frame, 2)
+        loud = rms > max(self.threshold, self.noise_floor * self.noise_ratio)
+        if not loud:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * rms
+        return loud
+
+    def process(self, frame):
+        """Classify one frame; returns "start", "end" or None"""
+        loud = self.is_loud(frame)
+        if not self.in_speech:
+            self._loud = self._loud + 1 if loud else 0
+            if self._loud >= self.onset_frames:
+                self.in_speech = True
+                self._quiet = 0
+                return "start"
+            return None
+        self._quiet = 0 if loud else self._quiet + 1
+        if self._quiet >= self.endpoint_frames:
+            self.in_speech = False
+            self._loud = 0
+            return "end"
+        return None
+
+
+async def call_recognizer(fn, *args):
+    """Await an async recognizer method, or run a blocking one on a worker thread"""
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+class ClipRecognizer:
+    """Adapts a whole-clip transcribe(pcm, sample_rate) function to the streaming interface.
+
+    Audio is only collected while the user speaks; recognition runs once at
+    the endpoint, so there are no partial transcripts. transcribe may be a
+    plain or a coroutine function.
+    """
+    def __init__(self, transcribe):
+        self.transcribe = transcribe
+
+    def start(self, sample_rate: int):
+        if inspect.iscoroutinefunction(self.transcribe):
+            return _AsyncClipStream(self.transcribe, sample_rate)
+        return _ClipStream(self.transcribe, sample_rate)
+
+
+class _ClipStream:
+    def __init__(self, transcribe, sample_rate):
+        self.transcribe = transcribe
+        self.sample_rate = sample_rate
+        self.audio = bytearray()
+
+    def accept(self, pcm):
+        self.audio += pcm
+        return None
+
+    def finish(self) -> str:
+        return self.transcribe(bytes(self.audio), self.sample_rate)
+
+
+class _AsyncClipStream(_ClipStream):
+    async def finish(self) -> str:
+        return await self.transcribe(bytes(self.audio), self.sample_rate)
+
+
+class StubRecognizer:
+    """Offline stand-in recognizer: one word per `word_ms` of audio it has been fed.
+
+    Transcripts look like "word1 word2 ...", which is enough to check that
+    partials grow during speech and the final covers the whole utterance.
+    `delay` simulates recognition cost per call.
+    """
+    def __init__(self, word_ms: int = 200, delay: float = 0.0):
+        self.word_ms = word_ms
+        self.delay = delay
+
+    def start(self, sample_rate: int):
+        return _StubStream(self, sample_rate)
+
+
+class _StubStream:
+    def __init__(self, recognizer, sample_rate):
+        self.recognizer = recognizer
+        self.bytes_per_word = sample_rate * 2 * recognizer.word_ms // 1000
+        self.received = 0
+
+    def _text(self):
+        return " ".join(f"word{i + 1}" for i in range(self.received // self.bytes_per_word))
+
+    def accept(self, pcm):
+        if self.recognizer.delay:
+            time.sleep(self.recognizer.delay)
+        self.received += len(pcm)
+        return self._text() or None
+
+    def finish(self) -> str:
+        if self.recognizer.delay:
+            time.sleep(self.recognizer.delay)
+        return self._text()
+
+
+class _Utterance:
+    """The recognizer stream of one utterance and the chain of accept calls feeding it"""
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+        self.accepting = None  # task of the latest accept call; each one awaits the one before
+        self.last_partial = None
+
+
+class VoiceStream:
+    """One session's streaming recognition: ring buffer, VAD and incremental recognizer.
+
+    feed() takes PCM chunks of any size and only runs the VAD. Audio between
+    the VAD start and end events (plus `preroll_ms` before the start) is
+    handed to a recognizer stream by background tasks, in order, so a slow
+    recognizer never holds up the caller. on_partial(text) is awaited
+    whenever the partial transcript changes. At each endpoint, submit(fn, *args)
+    is handed the job that finishes the utterance (the rest of its audio, the
+    final text, then on_final(text)), to run it wherever the caller runs its
+    work; without submit it is awaited in place. end() finalizes an utterance
+    that is still open.
+    """
+    def __init__(self, recognizer, on_partial, on_final, sample_rate: int = 16000,
+                 buffer_seconds: float = 30.0, preroll_ms: int = 300, vad: EnergyVAD = None, submit=None):
+        self.recognizer = recognizer
+        self.on_partial = on_partial
+        self.on_final = on_final
+        self.submit = submit
+        self.sample_rate = sample_rate
+        self.vad = vad or EnergyVAD(sample_rate)
+        self.ring = PCMRingBuffer(int(sample_rate * 2 * buffer_seconds))
+        self.max_utterance_bytes = self.ring.capacity
+        self.preroll_bytes = sample_rate * 2 * preroll_ms // 1000
+        self._pending = bytearray()  # tail shorter than one VAD frame
+        self._utterance = None
+        self.utterances = 0
+
+    async def feed(self, chunk):
+        self.ring.write(chunk)
+        self._pending += chunk
+        frame_bytes = self.vad.frame_bytes
+        usable = len(self._pending) - len(self._pending) % frame_bytes
+        if not usable:
+            return
+        frames = memoryview(bytes(self._pending[:usable]))
+        del self._pending[:usable]
+
+        speech = bytearray()
+        for offset in range(0, usable, frame_bytes):
+            frame = frames[offset:offset + frame_bytes]
+            event = self.vad.process(frame)
+            if event == "start":
+                # Include the onset frames and a little lead-in the VAD needed to decide
+                lead = self.preroll_bytes + self.vad.onset_frames * frame_bytes
+                backlog = (len(frames) - offset - frame_bytes) + len(self._pending)
+                self._utterance = _Utterance(self.recognizer.start(self.sample_rate))
+                speech += self.ring.tail(lead + backlog)[:lead]
+                continue
+            if self._utterance is None:
+                continue
+            speech += frame
+            if event == "end" or self._utterance.bytes + len(speech) >= self.max_utterance_bytes:
+                self._accept(speech)
+                speech = bytearray()
+                await self._finalize()
+        if speech and self._utterance is not None:
+            self._accept(speech)
+
+    def _accept(self, pcm):
+        if not pcm:
+            return
+        utterance = self._utterance
+        utterance.bytes += len(pcm)
+        utterance.accepting = asyncio.ensure_future(self._accept_after(utterance, utterance.accepting, bytes(pcm)))
+
+    async def _accept_after(self, utterance, previous, pcm):
+        if previous is not None:
+            await previous  # keeps the recognizer's input in order; its error ends the chain
+        partial = await call_recognizer(utterance.stream.accept, pcm)
+        if partial and partial != utterance.last_partial:
+            utterance.last_partial = partial
+            await self.on_partial(partial)
+
+    async def _finalize(self):
+        utterance, self._utterance = self._utterance, None
+        self.vad.in_speech = False
+        self.utterances += 1
+        if self.submit is None:
+            await self._finish(utterance)
+        else:
+            self.submit(self._finish, utterance)
+
+    async def _finish(self, utterance):
+        if utterance.accepting is not None:
+            await utterance.accepting
+        text = await call_recognizer(utterance.stream.finish)
+        if text:
+            await self.on_final(text)
+
+    async def end(self):
+        """The client stopped sending: flush what is buffered and finalize an open utterance"""
+        if self._utterance is not None:
+            self._accept(self._pending)
+            self._pending.clear()
+            await self._finalize()
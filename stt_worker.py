@@ -0,0 +1,268 @@
+"""
+Local speech-to-text backends and a warm worker pool.
+
+A backend loads its model once (load()) and then transcribes batches of
+16-bit mono PCM clips. Each worker process owns one loaded backend for its
+whole life, so no request pays model start-up, and recognition runs on as
+many cores as there are workers. The pool collects concurrent requests from
+all sessions into batches, so one IPC round-trip (and, for backends with a
+batch API, one model call) serves several utterances.
+"""
+
+import asyncio
+import audioop
+import json
+import logging
+import time
+
+from worker_pool import Worker, WorkerPool
+
+log = logging.getLogger("voicebot.stt")
+
+
+class STTWorkerError(Exception):
+    """A recognition batch failed, timed out, or the worker died while running it."""
+
+
+class STTBackend:
+    """Interface for local recognizers: load() once per process, then transcribe_batch()."""
+    name = "base"
+
+    def load(self):
+        pass
+
+    def transcribe_batch(self, clips) -> list:
+        """Transcribe [(pcm, sample_rate), ...]; returns one string per clip"""
+        raise NotImplementedError
+
+
+def to_16k(pcm, sample_rate):
+    """Resample 16-bit mono PCM to the 16 kHz the local models expect"""
+    if sample_rate == 16000:
+        return pcm
+    return audioop.ratecv(pcm, 2, 1, sample_rate, 16000, None)[0]
+
+
+class VoskBackend(STTBackend):
+    """Kaldi-based offline recognizer (pip install vosk; model from alphacephei.com/vosk/models)."""
+    name = "vosk"
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self.model = None
+
+    def load(self):
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        self.model = Model(self.model_path)
+
+    def transcribe_batch(self, clips):
+        from vosk import KaldiRecognizer
+        texts = []
+        for pcm, sample_rate in clips:
+            recognizer = KaldiRecognizer(self.model, 16000)
+            recognizer.AcceptWaveform(to_16k(pcm, sample_rate))
+            texts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+        return texts
+
+
+class WhisperBackend(STTBackend):
+    """Whisper on CPU via faster-whisper (pip install faster-whisper), int8, one thread per worker."""
+    name = "whisper"
+
+    def __init__(self, model_name="base.en"):
+        self.model_name = model_name or "base.en"
+        self.model = None
+
+    def load(self):
+        from faster_whisper import WhisperModel
+        self.model = WhisperModel(self.model_name, device="cpu", compute_type="int8", cpu_threads=1)
+
+    def transcribe_batch(self, clips):
+        import numpy as np
+        texts = []
+        for pcm, sample_rate in clips:
+            audio = np.frombuffer(to_16k(pcm, sample_rate), dtype=np.int16).astype(np.float32) / 32768.0
+            segments, _ = self.model.transcribe(audio, beam_size=1, language="en")
+            texts.append(" ".join(segment.text.strip() for segment in segments))
+        return texts
+
+
+class StubBackend(STTBackend):
+    """Offline stand-in: one word per `word_ms` of audio, with model-like CPU costs.
+
+    Loading burns `load_seconds`; each batch costs `batch_overhead` plus
+    `per_clip` seconds of CPU, like a model whose fixed per-call cost is
+    amortized by batching.
+    """
+    name = "stub"
+
+    def __init__(self, word_ms=200, load_seconds=0.5, batch_overhead=0.03, per_clip=0.005):
+        self.word_ms = word_ms
+        self.load_seconds = load_seconds
+        self.batch_overhead = batch_overhead
+        self.per_clip = per_clip
+        self.loads = 0
+
+    @staticmethod
+    def _burn(seconds):
+        deadline = time.process_time() + seconds
+        while time.process_time() < deadline:
+            pass
+
+    def load(self):
+        self._burn(self.load_seconds)
+        self.loads += 1
+
+    def transcribe_batch(self, clips):
+        self._burn(self.batch_overhead + self.per_clip * len(clips))
+        return [" ".join(f"word{i + 1}" for i in range(len(pcm) * 1000 // (rate * 2 * self.word_ms)))
+                for pcm, rate in clips]
+
+
+BACKENDS = {"vosk": VoskBackend, "whisper": WhisperBackend, "stub": StubBackend}
+
+
+def create_backend(name, model=None):
+    """Default backend factory: a backend instance by name, configured with a model path/name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](model) if model is not None else BACKENDS[name]()
+
+
+def worker_main(conn, backend_factory, name, model):
+    """Worker process loop: load the model once, then transcribe batches until told to stop"""
+    try:
+        backend = backend_factory(name, model)
+        backend.load()
+    except Exception as e:
+        conn.send(("ready", False, f"Error loading STT backend '{name}': {e}"))
+        return
+    conn.send(("ready", True, None))
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        job_id, clips = job
+        try:
+            conn.send((job_id, backend.transcribe_batch(clips), None))
+        except Exception as e:
+            conn.send((job_id, None, f"Error in speech recognition: {e}"))
+
+
+class _Worker(Worker):
+    job_name = "batch"
+
+
+class STTWorkerPool(WorkerPool):
+    """Warm pool of recognizer processes with cross-session batching.
+
+    Workers load their model when the pool starts. transcribe() queues a clip;
+    whenever a worker is idle, the dispatcher waits batch_window for more
+    clips to arrive (unless a full batch is already queued) and sends up to
+    max_batch of them to that worker as one batch. A worker that times out or crashes is
+    replaced, and its clips fail with STTWorkerError.
+    """
+    label = "STT"
+    error_type = STTWorkerError
+    worker_type = _Worker
+    log = log
+
+    def __init__(self, backend: str, model: str = None, workers: int = 2, max_batch: int = 8,
+                 batch_window: float = 0.02, job_timeout: float = 60.0, backend_factory=create_backend,
+                 start_timeout: float = 120.0, start_method: str = None):
+        super().__init__(workers, job_timeout, start_timeout, start_method, thread_name_prefix="stt-worker-io")
+        self.backend = backend
+        self.model = model
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self.backend_factory = backend_factory
+        self._requests = None
+        self._dispatcher = None
+        self.clips_done = 0
+        self.batches = 0
+
+    def _worker_target(self):
+        return worker_main, (self.backend_factory, self.backend, self.model)
+
+    def _describe(self):
+        return f"'{self.backend}' STT"
+
+    def _started(self):
+        self._requests = asyncio.Queue()
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        """Recognize one clip of 16-bit mono PCM on a warm worker"""
+        await self.start()
+        if self.error:
+            raise STTWorkerError(self.error)
+        future = asyncio.get_running_loop().create_future()
+        self._requests.put_nowait((bytes(pcm), sample_rate, future))
+        return await future
+
+    async def _dispatch(self):
+        while True:
+            worker = await self._idle.get()
+            if worker is None:
+                self._fail_queued(STTWorkerError(self.error))
+                return
+            batch = [await self._requests.get()]
+            if self._requests.qsize() < self.max_batch - 1:
+                # Give utterances from other sessions a moment to join the batch
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.max_batch and not self._requests.empty():
+                batch.append(self._requests.get_nowait())
+            batch = [request for request in batch if not request[2].done()]  # drop abandoned clips
+            if not batch:
+                self._idle.put_nowait(worker)
+                continue
+            asyncio.ensure_future(self._run_batch(worker, batch))
+
+    async def _run_batch(self, worker, batch):
+        clips = [(pcm, rate) for pcm, rate, _ in batch]
+        try:
+            texts, error = await asyncio.get_running_loop().run_in_executor(
+                self._io, worker.request, next(self._job_ids), clips, self.job_timeout)
+        except STTWorkerError as e:
+            texts, error = None, str(e)
+            worker = await self._recycle(worker, e)
+        except Exception as e:
+            # The batch never reached the worker, which is still fine to use
+            texts, error = None, f"Error sending clips to the STT worker: {e}"
+        self._return(worker)
+        self.batches += 1
+        for index, (_, _, future) in enumerate(batch):
+            if future.done():
+                continue
+            if error:
+                future.set_exception(STTWorkerError(error))
+            else:
+                future.set_result(texts[index])
+                self.clips_done += 1
+
+    def _fail_queued(self, error):
+        while not self._requests.empty():
+            _, _, future = self._requests.get_nowait()
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "workers": len(self._workers),
+            "queued": self._requests.qsize() if self._requests is not None else 0,
+            "clips_done": self.clips_done,
+            "batches": self.batches,
+            "avg_batch": round(self.clips_done / self.batches, 2) if self.batches else 0.0,
+            "recycled": self.recycled,
+            "error": self.error,
+        }
+
+    def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        super().shutdown()
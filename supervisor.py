@@ -0,0 +1,134 @@
+"""
+Process supervisor for running several server workers on one port.
+
+Each worker is a separate Python process (its own GIL, event loop, Gemini
+client, STT/TTS pools and chat log shard) that binds the shared ports with
+SO_REUSEPORT, so the kernel spreads incoming connections across them. The
+supervisor starts the workers, restarts any that crash (backing off, and
+giving up on a slot that keeps crashing), and on SIGINT/SIGTERM asks every
+worker to shut down gracefully before killing stragglers.
+"""
+
+import logging
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+log = logging.getLogger("voicebot.supervisor")
+
+
+def reuse_port_supported() -> bool:
+    """Whether this platform lets several processes bind one port (Linux, BSD, macOS)"""
+    if not hasattr(socket, "SO_REUSEPORT"):
+        return False
+    try:
+        with socket.socket() as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        return True
+    except OSError:
+        return False
+
+
+class _Slot:
+    """One worker position: its current process and recent crash times."""
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.crashes = []
+        self.restart_at = None
+        self.failed = False
+
+
+class Supervisor:
+    """Keeps `workers` copies of command_for(index) running until stopped.
+
+    A worker that exits while the supervisor is not stopping is restarted
+    after restart_delay (doubling per recent crash); one that crashes more
+    than max_restarts times within restart_window is left down. stop()
+    (also triggered by SIGINT/SIGTERM in run()) sends SIGTERM to every
+    worker, waits up to `grace` seconds, then kills what is left.
+    """
+    def __init__(self, command_for, workers: int, grace: float = 10.0, restart_delay: float = 1.0,
+                 max_restarts: int = 5, restart_window: float = 60.0, poll_interval: float = 0.2, **popen_args):
+        self.command_for = command_for
+        self.slots = [_Slot(i) for i in range(workers)]
+        self.grace = grace
+        self.restart_delay = restart_delay
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.poll_interval = poll_interval
+        self.popen_args = popen_args
+        self.stopping = False
+        self.restarts = 0
+
+    def _start(self, slot):
+        slot.process = subprocess.Popen(self.command_for(slot.index), **self.popen_args)
+        slot.restart_at = None
+        log.info("🚀 Started worker %d (pid %d)", slot.index, slot.process.pid)
+
+    def pids(self) -> list:
+        return [slot.process.pid for slot in self.slots if slot.process is not None and slot.process.poll() is None]
+
+    def _check(self, slot, now):
+        if slot.failed:
+            return
+        if slot.restart_at is not None:
+            if now >= slot.restart_at:
+                self.restarts += 1
+                self._start(slot)
+            return
+        code = slot.process.poll()
+        if code is None:
+            return
+        slot.crashes = [t for t in slot.crashes if now - t < self.restart_window] + [now]
+        if len(slot.crashes) > self.max_restarts:
+            slot.failed = True
+            log.error("❌ Worker %d exited with code %s %d times in %.0fs; not restarting it",
+                      slot.index, code, len(slot.crashes), self.restart_window)
+            return
+        delay = self.restart_delay * 2 ** (len(slot.crashes) - 1)
+        slot.restart_at = now + delay
+        log.warning("⚠️ Worker %d (pid %d) exited with code %s; restarting in %.1fs", slot.index, slot.process.pid, code, delay)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self) -> int:
+        """Start the workers and supervise them until stopped; returns a process exit code"""
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            previous = {sig: signal.signal(sig, self.stop) for sig in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            for slot in self.slots:
+                self._start(slot)
+            while not self.stopping:
+                now = time.monotonic()
+                for slot in self.slots:
+                    self._check(slot, now)
+                if all(slot.failed for slot in self.slots):
+                    log.error("❌ Every worker keeps crashing; giving up")
+                    self.shutdown()
+                    return 1
+                time.sleep(self.poll_interval)
+            self.shutdown()
+            return 0
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+    def shutdown(self):
+        """Ask every worker to finish (SIGTERM), then kill those still running after the grace period"""
+        running = [slot.process for slot in self.slots if slot.process is not None and slot.process.poll() is None]
+        log.info("🛑 Stopping %d workers...", len(running))
+        for process in running:
+            process.terminate()
+        deadline = time.monotonic() + self.grace
+        for process in running:
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                log.warning("⚠️ Worker pid %d did not stop within %.0fs; killing it", process.pid, self.grace)
+                process.kill()
+                process.wait()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Offline test for voice blob decoding (audio_decode.py): containers are named
+from their magic bytes, PCM WAV of any common layout converts in process to
+16 kHz mono 16-bit (checked by pitch, not just length), compressed blobs go
+to long-lived decode workers (the same process serves clip after clip, and a
+crashed worker is replaced), and without any decoder a compressed voice
+message ends in an error reply instead of an exception.
+"""
+
+import array
+import asyncio
+import io
+import math
+import os
+import struct
+import tempfile
+import wave
+
+import server
+from audio_decode import AudioDecodeError, DecodeWorkerPool, parse_wav, sniff_format, wav_to_pcm
+
+TARGET_RATE = 16000
+TONE_HZ = 440
+
+
+def tone_wav(rate, channels, width, seconds=0.5, extra_chunk=False, streamed=False, silent_right=False):
+    """A TONE_HZ sine as a WAV blob; extra_chunk puts an odd-sized LIST chunk before
+    the data, streamed leaves the data size at 0 like streaming recorders do, and
+    silent_right keeps the second channel at zero so the channels differ"""
+    frames = bytearray()
+    for i in range(int(rate * seconds)):
+        value = math.sin(2 * math.pi * TONE_HZ * i / rate) * 0.5
+        if width == 1:
+            sample, silence = bytes([int(128 + value * 127)]), b"\x80"
+        else:
+            sample = int(value * (2 ** (8 * width - 1) - 1)).to_bytes(width, "little", signed=True)
+            silence = b"\0" * width
+        frames += sample + silence if silent_right else sample * channels
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(channels)
+        wf.setsampwidth(width)
+        wf.setframerate(rate)
+        wf.writeframes(bytes(frames))
+    blob = buf.getvalue()
+    if extra_chunk:
+        listing = b"LIST" + struct.pack("<I", 5) + b"INFOx" + b"\0"  # odd size, padded
+        blob = blob[:36] + listing + blob[36:]
+    if streamed:
+        data_at = blob.index(b"data")
+        blob = blob[:data_at + 4] + b"\0\0\0\0" + blob[data_at + 8:]
+    return blob
+
+
+def pitch(pcm, rate):
+    """Dominant frequency of 16-bit mono PCM from its zero crossings"""
+    samples = array.array("h", pcm)
+    crossings = sum(1 for a, b in zip(samples, samples[1:]) if (a < 0) != (b < 0))
+    return crossings / 2 / (len(samples) / rate)
+
+
+def fake_decoder(name, sample_rate):
+    """A decoder that reports which process served the clip, and dies on request"""
+    class Decoder:
+        def decode(self, blob, fmt):
+            if blob.endswith(b"crash"):
+                os._exit(1)
+            if blob.endswith(b"corrupt"):
+                raise ValueError("corrupt stream")
+            return struct.pack("<i", os.getpid()) + b"\0\0" * 100
+    return Decoder()
+
+
+def check_sniffing():
+    headers = {
+        "wav": tone_wav(16000, 1, 2)[:12],
+        "webm": b"\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01\x42\xf7\x81",
+        "ogg": b"OggS\x00\x02" + b"\0" * 6,
+        "flac": b"fLaC\x00\x00\x00\x22" + b"\0" * 4,
+        "mp4": b"\x00\x00\x00\x1cftypisom",
+        "mp3": b"ID3\x04\x00\x00" + b"\0" * 6,
+        "aac": b"\xff\xf1\x50\x80" + b"\0" * 8,
+        None: b"hello world!",
+    }
+    wrong = {fmt: sniff_format(head) for fmt, head in headers.items() if sniff_format(head) != fmt}
+    wrong_mp3 = sniff_format(b"\xff\xfb\x90\x00") != "mp3" or sniff_format(memoryview(b"OggS....")) != "ogg"
+    if not wrong and not wrong_mp3:
+        print(f"✅ Magic bytes name {len(headers) - 1} containers and reject unknown input")
+        return True
+    print(f"❌ Sniffing: {wrong}, mp3 frame sync / memoryview wrong: {wrong_mp3}")
+    return False
+
+
+def check_wav_conversion():
+    ok = True
+    cases = {
+        "16k mono 16-bit": tone_wav(16000, 1, 2),
+        "48k stereo 16-bit": tone_wav(48000, 2, 2),
+        "44.1k mono 8-bit": tone_wav(44100, 1, 1),
+        "11.025k stereo 8-bit, silent right": tone_wav(11025, 2, 1, silent_right=True),
+        "22.05k stereo 24-bit": tone_wav(22050, 2, 3),
+        "8k mono 32-bit, LIST chunk": tone_wav(8000, 1, 4, extra_chunk=True),
+        "16k mono, streamed size": tone_wav(16000, 1, 2, streamed=True),
+    }
+    for name, blob in cases.items():
+        pcm = wav_to_pcm(blob, TARGET_RATE)
+        frequency = pitch(pcm, TARGET_RATE) if pcm else 0
+        expected = TARGET_RATE * 0.5 * 2
+        if pcm is None or abs(len(pcm) - expected) > 64 or abs(frequency - TONE_HZ) > 10:
+            print(f"❌ {name}: {len(pcm) if pcm else None} bytes, {frequency:.0f} Hz")
+            ok = False
+    # Unsigned 8-bit channels must be centred before they are averaged: 127 and 129 are both ~silence
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(2)
+        wf.setsampwidth(1)
+        wf.setframerate(TARGET_RATE)
+        wf.writeframes(b"\x7f\x81" * 4)
+    sample = array.array("h", wav_to_pcm(buf.getvalue(), TARGET_RATE))[0]
+    if abs(sample) > 512:
+        print(f"❌ 8-bit stereo frame L=127, R=129 downmixed to {sample} instead of ~0")
+        ok = False
+    native = tone_wav(16000, 1, 2)
+    fast = wav_to_pcm(native, TARGET_RATE, convert=False)
+    if fast != bytes(parse_wav(native)[4]) or wav_to_pcm(cases["48k stereo 16-bit"], TARGET_RATE, convert=False):
+        print("❌ convert=False should copy target-format WAV as is and refuse the rest")
+        ok = False
+    float_wav = bytearray(native)
+    float_wav[20:22] = (3).to_bytes(2, "little")  # WAVE_FORMAT_IEEE_FLOAT
+    if wav_to_pcm(bytes(float_wav), TARGET_RATE) is not None:
+        print("❌ Float WAV should be left to a decoder worker")
+        ok = False
+    try:
+        parse_wav(native[:40])
+        print("❌ Truncated WAV parsed")
+        ok = False
+    except AudioDecodeError:
+        pass
+    if ok:
+        print(f"✅ {len(cases)} WAV layouts converted in process to {TARGET_RATE} Hz mono at {TONE_HZ} Hz; "
+              "float WAV left to the workers")
+    return ok
+
+
+async def check_pool():
+    ok = True
+    pool = DecodeWorkerPool(workers=1, decoder_factory=fake_decoder)
+    try:
+        first = await pool.decode(b"OggS clip one", "ogg")
+        second = await pool.decode(memoryview(b"OggS clip two"), "ogg")
+        same_process = first[:4] == second[:4] and len(first) == 204
+        try:
+            await pool.decode(b"OggS corrupt", "ogg")
+            corrupt_raised = False
+        except AudioDecodeError as e:
+            corrupt_raised = "corrupt stream" in str(e)
+        try:
+            await pool.decode(b"OggS crash", "ogg")
+            crash_raised = False
+        except AudioDecodeError:
+            crash_raised = True
+        after = await pool.decode(b"OggS clip three", "ogg")
+        stats = pool.stats()
+        if same_process and corrupt_raised and crash_raised and after[:4] != first[:4] \
+                and stats["recycled"] == 1 and stats["clips_done"] == 3 and stats["failures"] == 2:
+            print(f"✅ One worker process decoded consecutive clips; a crash was recycled: {stats}")
+        else:
+            print(f"❌ Pool: same process {same_process}, errors {corrupt_raised}/{crash_raised}, {stats}")
+            ok = False
+    finally:
+        pool.shutdown()
+    return ok
+
+
+async def check_server_path():
+    ok = True
+    audio_dir = tempfile.TemporaryDirectory()
+    server.AUDIO_LOG_DIR = audio_dir.name
+    try:
+        audio = await server.process_audio_data(tone_wav(48000, 2, 2), "decodetest")
+        if getattr(audio, "sample_rate", None) != TARGET_RATE or abs(pitch(audio.frame_data, TARGET_RATE) - TONE_HZ) > 10:
+            print(f"❌ Server WAV decode returned {audio!r}")
+            ok = False
+        # No decoder is configured for this pool: the voice message must fail politely
+        server.decode_pool = DecodeWorkerPool(workers=1, decoder="no-such-decoder")
+        reply = await server.process_audio_data(b"\x1a\x45\xdf\xa3 webm from MediaRecorder", "decodetest")
+        if not (isinstance(reply, str) and reply.startswith("Error processing audio") and "no-such-decoder" in reply):
+            print(f"❌ Undecodable webm returned {reply!r}")
+            ok = False
+        counted = server.AUDIO_DECODES.value(format="wav", path="in_process") \
+            and server.AUDIO_DECODES.value(format="webm", path="worker")
+        if ok and counted:
+            print(f"✅ Server decodes WAV in process and turns a missing decoder into: {reply[:70]}...")
+        elif not counted:
+            print("❌ Decodes not counted by format and path")
+            ok = False
+    finally:
+        server.decode_pool.shutdown()
+        audio_dir.cleanup()
+    return ok
+
+
+async def main():
+    ok = check_sniffing()
+    ok = check_wav_conversion() and ok
+    ok = await check_pool() and ok
+    ok = await check_server_path() and ok
+    print("🎉 All audio decode tests passed" if ok else "❌ Audio decode tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing audio decoding...")
+    asyncio.run(main())
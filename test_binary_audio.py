@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Offline test for binary reply-audio frames: a client that sends
+{"type": "hello", "binary_audio": true} gets a JSON header carrying audio_id
+and audio_bytes followed by a binary frame holding that id (4 bytes,
+big-endian) and the raw WAV, while other clients keep receiving base64 inside
+JSON. A reply cancelled mid-send still delivers the whole header/audio pair. Reports wire bytes and CPU time per reply.
+"""
+
+import asyncio
+import base64
+import io
+import json
+import os
+import struct
+import tempfile
+import time
+import wave
+from types import SimpleNamespace
+
+import server
+
+REPLY = "Here is a spoken answer to your question."
+AUDIO_SECONDS = 5  # typical sentence-length reply at Gemini's 24 kHz mono
+ROUNDS = 50
+
+
+def make_wav(seconds):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(24000)
+        wf.writeframes(os.urandom(24000 * 2 * seconds))
+    return buf.getvalue()
+
+
+AUDIO = make_wav(AUDIO_SECONDS)
+
+
+class FakeModels:
+    def generate_content(self, model, contents):
+        return SimpleNamespace(text=REPLY)
+
+
+async def fake_synthesize_speech(text, model=server.TTS_MODEL):
+    return AUDIO
+
+
+class FakeWebSocket:
+    """Feeds scripted client messages and records what the server sends back"""
+    def __init__(self, incoming=()):
+        self.state = SimpleNamespace(name="OPEN")
+        self.incoming = list(incoming)
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.incoming:
+            raise StopAsyncIteration
+        return self.incoming.pop(0)
+
+
+class SlowWebSocket(FakeWebSocket):
+    """Each send waits as if draining to a slow client"""
+    async def send(self, message):
+        await asyncio.sleep(0.05)
+        self.sent.append(message)
+
+
+def wire_bytes(frames):
+    return sum(len(f) if isinstance(f, bytes) else len(f.encode('utf-8')) for f in frames)
+
+
+def client_decode(frames):
+    """What a browser has to do to get the WAV bytes back out of the frames"""
+    for frame in frames:
+        if isinstance(frame, bytes):
+            return frame[4:]
+        data = json.loads(frame)
+        if data.get("audio"):
+            return base64.b64decode(data["audio"])
+
+
+async def measure(session_id):
+    frames = []
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        websocket = FakeWebSocket()
+        await server.send_with_audio(websocket, session_id, {"type": "text", "content": REPLY}, AUDIO)
+        frames = websocket.sent
+    server_cpu = (time.process_time() - start) / ROUNDS
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        audio = client_decode(frames)
+    client_cpu = (time.process_time() - start) / ROUNDS
+    return frames, audio, server_cpu, client_cpu
+
+
+async def main():
+    ok = True
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.client = SimpleNamespace(models=FakeModels())
+    client.initialized = True
+    client.synthesize_speech = fake_synthesize_speech
+    server.gemini_client = client
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    server.history_store = None  # keep test rows out of the history index
+    os.close(fd)
+    audio_dir = tempfile.TemporaryDirectory()
+    server.AUDIO_LOG_DIR = audio_dir.name
+    server.tts_cache = server.TTSAudioCache(os.path.join(audio_dir.name, "tts_cache"))
+
+    try:
+        websocket = FakeWebSocket([
+            json.dumps({"type": "hello", "binary_audio": True}),
+            json.dumps({"type": "tts_request", "text": "say something"}),
+        ])
+        await server.serve_messages(websocket, "bin1")
+        await server.session_dispatchers["bin1"].join()
+        hello = json.loads(websocket.sent[0])
+        header = json.loads(websocket.sent[1])
+        if hello.get("binary_audio") and header.get("audio_id") and "audio" not in header \
+                and websocket.sent[2] == struct.pack(">I", header["audio_id"]) + AUDIO \
+                and header["audio_bytes"] == len(AUDIO):
+            print(f"✅ Negotiated client got a {len(websocket.sent[1])}-byte header plus a raw binary frame")
+        else:
+            print(f"❌ Unexpected frames: {[f[:80] for f in websocket.sent]}")
+            ok = False
+
+        server.binary_audio_locks["bin2"] = asyncio.Lock()
+        server.TTS_PIPELINE_ENABLED = True
+        websocket = FakeWebSocket()
+        await server.process_text_message(websocket, "tell me more", "bin2", enable_tts=True)
+        headers = [json.loads(f) for f in websocket.sent[:-1] if isinstance(f, str)]
+        pairs = all(websocket.sent[i + 1][:4] == struct.pack(">I", json.loads(f)["audio_id"])
+                    for i, f in enumerate(websocket.sent) if isinstance(f, str) and json.loads(f).get("audio_id"))
+        if pairs and any(h["type"] == "audio_chunk" and h.get("audio_id") for h in headers):
+            print("✅ Pipelined audio_chunk frames also travel as header + binary pairs")
+        else:
+            print(f"❌ Pipelined frames not paired: {[f[:60] for f in websocket.sent]}")
+            ok = False
+        websocket = SlowWebSocket()
+        send = asyncio.create_task(server.send_with_audio(websocket, "bin2", {"type": "text", "content": REPLY}, AUDIO))
+        await asyncio.sleep(0.07)  # header written, audio still draining
+        send.cancel()
+        await asyncio.sleep(0.1)
+        if len(websocket.sent) == 2 and websocket.sent[1][:4] == struct.pack(">I", json.loads(websocket.sent[0])["audio_id"]):
+            print("✅ Cancelling a reply mid-send still delivers the header's audio")
+        else:
+            print(f"❌ Cancelled send left {len(websocket.sent)} frames")
+            ok = False
+        server.binary_audio_locks.clear()
+
+        legacy_frames, legacy_audio, legacy_server, legacy_client = await measure("legacy")
+        server.binary_audio_locks["bin3"] = asyncio.Lock()
+        binary_frames, binary_audio, binary_server, binary_client = await measure("bin3")
+        legacy_size, binary_size = wire_bytes(legacy_frames), wire_bytes(binary_frames)
+        print(f"📊 {AUDIO_SECONDS}s reply ({len(AUDIO)} bytes of WAV): "
+              f"base64 JSON {legacy_size} bytes, binary {binary_size} bytes "
+              f"({100 * (1 - binary_size / legacy_size):.0f}% less)")
+        print(f"📊 CPU per reply: server {legacy_server * 1000:.2f}ms -> {binary_server * 1000:.2f}ms, "
+              f"client decode {legacy_client * 1000:.2f}ms -> {binary_client * 1000:.2f}ms")
+        if legacy_audio == binary_audio == AUDIO and binary_size < legacy_size * 0.8 \
+                and binary_server < legacy_server:
+            print("✅ Binary frames carry the same audio with less bandwidth and CPU")
+        else:
+            print("❌ Binary frames did not save bandwidth/CPU")
+            ok = False
+    finally:
+        os.unlink(server.LOG_FILE)
+        audio_dir.cleanup()
+
+    print("🎉 All binary audio tests passed" if ok else "❌ Binary audio tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing binary audio frames...")
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Offline test for the indexed chat history behind /chat_history: the existing
+CSV is imported once, the latest page costs the same for a small and a large
+history, session/since filters and cursor pages are exact, the log writer
+indexes new rows, and the HTTP endpoint pages with X-Next-Cursor, answers
+unchanged polls with 304, tails with ?after= and gzips large pages.
+"""
+
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timedelta
+
+import server
+from chat_history import FIELDS, ChatHistoryStore
+
+SESSIONS = 50
+START = datetime(2026, 1, 1)
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for i in range(rows):
+            ts = (START + timedelta(seconds=i)).isoformat()
+            writer.writerow([ts, f"s{i % SESSIONS}", f"question {i}", f"answer {i}", "N/A", "N/A"])
+
+
+def build_store(tempdir, rows):
+    csv_path = os.path.join(tempdir, f"log_{rows}.csv")
+    write_csv(csv_path, rows)
+    store = ChatHistoryStore(os.path.join(tempdir, f"history_{rows}.db"))
+    start = time.perf_counter()
+    imported = store.import_csv(csv_path)
+    return store, imported, time.perf_counter() - start
+
+
+def latest_page_ms(store, repeats=50):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        store.page(limit=100)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def fetch(port, query):
+    url = f"http://127.0.0.1:{port}/chat_history{query}"
+    try:
+        with urllib.request.urlopen(url) as res:
+            return res.status, json.loads(res.read()), res.headers.get("X-Next-Cursor")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read()), None
+
+
+def fetch_raw(port, query, headers):
+    """(status, response headers, body bytes on the wire) for a request with extra headers"""
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/chat_history{query}", headers=headers)
+    try:
+        with urllib.request.urlopen(request) as res:
+            return res.status, res.headers, res.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+async def main():
+    ok = True
+    with tempfile.TemporaryDirectory() as tempdir:
+        small, _, _ = build_store(tempdir, 2000)
+        large, imported, import_s = build_store(tempdir, 200000)
+        print(f"📚 Imported {imported} CSV rows in {import_s:.2f}s")
+        if imported != 200000 or large.import_csv(os.path.join(tempdir, "log_200000.csv")) != 0:
+            print("❌ Import was not exactly once")
+            ok = False
+
+        small_ms, large_ms = latest_page_ms(small), latest_page_ms(large)
+        print(f"📊 Latest 100 rows: {small_ms:.2f} ms from 2k rows, {large_ms:.2f} ms from 200k rows")
+        rows, _ = large.page(limit=100)
+        if [r["user_message"] for r in rows] == [f"question {i}" for i in range(199900, 200000)] \
+                and large_ms < small_ms * 3 + 1:
+            print("✅ Latest page is the newest rows, oldest first, at a cost independent of history size")
+        else:
+            print("❌ Latest page is wrong or grows with the history")
+            ok = False
+
+        rows, _ = large.page(session_id="s7", limit=1000)
+        since = (START + timedelta(seconds=199990)).isoformat()
+        recent, cursor = large.page(since=since, limit=100)
+        if len(rows) == 1000 and all(r["session_id"] == "s7" for r in rows) \
+                and [r["user_message"] for r in recent] == [f"question {i}" for i in range(199991, 200000)] \
+                and cursor is None:
+            print("✅ session_id and since filters return exactly the matching rows")
+        else:
+            print("❌ Filtered pages are wrong")
+            ok = False
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = large.page(session_id="s3", before=cursor, limit=500)
+            seen = rows + seen
+            pages += 1
+            if cursor is None:
+                break
+        ids = [r["id"] for r in seen]
+        if len(seen) == 200000 // SESSIONS and ids == sorted(set(ids)):
+            print(f"✅ Cursor walk covered a session's {len(seen)} rows in {pages} pages, no gaps or repeats")
+        else:
+            print(f"❌ Cursor walk returned {len(seen)} rows")
+            ok = False
+
+        # New rows reach the index through the chat log writer
+        server.LOG_FILE = os.path.join(tempdir, "live.csv")
+        server.history_store = ChatHistoryStore(os.path.join(tempdir, "live.db"))
+        writer = server.ChatLogWriter(flush_interval=0.01)
+        for i in range(250):
+            await writer.log([(START + timedelta(seconds=i)).isoformat(), "live", f"q{i}", f"a{i}", "N/A", "N/A"])
+        await writer.close()
+        if server.history_store.count() == 250:
+            print("✅ Logged rows are indexed alongside the CSV")
+        else:
+            print(f"❌ Index has {server.history_store.count()} of 250 logged rows")
+            ok = False
+
+        await server.http_api.start("127.0.0.1", 0)
+        port = server.http_api.port
+        status, first, cursor = await asyncio.to_thread(fetch, port, "?session_id=live&limit=100")
+        status2, second, _ = await asyncio.to_thread(fetch, port, f"?session_id=live&limit=100&cursor={cursor}")
+        bad, error, _ = await asyncio.to_thread(fetch, port, "?limit=abc")
+        if status == status2 == 200 and [r["user_message"] for r in second + first] == \
+                [f"q{i}" for i in range(50, 250)] and bad == 400 and "error" in error:
+            print("✅ /chat_history pages with X-Next-Cursor and rejects bad queries")
+        else:
+            print(f"❌ /chat_history responses: {status}, {status2}, {bad}")
+            ok = False
+
+        # Conditional GET: an unchanged history is a bodyless 304 until a row is logged
+        status, headers, plain = await asyncio.to_thread(fetch_raw, port, "?limit=100", {})
+        etag, last_modified = headers["ETag"], headers["Last-Modified"]
+        unchanged, _, body = await asyncio.to_thread(fetch_raw, port, "?limit=100", {"If-None-Match": etag})
+        by_date, _, _ = await asyncio.to_thread(fetch_raw, port, "?limit=100", {"If-Modified-Since": last_modified})
+        last_id = max(r["id"] for r in json.loads(plain))
+        writer = server.ChatLogWriter(flush_interval=0.01)
+        await writer.log([START.isoformat(), "live", "new question", "new answer", "N/A", "N/A"])
+        await writer.close()
+        changed, headers2, _ = await asyncio.to_thread(fetch_raw, port, "?limit=100", {"If-None-Match": etag})
+        _, tail, _ = await asyncio.to_thread(fetch, port, f"?after={last_id}")
+        if status == 200 and unchanged == 304 and not body and by_date == 304 \
+                and changed == 200 and headers2["ETag"] != etag:
+            print(f"✅ Unchanged polls get 304 with no body ({len(plain)} bytes saved), a new row changes the ETag")
+        else:
+            print(f"❌ Conditional GET: {status}, {unchanged}, {by_date}, {changed}")
+            ok = False
+        if [r["user_message"] for r in tail] == ["new question"]:
+            print("✅ ?after= returns only the rows logged since the client's newest id")
+        else:
+            print(f"❌ Tail returned {tail}")
+            ok = False
+
+        _, headers, compressed = await asyncio.to_thread(fetch_raw, port, "?limit=250", {"Accept-Encoding": "gzip"})
+        _, plain_headers, plain = await asyncio.to_thread(fetch_raw, port, "?limit=250", {})
+        if headers.get("Content-Encoding") == "gzip" and gzip.decompress(compressed) == plain \
+                and plain_headers.get("Content-Encoding") is None:
+            print(f"✅ Large pages are gzipped for clients that accept it: {len(plain)} -> {len(compressed)} bytes")
+        else:
+            print("❌ Large page was not gzipped")
+            ok = False
+        await server.http_api.close()
+
+        for store in (small, large, server.history_store):
+            store.close()
+
+    print("🎉 All chat history tests passed" if ok else "❌ Chat history tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing indexed chat history...")
+    asyncio.run(main())
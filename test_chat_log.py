@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Offline test for the batched chat log writer: rows land in the order they were
+logged, many rows share one write and one fsync, a slow disk pushes back on
+loggers instead of growing the queue, and shutdown writes every queued row.
+"""
+
+import asyncio
+import csv
+import os
+import tempfile
+import time
+
+import server
+
+TASKS = 30
+ROWS_PER_TASK = 10
+
+
+def read_rows(path):
+    with open(path, encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+async def main():
+    ok = True
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    server.history_store = None  # keep test rows out of the history index
+
+    try:
+        writer = server.ChatLogWriter(path, flush_interval=0.05)
+        order = []
+
+        async def session(n):
+            for i in range(ROWS_PER_TASK):
+                row = [len(order), f"s{n}", f"message {i}"]
+                order.append(row[0])
+                await writer.log(row)
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*(session(n) for n in range(TASKS)))
+        await writer.flush()
+        rows = read_rows(path)
+        stats = writer.stats()
+        total = TASKS * ROWS_PER_TASK
+        print(f"📊 {total} rows: {stats['batches']} writes/thread hops, {stats['fsyncs']} fsyncs "
+              f"(previously {total} of each)")
+        if [int(r[0]) for r in rows] == order and len(rows) == total:
+            print("✅ Rows were written in the order they were logged")
+        else:
+            print("❌ Rows missing or out of order")
+            ok = False
+        if stats["batches"] < total / 10 and stats["fsyncs"] == stats["batches"]:
+            print("✅ One write and one fsync per batch instead of per message")
+        else:
+            print(f"❌ Rows were not batched: {stats}")
+            ok = False
+
+        # Slow disk: the bounded queue makes loggers wait
+        open(path, "w").close()
+        slow = server.ChatLogWriter(path, flush_interval=0.01, max_batch=10, max_queue=20)
+        write_batch = slow._write_batch
+
+        def slow_write(batch):
+            time.sleep(0.05)
+            write_batch(batch)
+
+        slow._write_batch = slow_write
+        peak = 0
+        start = time.perf_counter()
+        for i in range(100):
+            await slow.log([i, "slow", "row"])
+            peak = max(peak, slow.stats()["queued"])
+        blocked = time.perf_counter() - start
+        await slow.close()
+        if peak <= 20 and blocked > 0.2 and len(read_rows(path)) == 100:
+            print(f"✅ Slow disk applied backpressure: queue peaked at {peak}, loggers waited {blocked:.2f}s")
+        else:
+            print(f"❌ No backpressure: peak {peak}, waited {blocked:.2f}s")
+            ok = False
+
+        # Shutdown drains everything still queued
+        open(path, "w").close()
+        writer = server.ChatLogWriter(path, flush_interval=10.0)
+        for i in range(50):
+            await writer.log([i, "drain", "row"])
+        await writer.close()
+        if len(read_rows(path)) == 50:
+            print("✅ close() wrote every queued row before returning")
+        else:
+            print(f"❌ Rows lost on shutdown: {len(read_rows(path))}/50")
+            ok = False
+    finally:
+        os.unlink(path)
+
+    print("🎉 All chat log tests passed" if ok else "❌ Chat log tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing batched chat log writer...")
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Offline test for bounded Gemini concurrency: identical in-flight prompts are
+coalesced into one upstream call, upstream calls never exceed the admission
+limit, and requests beyond the queue limit are rejected quickly.
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import server
+
+
+class SlowModels:
+    """Fake client.models that tracks total and peak concurrent upstream calls"""
+    def __init__(self, delay=0.3):
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _enter(self):
+        with self.lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+
+    def _exit(self):
+        with self.lock:
+            self.active -= 1
+
+    def generate_content(self, model, contents):
+        self._enter()
+        try:
+            time.sleep(self.delay)
+            return SimpleNamespace(text=f"answer to: {contents}")
+        finally:
+            self._exit()
+
+    def generate_content_stream(self, model, contents):
+        self._enter()
+        try:
+            for word in ["streamed", " answer", " to: ", contents]:
+                time.sleep(self.delay / 4)
+                yield SimpleNamespace(text=word)
+        finally:
+            self._exit()
+
+
+def make_client(**limits):
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS, **limits)
+    client.client = SimpleNamespace(models=SlowModels())
+    client.initialized = True
+    return client
+
+
+async def collect(client, prompt):
+    return "".join([chunk async for chunk in client.generate_stream(prompt)])
+
+
+async def main():
+    ok = True
+
+    client = make_client()
+    replies = await asyncio.gather(*(client.generate("what are your hours") for _ in range(20)))
+    models = client.client.models
+    if models.calls == 1 and len(set(replies)) == 1:
+        print(f"✅ 20 identical concurrent requests cost 1 upstream call ({client.coalesced} coalesced)")
+    else:
+        print(f"❌ Expected 1 upstream call, got {models.calls}")
+        ok = False
+
+    client = make_client()
+    replies = await asyncio.gather(*(collect(client, "hello") for _ in range(10)))
+    if client.client.models.calls == 1 and set(replies) == {"streamed answer to: hello"}:
+        print("✅ 10 identical concurrent streams share 1 upstream stream")
+    else:
+        print(f"❌ Stream coalescing failed: {client.client.models.calls} calls, {set(replies)}")
+        ok = False
+
+    # One caller giving up must not cancel the shared call for the others
+    client = make_client()
+    impatient = asyncio.ensure_future(client.generate("shared"))
+    patient = asyncio.ensure_future(client.generate("shared"))
+    await asyncio.sleep(0.05)
+    impatient.cancel()
+    if await patient == "answer to: shared":
+        print("✅ Cancelling one coalesced caller leaves the others unaffected")
+    else:
+        print("❌ Shared call was cancelled")
+        ok = False
+
+    client = make_client(max_concurrency=2, max_queue=3)
+    start = time.perf_counter()
+    replies = await asyncio.gather(*(client.generate(f"question {i}") for i in range(8)))
+    elapsed = time.perf_counter() - start
+    busy = replies.count(server.LLM_BUSY_MESSAGE)
+    models = client.client.models
+    print(f"📊 8 distinct requests: {models.calls} upstream calls, peak concurrency {models.peak}, "
+          f"{busy} rejected, {elapsed:.2f}s, stats={client.stats()}")
+    if models.peak <= 2 and busy == 3 and models.calls == 5:
+        print("✅ Admission limit and queue depth enforced")
+    else:
+        print("❌ Admission control did not behave as expected")
+        ok = False
+
+    print("🎉 All concurrency tests passed" if ok else "❌ Concurrency tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing Gemini concurrency limits and coalescing...")
+    asyncio.run(main())
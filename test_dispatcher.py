@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Offline test for the per-connection reply dispatcher, over a real WebSocket
+with a fake, slow streaming Gemini backend: pings are answered while a reply
+is being generated, a new message cancels the reply it supersedes, closing
+the socket stops upstream generation, and a full queue refuses new jobs.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import websockets
+
+import server
+
+CHUNKS = 20
+CHUNK_DELAY = 0.1  # a full reply takes ~2s
+
+
+class SlowStreamingModels:
+    """Streams CHUNKS words per prompt, recording how many each prompt produced"""
+    def __init__(self):
+        self.produced = {}
+
+    def generate_content_stream(self, model, contents):
+        lines = str(contents).splitlines()
+        prompt = lines[-2] if len(lines) > 1 else lines[-1]  # the new user line, before "Assistant:"
+        for i in range(CHUNKS):
+            time.sleep(CHUNK_DELAY)
+            self.produced[prompt] = self.produced.get(prompt, 0) + 1
+            yield SimpleNamespace(text=f"w{i} ")
+
+    def count(self, word):
+        return sum(n for prompt, n in self.produced.items() if word in prompt)
+
+
+async def recv_until(websocket, predicate, timeout=10.0):
+    frames = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        frame = json.loads(await asyncio.wait_for(websocket.recv(), deadline - time.monotonic()))
+        frames.append(frame)
+        if predicate(frame):
+            break
+    return frames
+
+
+class FakeWebSocket:
+    state = SimpleNamespace(name="OPEN")
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+async def main():
+    ok = True
+    models = SlowStreamingModels()
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.client = SimpleNamespace(models=models)
+    client.initialized = True
+    server.gemini_client = client
+    server.response_cache = None
+    client.response_cache = None
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    server.history_store = None  # keep test rows out of the history index
+    os.close(fd)
+
+    try:
+        async with websockets.serve(server.handle_connection, "127.0.0.1", 0) as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            async with websockets.connect(f"ws://127.0.0.1:{port}") as websocket:
+                await websocket.recv()  # session
+                await websocket.send(json.dumps({"type": "text", "content": "alpha question", "stream": True}))
+                await recv_until(websocket, lambda f: f["type"] == "text_delta")
+                start = time.perf_counter()
+                await websocket.send(json.dumps({"type": "ping"}))
+                await recv_until(websocket, lambda f: f["type"] == "pong")
+                pong_ms = (time.perf_counter() - start) * 1000
+                if pong_ms < 200:
+                    print(f"✅ Ping answered in {pong_ms:.0f} ms while a reply was streaming")
+                else:
+                    print(f"❌ Ping waited {pong_ms:.0f} ms behind generation")
+                    ok = False
+
+                await websocket.send(json.dumps({"type": "text", "content": "beta question", "stream": True}))
+                frames = await recv_until(websocket, lambda f: f["type"] == "text_done")
+                cancelled = [f for f in frames if f["type"] == "cancelled"]
+                await asyncio.sleep(3 * CHUNK_DELAY)
+                alpha = models.count("alpha")
+                if cancelled and cancelled[0]["reason"] == "superseded" and 0 < alpha < CHUNKS \
+                        and frames[-1]["content"].count("w") == CHUNKS:
+                    print(f"✅ New message cancelled the superseded reply after {alpha}/{CHUNKS} chunks "
+                          f"and was answered in full")
+                else:
+                    print(f"❌ Supersede failed: {cancelled}, alpha produced {alpha}")
+                    ok = False
+
+                await websocket.send(json.dumps({"type": "text", "content": "gamma question", "stream": True}))
+                await recv_until(websocket, lambda f: f["type"] == "text_delta")
+            # Socket closed mid-reply
+            await asyncio.sleep(0.5)
+            gamma_at_close = models.count("gamma")
+            await asyncio.sleep(1.0)
+            gamma = models.count("gamma")
+            if 0 < gamma < CHUNKS and gamma <= gamma_at_close + 1 and server.dispatch_totals["abandoned"] >= 1:
+                print(f"✅ Closing the socket stopped upstream generation ({gamma}/{CHUNKS} chunks)")
+            else:
+                print(f"❌ Generation kept running for a closed socket: {gamma} chunks, {server.dispatch_totals}")
+                ok = False
+
+        websocket = FakeWebSocket()
+        dispatcher = server.SessionDispatcher(websocket, "q1", max_pending=2, supersede=False)
+        accepted = [dispatcher.submit(asyncio.sleep, 0.05) for _ in range(5)]
+        await dispatcher.join()
+        await asyncio.sleep(0)
+        busy = [f for f in websocket.sent if f["type"] == "text" and "Still working" in f["content"]]
+        await dispatcher.close()
+        if accepted == [True, True, False, False, False] and len(busy) == 3:
+            print("✅ A full queue refuses new jobs with a busy message instead of growing")
+        else:
+            print(f"❌ Queue bound not enforced: {accepted}, {len(busy)} busy messages")
+            ok = False
+    finally:
+        await server.chat_log.flush()
+        os.unlink(server.LOG_FILE)
+
+    print("🎉 All dispatcher tests passed" if ok else "❌ Dispatcher tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing per-connection reply dispatcher...")
+    asyncio.run(main())
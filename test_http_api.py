@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Offline test for the asyncio HTTP API server: a slow request no longer
+blocks other clients, connections are kept alive across requests, CORS
+preflights are answered, streamed JSON arrives intact, stalled clients and
+handlers are timed out, and malformed or oversized requests get a 4xx.
+"""
+
+import asyncio
+import http.client
+import json
+import time
+
+from http_api import HTTPAPIServer, json_array_stream, json_response
+
+SLOW_SECONDS = 1.0
+
+
+async def slow(request):
+    await asyncio.sleep(SLOW_SECONDS)
+    return json_response(request, {"slow": True})
+
+
+async def fast(request):
+    return json_response(request, {"fast": True})
+
+
+async def stuck(request):
+    await asyncio.sleep(3600)
+
+
+async def rows(request):
+    return json_array_stream(request, [{"id": i, "text": "x" * 50} for i in range(int(request.param("n", 0)))],
+                             chunk_items=100)
+
+
+def get(port, path, method="GET", headers=None, conn=None):
+    conn = conn or http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request(method, path, headers=headers or {})
+    res = conn.getresponse()
+    return res.status, dict(res.getheaders()), res.read(), conn
+
+
+def timed_get(port, path):
+    start = time.perf_counter()
+    status, _, body, conn = get(port, path)
+    conn.close()
+    return status, json.loads(body), time.perf_counter() - start
+
+
+def raw_exchange(port, data, wait):
+    """Send raw bytes and return whatever the server answers within `wait` seconds"""
+    import socket
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.sendall(data)
+        sock.settimeout(wait)
+        try:
+            return sock.recv(4096)
+        except socket.timeout:
+            return b""
+
+
+async def main():
+    ok = True
+    api = HTTPAPIServer({"/slow": slow, "/fast": fast, "/stuck": stuck, "/rows": rows},
+                        header_timeout=0.5, keepalive_timeout=2.0, handler_timeout=1.5)
+    await api.start("127.0.0.1", 0)
+    port = api.port
+
+    slow_call = asyncio.create_task(asyncio.to_thread(timed_get, port, "/slow"))
+    await asyncio.sleep(0.1)
+    fast_results = await asyncio.gather(*(asyncio.to_thread(timed_get, port, "/fast") for _ in range(5)))
+    slow_status, _, slow_s = await slow_call
+    worst_fast = max(elapsed for _, _, elapsed in fast_results)
+    print(f"📊 5 requests during a {SLOW_SECONDS:.0f}s request: slowest took {worst_fast * 1000:.0f} ms")
+    if slow_status == 200 and all(status == 200 for status, _, _ in fast_results) and worst_fast < SLOW_SECONDS / 2:
+        print("✅ A slow request does not block other clients")
+    else:
+        print("❌ Requests were serialized behind the slow one")
+        ok = False
+
+    conn = None
+    statuses = []
+    for _ in range(3):
+        status, headers, _, conn = await asyncio.to_thread(get, port, "/fast", conn=conn)
+        statuses.append(status)
+    conn.close()
+    stats = api.stats()
+    if statuses == [200] * 3 and headers.get("Connection") == "keep-alive" and stats["requests"] - stats["connections"] >= 2:
+        print(f"✅ Three requests shared one kept-alive connection: {stats}")
+    else:
+        print(f"❌ Keep-alive failed: {statuses}, {headers}, {stats}")
+        ok = False
+
+    status, headers, body, conn = await asyncio.to_thread(
+        get, port, "/fast", "OPTIONS", {"Origin": "null", "Access-Control-Request-Method": "GET",
+                                        "Access-Control-Request-Headers": "if-none-match"})
+    conn.close()
+    if status == 204 and headers.get("Access-Control-Allow-Origin") == "*" \
+            and "GET" in headers.get("Access-Control-Allow-Methods", "") and not body:
+        print("✅ CORS preflight answered")
+    else:
+        print(f"❌ CORS preflight: {status} {headers}")
+        ok = False
+
+    status, headers, body, conn = await asyncio.to_thread(get, port, "/rows?n=1000")
+    conn.close()
+    items = json.loads(body)
+    status_empty, _, empty, conn = await asyncio.to_thread(get, port, "/rows?n=0")
+    conn.close()
+    if status == 200 and headers.get("Transfer-Encoding") == "chunked" and [i["id"] for i in items] == list(range(1000)) \
+            and json.loads(empty) == []:
+        print(f"✅ Streamed JSON array of 1000 items arrived intact ({len(body)} bytes, chunked)")
+    else:
+        print("❌ Streamed JSON was corrupted")
+        ok = False
+
+    stalled = await asyncio.to_thread(raw_exchange, port, b"GET /fast HTTP/1.1\r\nHost: x\r\n", 2.0)
+    stalled_body = await asyncio.to_thread(
+        raw_exchange, port, b"GET /fast HTTP/1.1\r\nHost: x\r\nContent-Length: 1000\r\n\r\npart", 2.0)
+    status, _, body, conn = await asyncio.to_thread(get, port, "/stuck")
+    conn.close()
+    if stalled.startswith(b"HTTP/1.1 408") and stalled_body.startswith(b"HTTP/1.1 408") \
+            and status == 504 and b"timed out" in body:
+        print("✅ Clients stalled in the head or body get 408 and stuck handlers 504")
+    else:
+        print(f"❌ Timeouts: {stalled[:20]!r}, {stalled_body[:20]!r}, {status}")
+        ok = False
+
+    bad_length = await asyncio.to_thread(
+        raw_exchange, port, b"GET /fast HTTP/1.1\r\nHost: x\r\nContent-Length: lots\r\n\r\n", 2.0)
+    big_head = await asyncio.to_thread(
+        raw_exchange, port, b"GET /fast HTTP/1.1\r\nX-Filler: " + b"x" * 20000 + b"\r\n\r\n", 2.0)
+    big_body = await asyncio.to_thread(
+        raw_exchange, port, b"GET /fast HTTP/1.1\r\nHost: x\r\nContent-Length: 10000000\r\n\r\n", 2.0)
+    if bad_length.startswith(b"HTTP/1.1 400 Bad Request") and big_head.startswith(b"HTTP/1.1 431 Request Header") \
+            and big_body.startswith(b"HTTP/1.1 413 Payload Too Large"):
+        print("✅ Bad Content-Length gets 400, oversized heads 431 and oversized bodies 413")
+    else:
+        print(f"❌ Malformed requests: {bad_length[:40]!r}, {big_head[:40]!r}, {big_body[:40]!r}")
+        ok = False
+
+    await api.close()
+    print("🎉 All HTTP API tests passed" if ok else "❌ HTTP API tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing asyncio HTTP API server...")
+    asyncio.run(main())
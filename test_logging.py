@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Offline test for the logging subsystem (log_setup.py): arguments are
+truncated when formatted, records below the level are never formatted, the
+caller's cost per record stays flat as payloads grow (print() is timed
+alongside for comparison), a blocked output drops records instead of
+stalling the caller, and a turn with a huge reply logged at DEBUG writes
+only short lines.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import log_setup
+import server
+
+SMALL, LARGE = "x" * 100, "x" * 1_000_000
+CALLS = 2000
+
+
+class CountingArg:
+    """Counts how often it is turned into text"""
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "formatted"
+
+
+class BlockingStream(io.StringIO):
+    """An output that hangs until released, like a stalled terminal or pipe"""
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, text):
+        self.release.wait()
+        return super().write(text)
+
+
+class HugeReplyModels:
+    def generate_content(self, model, contents):
+        return SimpleNamespace(text="word " * 60_000)
+
+
+class FakeWebSocket:
+    state = SimpleNamespace(name="OPEN")
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append(json.loads(message))
+
+
+def per_call_us(fn, payload, calls=CALLS):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn(payload)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def check_formatting():
+    ok = True
+    record = logging.makeLogRecord({"msg": "reply %s audio %s took %d ms", "args": ("y" * 5000, b"\0" * 4096, 12),
+                                    "levelname": "INFO", "name": "voicebot", "session_id": "abc123"})
+    text = log_setup.TruncatingFormatter(max_field_chars=50).format(record)
+    entry = json.loads(log_setup.JSONFormatter(max_field_chars=50).format(record))
+    if "<4096 bytes>" in text and "[+4950 chars]" in text and "took 12 ms" in text and len(text) < 200 \
+            and text.endswith("session_id=abc123") and entry["session_id"] == "abc123" and "<4096 bytes>" in entry["msg"]:
+        print(f"✅ Arguments truncated and extra fields kept: {text[-90:]}")
+    else:
+        print(f"❌ Formatting: {text[:200]!r} / {entry}")
+        ok = False
+    return ok
+
+
+def check_lazy_and_flat():
+    ok = True
+    log = logging.getLogger("voicebot.test")
+    with open(os.devnull, "w") as devnull:
+        log_setup.configure(level="INFO", stream=devnull)
+        try:
+            arg = CountingArg()
+            for _ in range(100):
+                log.debug("never shown: %s", arg)
+            if arg.formatted == 0:
+                print("✅ DEBUG records are not formatted at INFO")
+            else:
+                print(f"❌ DEBUG argument formatted {arg.formatted} times at INFO")
+                ok = False
+
+            small = per_call_us(lambda p: log.info("reply %s", p), SMALL)
+            large = per_call_us(lambda p: log.info("reply %s", p), LARGE)
+            debug_large = per_call_us(lambda p: log.debug("reply %s", p), LARGE)
+            print_small = per_call_us(lambda p: print("reply", p, file=devnull), SMALL, 200)
+            print_large = per_call_us(lambda p: print("reply", p, file=devnull), LARGE, 200)
+            print(f"📊 Caller cost per record, 100 B vs 1 MB argument: log.info {small:.1f} vs {large:.1f} µs, "
+                  f"log.debug {debug_large:.2f} µs; print() {print_small:.1f} vs {print_large:.1f} µs")
+            if large < small * 3 + 20:
+                print("✅ Per-record cost is flat in payload size at INFO")
+            else:
+                print("❌ Per-record cost grows with payload size")
+                ok = False
+        finally:
+            log_setup.shutdown()
+    return ok
+
+
+def check_non_blocking():
+    ok = True
+    log = logging.getLogger("voicebot.test")
+    stream = BlockingStream()
+    log_setup.configure(level="INFO", stream=stream)
+    records = log_setup.LOG_QUEUE_SIZE + 500
+    started = time.perf_counter()
+    for i in range(records):
+        log.info("record %d", i)
+    elapsed = time.perf_counter() - started
+    dropped = log_setup.dropped()
+    stream.release.set()
+    log_setup.shutdown()
+    written = stream.getvalue().count("\n")
+    if elapsed < 2 and dropped >= 499 and written + dropped == records:
+        print(f"✅ Blocked output: {records} records queued in {elapsed * 1000:.0f} ms, "
+              f"{dropped} dropped, {written} written once it recovered")
+    else:
+        print(f"❌ Blocked output: {elapsed:.2f}s, {dropped} dropped, {written} written of {records}")
+        ok = False
+    return ok
+
+
+async def check_hot_path():
+    ok = True
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.client = SimpleNamespace(models=HugeReplyModels())
+    client.initialized = True
+    server.gemini_client = client
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    server.history_store = None  # keep test rows out of the history index
+    output = io.StringIO()
+    log_setup.configure(level="DEBUG", stream=output)
+    try:
+        websocket = FakeWebSocket()
+        await server.process_text_message(websocket, "tell me everything", "logtest")
+        await server.chat_log.flush()
+    finally:
+        log_setup.shutdown()
+        logging.getLogger().setLevel(logging.WARNING)
+        os.unlink(server.LOG_FILE)
+    lines = output.getvalue().splitlines()
+    reply = websocket.sent[-1]["content"] if websocket.sent else ""
+    longest = max((len(line) for line in lines), default=0)
+    if len(reply) > 250_000 and any("Text extracted" in line for line in lines) and longest < 1000:
+        print(f"✅ A {len(reply) // 1000} KB reply at DEBUG: {len(lines)} log lines, longest {longest} chars")
+    else:
+        print(f"❌ Hot path at DEBUG: reply {len(reply)} chars, {len(lines)} lines, longest {longest}")
+        ok = False
+    return ok
+
+
+async def main():
+    ok = check_formatting()
+    ok = check_lazy_and_flat() and ok
+    ok = check_non_blocking() and ok
+    ok = await check_hot_path() and ok
+    print("🎉 All logging tests passed" if ok else "❌ Logging tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing structured logging...")
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Offline test for the event-loop watchdog and the sampling profiler: a
+handler that blocks the loop with a synchronous sleep is reported once, with
+its task and its stack, and shows up in /loop_stats and /metrics; a loop
+that keeps yielding is never reported; /debug/profile returns folded stacks
+naming the code that was busy, and refuses to run unless enabled.
+"""
+
+import asyncio
+import json
+import re
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import server
+
+FOLDED_LINE = re.compile(r'^\S+ \d+$')
+
+
+async def blocking_handler():
+    time.sleep(0.4)  # a synchronous call on the event loop
+
+
+async def busy_work(seconds):
+    """CPU work that yields often enough not to stall the loop"""
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sum(i * i for i in range(20000))
+        await asyncio.sleep(0)
+
+
+async def get(path):
+    def _get():
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.http_api.port}{path}") as response:
+                return response.status, response.headers, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read().decode()
+    return await asyncio.to_thread(_get)
+
+
+async def main():
+    ok = True
+    watchdog = server.loop_watchdog
+    watchdog.threshold = 0.1
+    heartbeat = asyncio.create_task(watchdog.run())
+    await server.http_api.start("127.0.0.1", 0)
+    try:
+        await busy_work(0.5)
+        if watchdog.stalls == 0:
+            print(f"✅ No stalls while the loop keeps yielding (max lag {watchdog.max_lag * 1000:.0f} ms)")
+        else:
+            print(f"❌ {watchdog.stalls} stalls reported for a loop that yields")
+            ok = False
+
+        await asyncio.create_task(blocking_handler(), name="reply-job")
+        await asyncio.sleep(0.2)
+        _, _, body = await get("/loop_stats")
+        stats = json.loads(body)
+        stall = stats["recent"][-1] if stats["recent"] else {}
+        stack = "".join(stall.get("stack", []))
+        if stats["stalls"] == 1 and stall["task"] == "reply-job" and "blocking_handler" in stack \
+                and "time.sleep(0.4)" in stack and 0.3 <= stall["duration_s"] <= 0.6:
+            print(f"✅ Stall of {stall['duration_s'] * 1000:.0f} ms reported in task {stall['task']} "
+                  f"at: {stack.strip().splitlines()[-1].strip()}")
+        else:
+            print(f"❌ Stall report: {stats}")
+            ok = False
+
+        _, _, body = await get("/metrics")
+        lag_count = re.search(r'^voicebot_event_loop_lag_seconds_count (\d+)', body, re.M)
+        if "voicebot_event_loop_stalls_total 1" in body and lag_count and int(lag_count.group(1)) > 5:
+            print(f"✅ /metrics has the stall count and {lag_count.group(1)} loop lag samples")
+        else:
+            print("❌ Loop metrics missing from /metrics")
+            ok = False
+
+        server.PROFILER_ENABLED = False
+        status, _, _ = await get("/debug/profile?seconds=0.1")
+        server.PROFILER_ENABLED = True
+        busy = asyncio.create_task(busy_work(1.5))
+        status_on, headers, folded = await get("/debug/profile?seconds=1")
+        await busy
+        lines = folded.splitlines()
+        switch_restored = sys.getswitchinterval() == 0.005
+        busy_samples = sum(int(line.rsplit(" ", 1)[1]) for line in lines if "busy_work" in line)
+        if status == 404 and status_on == 200 and lines and all(FOLDED_LINE.match(line) for line in lines) \
+                and busy_samples > int(headers["X-Samples"]) // 4 and switch_restored:
+            print(f"✅ Profile: {headers['X-Samples']} samples, {len(lines)} distinct stacks, "
+                  f"{busy_samples} in busy_work; disabled by default")
+        else:
+            print(f"❌ Profile: disabled {status}, enabled {status_on}, {len(lines)} stacks, "
+                  f"{busy_samples} busy samples, switch interval {sys.getswitchinterval()}: {lines[:3]}")
+            ok = False
+        status, _, _ = await get("/debug/profile?seconds=600")
+        if status != 400:
+            print(f"❌ Over-long profile answered {status}")
+            ok = False
+    finally:
+        heartbeat.cancel()
+        await server.http_api.close()
+
+    print("🎉 All loop monitor tests passed" if ok else "❌ Loop monitor tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing the event-loop watchdog and profiler...")
+    asyncio.run(main())
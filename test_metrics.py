@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Offline test for per-stage timing and the /metrics endpoint: a streamed text
+message and a voice recording go through a real WebSocket with fake Gemini,
+speech recognition and local TTS backends (Gemini TTS failing, so replies
+fall back to the local engine), then /metrics is scraped and checked for
+well-formed Prometheus text with a span for every stage the turns went
+through.
+"""
+
+import asyncio
+import io
+import json
+import os
+import re
+import tempfile
+import time
+import urllib.request
+import wave
+from types import SimpleNamespace
+
+import websockets
+
+import server
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]+="[^"]*",?)*\})? (-?[0-9.e+-]+|\+Inf)$')
+
+
+class FakeModels:
+    def generate_content_stream(self, model, contents):
+        for piece in ("Here is a reply. ", "It has two sentences."):
+            time.sleep(0.02)
+            yield SimpleNamespace(text=piece)
+
+
+class FakeRecognizer:
+    def recognize_google(self, audio):
+        time.sleep(0.05)
+        return "hello from a voice message"
+
+
+class FakeLocalTTS:
+    async def synthesize(self, text):
+        await asyncio.sleep(0.01)
+        return b"RIFF" + text.encode()
+
+    def shutdown(self):
+        pass
+
+
+async def failing_synthesize_speech(text, model=server.TTS_MODEL):
+    raise RuntimeError("Gemini TTS unavailable")
+
+
+def make_wav():
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(16000)
+        wf.writeframes(b"\x10\x00\xf0\xff" * 4000)
+    return buf.getvalue()
+
+
+def parse(text):
+    """{(name, labels string): value}, and the lines that are not valid samples"""
+    samples, bad = {}, []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        if not SAMPLE_LINE.match(line):
+            bad.append(line)
+            continue
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        samples[(name, labels.rstrip("}"))] = float(value)
+    return samples, bad
+
+
+async def recv_until(websocket, predicate):
+    while True:
+        message = await asyncio.wait_for(websocket.recv(), 10)
+        if isinstance(message, str) and predicate(json.loads(message)):
+            return
+
+
+async def main():
+    ok = True
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.client = SimpleNamespace(models=FakeModels())
+    client.initialized = True
+    client.synthesize_speech = failing_synthesize_speech
+    server.gemini_client = client
+    server.speech_recognizer = FakeRecognizer()
+    server.SPEECH_RECOGNITION_AVAILABLE = True
+    server.tts_pool = FakeLocalTTS()
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    server.history_store = None  # keep test rows out of the history index
+    audio_dir = tempfile.TemporaryDirectory()
+    server.AUDIO_LOG_DIR = audio_dir.name
+    server.tts_cache = server.TTSAudioCache(os.path.join(audio_dir.name, "tts_cache"))
+
+    try:
+        await server.http_api.start("127.0.0.1", 0)
+        async with websockets.serve(server.handle_connection, "127.0.0.1", 0) as ws_server:
+            port = ws_server.sockets[0].getsockname()[1]
+            async with websockets.connect(f"ws://127.0.0.1:{port}") as websocket:
+                await websocket.recv()  # session
+                await websocket.send(json.dumps({"type": "text", "content": "hi there", "stream": True}))
+                await recv_until(websocket, lambda f: f["type"] == "text_done")
+                await websocket.send(make_wav())
+                await recv_until(websocket, lambda f: f["type"] == "audio_chunk" and f.get("final"))
+            await server.chat_log.flush()
+
+        url = f"http://127.0.0.1:{server.http_api.port}/metrics"
+        response = await asyncio.to_thread(urllib.request.urlopen, url)
+        content_type = response.headers["Content-Type"]
+        samples, bad = parse(response.read().decode())
+
+        if content_type.startswith("text/plain; version=0.0.4") and not bad:
+            print(f"✅ /metrics returned {len(samples)} well-formed samples")
+        else:
+            print(f"❌ Malformed /metrics ({content_type}): {bad[:3]}")
+            ok = False
+
+        def count(stage):
+            return samples.get(("voicebot_stage_seconds_count", f'stage="{stage}"'), 0)
+        stages = ["llm_stream", "llm_first_delta", "decode", "stt", "tts_gemini", "tts_local", "log_write", "ws_send"]
+        missing = [name for name in stages if not count(name)]
+        if not missing:
+            print("✅ Timed stages: " + ", ".join(f"{name}={int(count(name))}" for name in stages))
+        else:
+            print(f"❌ No spans for {missing}")
+            ok = False
+
+        fallbacks = samples.get(("voicebot_tts_local_fallbacks_total", ""), 0)
+        tts_errors = samples.get(("voicebot_stage_errors_total", 'stage="tts_gemini"'), 0)
+        received = {kind: samples.get(("voicebot_messages_received_total", f'type="{kind}"'), 0)
+                    for kind in ("text", "audio")}
+        frames = samples.get(("voicebot_frames_sent_total", 'kind="text"'), 0)
+        if fallbacks >= 1 and tts_errors == fallbacks and received == {"text": 1, "audio": 1} \
+                and frames == count("ws_send"):
+            print(f"✅ Counters: {int(fallbacks)} local TTS fallbacks, messages {received}, {int(frames)} frames sent")
+        else:
+            print(f"❌ Counters: fallbacks {fallbacks}, tts errors {tts_errors}, {received}, "
+                  f"{frames} frames vs {count('ws_send')} sends")
+            ok = False
+
+        buckets = [v for (name, labels), v in samples.items()
+                   if name == "voicebot_stage_seconds_bucket" and labels.startswith('stage="stt"')]
+        if buckets == sorted(buckets) and buckets[-1] == count("stt") \
+                and ("voicebot_websocket_sessions", "") in samples:
+            print("✅ Histogram buckets are cumulative and gauges are present")
+        else:
+            print(f"❌ Histogram/gauges: {buckets}")
+            ok = False
+    finally:
+        await server.http_api.close()
+        await server.chat_log.flush()
+        os.unlink(server.LOG_FILE)
+        audio_dir.cleanup()
+
+    print("🎉 All metrics tests passed" if ok else "❌ Metrics tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing per-stage metrics and /metrics...")
+    asyncio.run(main())
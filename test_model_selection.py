@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Offline test for Gemini model selection: the working model is remembered and
+failed models are skipped until their backoff expires.
+Uses a fake client that records every generate_content call.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import server
+
+
+class RecordingModels:
+    """Fake client.models that fails for some model names and records all calls"""
+    def __init__(self, failing):
+        self.failing = set(failing)
+        self.calls = []
+
+    def generate_content(self, model, contents):
+        self.calls.append(model)
+        if model in self.failing:
+            raise Exception(f"404 model {model} not found")
+        return SimpleNamespace(text=f"reply from {model}")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_client(failing, clock):
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.model_selector = server.ModelSelector(server.PREFERRED_GEMINI_MODELS,
+                                                 backoff_base=30.0, backoff_max=120.0, clock=clock)
+    client.client = SimpleNamespace(models=RecordingModels(failing))
+    client.initialized = True
+    return client
+
+
+async def main():
+    ok = True
+    clock = FakeClock()
+    broken = server.PREFERRED_GEMINI_MODELS[0]
+    working = server.PREFERRED_GEMINI_MODELS[1]
+    client = make_client([broken], clock)
+    models = client.client.models
+
+    requests = 5
+    for _ in range(requests):
+        reply = await client.generate("hello")
+        if reply != f"reply from {working}":
+            print(f"❌ Unexpected reply: {reply}")
+            ok = False
+    print(f"📊 {requests} requests cost {len(models.calls)} upstream calls: {models.calls}")
+    if len(models.calls) == requests + 1:
+        print("✅ Failed model probed once, working model reused afterwards")
+    else:
+        print(f"❌ Expected {requests + 1} calls (one failed probe), got {len(models.calls)}")
+        ok = False
+
+    # Still failing after the backoff expires -> retried once, then backed off for longer
+    clock.now += 31
+    models.calls.clear()
+    await client.generate("hello")
+    await client.generate("hello")
+    if models.calls == [working, working]:
+        print("✅ Last good model stays first after backoff expires")
+    else:
+        print(f"❌ Unexpected call order after backoff: {models.calls}")
+        ok = False
+
+    # When the preferred model recovers it is picked up again once the working one fails
+    models.failing = {working}
+    models.calls.clear()
+    clock.now += 300
+    reply = await client.generate("hello")
+    if reply == f"reply from {broken}" and models.calls == [working, broken]:
+        print("✅ Recovered model is used once the last good model fails")
+    else:
+        print(f"❌ Unexpected recovery behaviour: {reply} / {models.calls}")
+        ok = False
+
+    print("🎉 All model selection tests passed" if ok else "❌ Model selection tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing model selection...")
+    asyncio.run(main())
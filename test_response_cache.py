@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Offline test for the Gemini response cache: normalized exact-match hits,
+LRU eviction, TTL expiry and the on-disk tier surviving a restart.
+"""
+
+import asyncio
+import tempfile
+import time
+from types import SimpleNamespace
+
+import server
+
+
+class CountingModels:
+    """Fake client.models that answers slowly and counts upstream calls"""
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+
+    def generate_content(self, model, contents):
+        self.calls += 1
+        time.sleep(self.delay)
+        return SimpleNamespace(text=f"answer to: {contents}")
+
+
+def make_client(cache):
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS, response_cache=cache)
+    client.client = SimpleNamespace(models=CountingModels())
+    client.initialized = True
+    return client
+
+
+async def main():
+    ok = True
+
+    cache = server.ResponseCache(max_entries=2, ttl=60)
+    client = make_client(cache)
+    for prompt in ["What are your hours?", "what are your hours", "  WHAT are   your hours?? "]:
+        await client.generate(prompt)
+    if client.client.models.calls == 1:
+        print(f"✅ Three spellings of one question cost 1 API call: {cache.stats()}")
+    else:
+        print(f"❌ Expected 1 API call, got {client.client.models.calls}")
+        ok = False
+
+    await client.generate("hello")
+    await client.generate("goodbye")  # evicts "what are your hours"
+    await client.generate("what are your hours")
+    if client.client.models.calls == 4 and cache.stats()["evictions"] >= 1:
+        print("✅ Least recently used entry evicted when the cache is full")
+    else:
+        print(f"❌ Unexpected eviction behaviour: {client.client.models.calls} calls, {cache.stats()}")
+        ok = False
+
+    cache.ttl = 0
+    await client.generate("hello")
+    if client.client.models.calls == 5:
+        print("✅ Expired entries are regenerated")
+    else:
+        print("❌ Expired entry was served from cache")
+        ok = False
+
+    with tempfile.TemporaryDirectory() as disk_dir:
+        first = make_client(server.ResponseCache(disk_dir=disk_dir))
+        await first.generate("hello")
+        await asyncio.sleep(0.1)  # disk write runs in the background
+        restarted = make_client(server.ResponseCache(disk_dir=disk_dir))
+        reply = await restarted.generate("Hello!")
+        stats = restarted.response_cache.stats()
+        if restarted.client.models.calls == 0 and stats["disk_hits"] == 1 and reply == "answer to: hello":
+            print(f"✅ Disk tier served the reply after a restart, saving {stats['latency_saved_seconds']}s")
+        else:
+            print(f"❌ Disk tier miss: {restarted.client.models.calls} calls, {stats}")
+            ok = False
+
+    print("🎉 All response cache tests passed" if ok else "❌ Response cache tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing response cache...")
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Offline test for fast startup: importing server.py leaves the heavy SDKs
+unloaded, the server accepts connections while a slow TTS probe is still
+running, and --preflight (eager=True) finishes the probe before listening.
+On shutdown, open connections are closed before the chat log is, so no turn
+can log a row after the final flush.
+"""
+
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import websockets
+
+import server
+from tts_worker import TTSWorkerPool
+
+HEAVY_MODULES = ["google.genai", "google.generativeai", "httpx", "speech_recognition", "pydub"]
+PROBE_SECONDS = 1.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def slow_synthesize(text):
+    await asyncio.sleep(PROBE_SECONDS)
+    return b"\0" * 100
+
+
+async def start_and_time(eager):
+    """Run main() until the WebSocket server is up; (seconds to listen, probe result at that moment)"""
+    server.PORT, server.HTTP_PORT = free_port(), free_port()
+    server.startup_state.update(listening_after_s=None, tts_available=None)
+    server.tts_pool = TTSWorkerPool(workers=1)  # the previous run shut its pool down
+    start = time.perf_counter()
+    task = asyncio.create_task(server.main(eager=eager))
+    while server.startup_state['listening_after_s'] is None:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    listened = time.perf_counter() - start
+    probe_at_listen = server.startup_state['tts_available']
+    await asyncio.sleep(PROBE_SECONDS + 0.2)
+    probe_after = server.startup_state['tts_available']
+    os.kill(os.getpid(), signal.SIGTERM)  # main() shuts down on SIGTERM
+    await task
+    return listened, probe_at_listen, probe_after
+
+
+async def check_shutdown_order():
+    """SIGTERM with a client connected: the chat log closes only after the connection is gone"""
+    server.PORT, server.HTTP_PORT = free_port(), free_port()
+    server.startup_state.update(listening_after_s=None)
+    server.tts_pool = TTSWorkerPool(workers=1)
+    sessions_at_close = []
+    close = server.chat_log.close
+
+    async def recording_close():
+        sessions_at_close.append(len(server.active_sessions))
+        await close()
+    server.chat_log.close = recording_close
+    task = asyncio.create_task(server.main())
+    try:
+        while server.startup_state['listening_after_s'] is None:
+            if task.done():
+                task.result()
+            await asyncio.sleep(0.01)
+        async with websockets.connect(f"ws://127.0.0.1:{server.PORT}") as websocket:
+            await websocket.recv()  # session frame
+            os.kill(os.getpid(), signal.SIGTERM)
+            await task
+    finally:
+        server.chat_log.close = close
+    if sessions_at_close == [0]:
+        print("✅ Shutdown closed the open connection before closing the chat log")
+        return True
+    print(f"❌ Chat log closed with sessions still open: {sessions_at_close}")
+    return False
+
+
+async def main():
+    ok = True
+    code = "import sys, server; print(' '.join(m for m in %r if m in sys.modules))" % HEAVY_MODULES
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    if not loaded:
+        print(f"✅ Importing server.py loads none of {', '.join(HEAVY_MODULES)} "
+              f"({server.startup_state['import_s'] * 1000:.0f} ms here)")
+    else:
+        print(f"❌ Imported eagerly: {loaded}")
+        ok = False
+
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    server.history_store = None  # keep test rows out of the history index
+    server.gemini_client.synthesize_speech = slow_synthesize
+    server.gemini_client.initialized = True
+    try:
+        listened, at_listen, after = await start_and_time(eager=False)
+        if listened < PROBE_SECONDS and at_listen is None and after is True:
+            print(f"✅ Listening after {listened * 1000:.0f} ms; the {PROBE_SECONDS:.0f}s TTS probe finished afterwards")
+        else:
+            print(f"❌ Lazy startup: listened after {listened:.2f}s, probe {at_listen} -> {after}")
+            ok = False
+
+        listened, at_listen, _ = await start_and_time(eager=True)
+        if listened >= PROBE_SECONDS and at_listen is True:
+            print(f"✅ --preflight probed TTS before listening ({listened * 1000:.0f} ms)")
+        else:
+            print(f"❌ Preflight: listened after {listened:.2f}s, probe {at_listen}")
+            ok = False
+
+        ok = await check_shutdown_order() and ok
+    finally:
+        os.unlink(server.LOG_FILE)
+
+    print("🎉 All startup tests passed" if ok else "❌ Startup tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing fast startup...")
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Offline test for streaming responses (text_delta / text_done frames).
+Uses a fake streaming Gemini backend, so no API key or network is needed.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import websockets
+
+import server
+
+
+class FakeStreamingModels:
+    """Mimics client.models.generate_content_stream, emitting chunks with delays"""
+    def __init__(self, chunks, first_delay=0.3, chunk_delay=0.2, error=None):
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.chunk_delay = chunk_delay
+        self.error = error  # raised once every chunk has been sent
+
+    def generate_content_stream(self, model, contents):
+        time.sleep(self.first_delay)
+        for i, text in enumerate(self.chunks):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield SimpleNamespace(text=text)
+        if self.error is not None:
+            raise self.error
+
+
+def install_fake_backend(chunks, first_delay=0.3, chunk_delay=0.2, error=None):
+    server.gemini_client.client = SimpleNamespace(
+        models=FakeStreamingModels(chunks, first_delay, chunk_delay, error)
+    )
+    server.gemini_client.initialized = True
+
+
+async def test_generate_stream():
+    chunks = ["Hello", " there,", " how", " can I help?"]
+    install_fake_backend(chunks, first_delay=0.3, chunk_delay=0.2)
+
+    start = time.perf_counter()
+    first_chunk_at = None
+    received = []
+    async for delta in server.gemini_client.generate_stream("hi"):
+        if first_chunk_at is None:
+            first_chunk_at = time.perf_counter() - start
+        received.append(delta)
+    total = time.perf_counter() - start
+
+    print(f"⏱️  First chunk after {first_chunk_at:.2f}s, full reply after {total:.2f}s")
+    if received == chunks and first_chunk_at < total / 2:
+        print("✅ generate_stream yields chunks as they arrive")
+        return True
+    print(f"❌ Unexpected stream: {received}")
+    return False
+
+
+async def test_stream_timeout():
+    chunks = ["The first part", " and the rest, much later."]
+    install_fake_backend(chunks, first_delay=0.05, chunk_delay=1.0)
+
+    received = [delta async for delta in server.gemini_client.generate_stream("slow", timeout=0.4)]
+    text = "".join(received)
+    if received[0] == chunks[0] and text.endswith(server.LLM_TIMEOUT_MESSAGE) \
+            and server.is_generation_error(text):
+        print("✅ A stream that times out part-way ends with the timeout notice and counts as a failure")
+        return True
+    print(f"❌ Timed-out stream: {received}")
+    return False
+
+
+async def test_stream_error():
+    chunks = ["The capital of France is"]
+    install_fake_backend(chunks, first_delay=0.05, chunk_delay=0.05, error=ConnectionResetError("upstream reset"))
+    errors_before = server.STAGE_ERRORS.value(stage="llm_stream")
+
+    async with websockets.serve(server.handle_connection, "127.0.0.1", 0) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        async with websockets.connect(f"ws://127.0.0.1:{port}") as websocket:
+            session_id = json.loads(await websocket.recv())["session_id"]
+            await websocket.send(json.dumps({"type": "text", "content": "capital?", "stream": True}))
+            while True:
+                frame = json.loads(await websocket.recv())
+                if frame["type"] == "text_done":
+                    break
+
+    text = frame["content"]
+    conv = server.conversation_store._get(session_id)
+    stored = bool(conv and conv.turns)
+    failed = server.STAGE_ERRORS.value(stage="llm_stream") - errors_before
+    if text.startswith(chunks[0]) and text.endswith(server.LLM_INTERRUPTED_MESSAGE) \
+            and server.is_generation_error(text) and failed == 1 and not stored:
+        print("✅ A stream that fails part-way ends with an error notice, fails its span and is not remembered")
+        return True
+    print(f"❌ Failed stream: {text!r}, span errors +{failed}, stored as a turn: {stored}")
+    return False
+
+
+async def test_websocket_frames():
+    chunks = ["Streaming", " works", " end", " to end."]
+    install_fake_backend(chunks, first_delay=0.2, chunk_delay=0.1)
+
+    async with websockets.serve(server.handle_connection, "127.0.0.1", 0) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        async with websockets.connect(f"ws://127.0.0.1:{port}") as websocket:
+            session = json.loads(await websocket.recv())
+            print(f"📨 Session: {session['session_id']}")
+
+            await websocket.send(json.dumps({"type": "text", "content": "hello", "stream": True}))
+            deltas = []
+            while True:
+                frame = json.loads(await websocket.recv())
+                if frame["type"] == "text_delta":
+                    deltas.append(frame["delta"])
+                elif frame["type"] == "text_done":
+                    break
+                else:
+                    print(f"❌ Unexpected frame: {frame}")
+                    return False
+
+    if deltas == chunks and frame["content"] == "".join(chunks):
+        print(f"✅ Received {len(deltas)} text_delta frames and a matching text_done")
+        return True
+    print(f"❌ Frames did not match: {deltas} / {frame}")
+    return False
+
+
+async def main():
+    # Keep test rows out of the real chat log
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    server.history_store = None  # keep test rows out of the history index
+    os.close(fd)
+    try:
+        ok = await test_generate_stream()
+        ok = await test_stream_timeout() and ok
+        ok = await test_stream_error() and ok
+        ok = await test_websocket_frames() and ok
+    finally:
+        await asyncio.sleep(0.1)  # let the background log write finish
+        os.unlink(server.LOG_FILE)
+    print("🎉 All streaming tests passed" if ok else "❌ Streaming tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing streaming responses...")
+    asyncio.run(main())
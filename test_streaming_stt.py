@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Offline test for streaming speech-to-text: microphone PCM is fed in 100 ms
+chunks, the VAD endpoints each utterance, partial transcripts arrive while
+the user is still speaking and the final one right after the endpoint. Slow
+final recognition runs on the session's dispatcher, so a ping sent after the
+endpoint is answered before the transcript. Uses local stand-in recognizers,
+so no network or speech models are needed.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import tempfile
+from types import SimpleNamespace
+
+import server
+from stt_stream import ClipRecognizer, PCMRingBuffer, StubRecognizer
+
+RATE = 16000
+CHUNK_MS = 100
+
+
+def tone(ms, amplitude):
+    samples = RATE * ms // 1000
+    return b"".join(int(amplitude * math.sin(2 * math.pi * 220 * i / RATE)
+                        + random.randint(-60, 60)).to_bytes(2, "little", signed=True)
+                    for i in range(samples))
+
+
+def silence(ms):
+    return tone(ms, 0)
+
+
+async def slow_transcribe(pcm, sample_rate):
+    await asyncio.sleep(1.0)
+    return "slowly recognized"
+
+
+class FakeModels:
+    def generate_content(self, model, contents):
+        return SimpleNamespace(text="Got it.")
+
+
+class FakeWebSocket:
+    """Replays client frames one at a time and timestamps replies by audio position"""
+    def __init__(self, frames):
+        self.state = SimpleNamespace(name="OPEN")
+        self.frames = frames
+        self.audio_ms = 0
+        self.sent = []
+
+    async def send(self, message):
+        self.sent.append((self.audio_ms, json.loads(message)))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.frames:
+            raise StopAsyncIteration
+        await asyncio.sleep(0.01)  # a real socket waits for the next frame; recognition runs meanwhile
+        frame = self.frames.pop(0)
+        if isinstance(frame, bytes):
+            self.audio_ms += len(frame) * 1000 // (RATE * 2)
+        return frame
+
+
+async def main():
+    ok = True
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.client = SimpleNamespace(models=FakeModels())
+    client.initialized = True
+    server.gemini_client = client
+    server.stream_recognizer = StubRecognizer(word_ms=200)
+    server.ENABLE_TTS_FOR_VOICE = False
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    server.history_store = None  # keep test rows out of the history index
+    os.close(fd)
+
+    ring = PCMRingBuffer(10)
+    ring.write(b"abcdefg")
+    ring.write(b"hijkl")
+    if ring.tail(10) == b"cdefghijkl" and ring.tail(3) == b"jkl" and len(ring) == 10:
+        print("✅ Ring buffer keeps the most recent audio across wrap-around")
+    else:
+        print(f"❌ Ring buffer returned {ring.tail(10)}")
+        ok = False
+
+    audio = silence(500) + tone(1200, 6000) + silence(900) + tone(600, 6000) + silence(200)
+    speech_ends = [500 + 1200, 500 + 1200 + 900 + 600]
+    chunk = RATE * 2 * CHUNK_MS // 1000
+    frames = [json.dumps({"type": "audio_stream_start", "sample_rate": RATE})]
+    frames += [audio[i:i + chunk] for i in range(0, len(audio), chunk)]
+    frames.append(json.dumps({"type": "audio_stream_end"}))
+
+    websocket = FakeWebSocket(frames)
+    # The frames arrive faster than real time; answer both utterances instead of superseding the first
+    server.session_dispatchers["stt1"] = server.SessionDispatcher(websocket, "stt1", supersede=False)
+    try:
+        await server.serve_messages(websocket, "stt1")
+        await server.session_dispatchers["stt1"].join()
+    finally:
+        os.unlink(server.LOG_FILE)
+
+    partials = [(t, f["content"]) for t, f in websocket.sent if f["type"] == "transcript_partial"]
+    finals = [(t, f["content"]) for t, f in websocket.sent if f["type"] == "transcript_final"]
+    replies = [f for _, f in websocket.sent if f["type"] == "text"]
+    print(f"📊 {len(partials)} partials, finals: {finals}")
+
+    if len(finals) == 2 and len(replies) == 2:
+        print("✅ Two utterances endpointed and answered")
+    else:
+        print(f"❌ Expected 2 utterances, got {finals}")
+        ok = False
+    first_partial = partials[0][0] if partials else None
+    if first_partial is not None and first_partial < speech_ends[0] \
+            and all(finals[0][1].startswith(p) for t, p in partials if t < speech_ends[0]):
+        print(f"✅ First partial after {first_partial}ms of audio, while the user was still talking")
+    else:
+        print(f"❌ No partials during speech: {partials}")
+        ok = False
+    endpoint_lag = finals[0][0] - speech_ends[0] if finals else None
+    if endpoint_lag is not None and endpoint_lag <= server.STT_VAD_ENDPOINT_MS + CHUNK_MS:
+        print(f"✅ Final transcript {endpoint_lag}ms after the user stopped (endpoint silence "
+              f"{server.STT_VAD_ENDPOINT_MS}ms), without waiting for the recording to end")
+    else:
+        print(f"❌ Final transcript late: {endpoint_lag}ms")
+        ok = False
+
+    server.stream_recognizer = ClipRecognizer(slow_transcribe)
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    frames = [json.dumps({"type": "audio_stream_start", "sample_rate": RATE})]
+    audio = tone(600, 6000) + silence(800)
+    frames += [audio[i:i + chunk] for i in range(0, len(audio), chunk)]
+    frames += [json.dumps({"type": "ping"}), json.dumps({"type": "audio_stream_end"})]
+    websocket = FakeWebSocket(frames)
+    try:
+        await server.serve_messages(websocket, "stt2")
+        read_all = [f["type"] for _, f in websocket.sent]
+        await server.session_dispatchers["stt2"].join()
+    finally:
+        os.unlink(server.LOG_FILE)
+    types = [f["type"] for _, f in websocket.sent]
+    if "pong" in read_all and "transcript_final" not in read_all and "transcript_final" in types:
+        print("✅ Ping answered while the final transcript was still being recognized")
+    else:
+        print(f"❌ Read loop waited for recognition: {read_all} -> {types}")
+        ok = False
+
+    print("🎉 All streaming STT tests passed" if ok else "❌ Streaming STT tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing streaming speech-to-text...")
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Offline test for the local STT worker pool with the stub backend: the model is
+loaded once per worker before the first request, concurrent utterances from
+different sessions are batched, and voice messages are transcribed through
+the pool without any network call.
+"""
+
+import asyncio
+import io
+import os
+import tempfile
+import time
+import wave
+from types import SimpleNamespace
+
+import server
+from stt_worker import STTWorkerError, STTWorkerPool
+
+RATE = 16000
+SESSIONS = 16
+
+
+def pcm(seconds):
+    return b"\x10\x00\xf0\xff" * (RATE * seconds // 2)
+
+
+async def burst(pool):
+    start = time.perf_counter()
+    texts = await asyncio.gather(*(pool.transcribe(pcm(1), RATE) for _ in range(SESSIONS)))
+    return time.perf_counter() - start, texts
+
+
+class FakeModels:
+    def generate_content(self, model, contents):
+        return SimpleNamespace(text="You said: " + contents.rsplit("User: ", 1)[-1].split("\n")[0])
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.state = SimpleNamespace(name="OPEN")
+        self.frames = []
+
+    async def send(self, message):
+        self.frames.append(message)
+
+
+async def main():
+    ok = True
+
+    pool = STTWorkerPool("stub", workers=2, max_batch=8)
+    start = time.perf_counter()
+    await pool.start()
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    text = await pool.transcribe(pcm(1), RATE)
+    first = time.perf_counter() - start
+    print(f"⏱️  Model load {loaded:.2f}s at startup, first utterance {first * 1000:.0f}ms")
+    if text == "word1 word2 word3 word4 word5" and first < loaded / 2:
+        print("✅ Models are loaded once per worker and stay warm")
+    else:
+        print(f"❌ Unexpected first transcription: {text!r} in {first:.2f}s")
+        ok = False
+
+    batched, texts = await burst(pool)
+    stats = pool.stats()
+    pool.shutdown()
+    unbatched_pool = STTWorkerPool("stub", workers=2, max_batch=1)
+    await unbatched_pool.start()
+    unbatched, _ = await burst(unbatched_pool)
+    unbatched_pool.shutdown()
+    print(f"📊 {SESSIONS} concurrent utterances: batched {batched:.2f}s "
+          f"(avg batch {stats['avg_batch']}), unbatched {unbatched:.2f}s")
+    if all(t == texts[0] for t in texts) and stats["avg_batch"] > 1 and batched < unbatched:
+        print("✅ Utterances from different sessions are batched")
+    else:
+        print(f"❌ Batching did not help: {stats}")
+        ok = False
+
+    broken = STTWorkerPool("no-such-backend", workers=1)
+    try:
+        await broken.transcribe(pcm(1), RATE)
+        print("❌ Unknown backend did not fail")
+        ok = False
+    except STTWorkerError as e:
+        print(f"✅ Unknown backend reported cleanly: {e}")
+    broken.shutdown()
+
+    # Voice messages go through the pool instead of Google recognition
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.client = SimpleNamespace(models=FakeModels())
+    client.initialized = True
+    server.gemini_client = client
+    server.ENABLE_TTS_FOR_VOICE = False
+    server.stt_pool = STTWorkerPool("stub", workers=1)
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    server.history_store = None  # keep test rows out of the history index
+    os.close(fd)
+    audio_dir = tempfile.TemporaryDirectory()
+    server.AUDIO_LOG_DIR = audio_dir.name
+    blob = io.BytesIO()
+    with wave.open(blob, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(44100)  # resampled to 16 kHz on the way in
+        wf.writeframes(b"\x10\x00" * 44100 * 2)
+    websocket = RecordingWebSocket()
+    try:
+        await server.process_audio_message(websocket, blob.getvalue(), "v1")
+    finally:
+        server.stt_pool.shutdown()
+        os.unlink(server.LOG_FILE)
+        audio_dir.cleanup()
+    if any("You said: word1 word2 word3 word4 word5 word6 word7 word8 word9 word10" in f for f in websocket.frames):
+        print("✅ Voice message transcribed locally and answered")
+    else:
+        print(f"❌ Unexpected reply: {websocket.frames}")
+        ok = False
+
+    print("🎉 All STT worker tests passed" if ok else "❌ STT worker tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing local STT worker pool...")
+    asyncio.run(main())
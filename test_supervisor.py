@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Offline test for the worker supervisor, using tiny stand-in worker scripts:
+workers share one port via SO_REUSEPORT, a crashed worker is restarted, a
+worker that keeps crashing is given up on, and shutdown lets workers finish
+their SIGTERM cleanup before the supervisor returns.
+"""
+
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+from supervisor import Supervisor, reuse_port_supported
+
+# Binds the shared port, records its pid, and on SIGTERM writes a "clean exit" marker
+WORKER = """
+import os, signal, socket, sys, time
+marker_dir, port = sys.argv[1], int(sys.argv[2])
+sock = socket.socket()
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+sock.bind(("127.0.0.1", port))
+sock.listen()
+def stop(*_):
+    time.sleep(0.2)  # pretend to flush logs
+    open(os.path.join(marker_dir, f"clean.{os.getpid()}"), "w").close()
+    sys.exit(0)
+signal.signal(signal.SIGTERM, stop)
+open(os.path.join(marker_dir, f"started.{os.getpid()}"), "w").close()
+while True:
+    time.sleep(0.1)
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def markers(directory, prefix):
+    return {name.split(".", 1)[1] for name in os.listdir(directory) if name.startswith(prefix + ".")}
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    ok = True
+    if not reuse_port_supported():
+        print("⚠️ SO_REUSEPORT unavailable here; nothing to test")
+        return
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        script = os.path.join(tempdir, "worker.py")
+        with open(script, "w") as f:
+            f.write(WORKER)
+        port = free_port()
+        supervisor = Supervisor(lambda index: [sys.executable, script, tempdir, str(port)], workers=3,
+                                grace=5.0, restart_delay=0.2)
+        runner = threading.Thread(target=supervisor.run)
+        runner.start()
+
+        if wait_for(lambda: len(markers(tempdir, "started")) == 3):
+            print("✅ Three workers bound the same port")
+        else:
+            print("❌ Workers did not all start")
+            ok = False
+
+        victim = supervisor.pids()[0]
+        os.kill(victim, signal.SIGKILL)
+        if wait_for(lambda: len(markers(tempdir, "started")) == 4 and victim not in supervisor.pids()):
+            print(f"✅ Crashed worker {victim} was replaced: {supervisor.pids()}")
+        else:
+            print("❌ Crashed worker was not restarted")
+            ok = False
+
+        running = set(map(str, supervisor.pids()))
+        supervisor.stop()
+        runner.join(10)
+        if not runner.is_alive() and running <= markers(tempdir, "clean"):
+            print("✅ Shutdown waited for every worker's SIGTERM cleanup")
+        else:
+            print(f"❌ Unclean shutdown: {running - markers(tempdir, 'clean')}")
+            ok = False
+
+        crasher = Supervisor(lambda index: [sys.executable, "-c", "raise SystemExit(3)"], workers=1,
+                             restart_delay=0.01, max_restarts=3)
+        start = time.monotonic()
+        code = crasher.run()
+        if code == 1 and crasher.restarts == 3 and time.monotonic() - start < 10:
+            print(f"✅ A worker crashing on start was given up on after {crasher.restarts} restarts")
+        else:
+            print(f"❌ Crash loop handling: exit {code}, {crasher.restarts} restarts")
+            ok = False
+
+    print("🎉 All supervisor tests passed" if ok else "❌ Supervisor tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing worker supervisor...")
+    main()
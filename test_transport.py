@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Offline test for the async Gemini transport against a local stand-in HTTP server.
+
+Compares the old pattern (a blocking HTTP call made directly on the event loop,
+as the TTS path used to do) with GeminiTransport, reporting event-loop stalls,
+p50/p99 request latency and how many TCP connections the server accepted.
+"""
+
+import asyncio
+import base64
+import json
+import statistics
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import server
+
+RESPONSE_DELAY = 0.1  # seconds the fake API takes per request
+REQUESTS = 40
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        FakeGeminiHandler.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["contents"][0]["parts"][0]["text"]
+        time.sleep(RESPONSE_DELAY)
+        if ":streamGenerateContent" in self.path:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for word in ["echo", ": ", prompt]:
+                event = f"data: {json.dumps(self._payload({'text': word}))}\r\n\r\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        if "responseModalities" in body.get("generationConfig", {}):
+            pcm = b"\x00\x00" * 2400
+            part = {"inlineData": {"mimeType": "audio/L16;codec=pcm;rate=24000",
+                                   "data": base64.b64encode(pcm).decode()}}
+        else:
+            part = {"text": f"echo: {prompt}"}
+        data = json.dumps(self._payload(part)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def _payload(part):
+        return {"candidates": [{"content": {"role": "model", "parts": [part]}}]}
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic 10 ms timer fires; lateness means the loop was blocked"""
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, loop.time() - expected)
+
+    async def __aenter__(self):
+        self._task = asyncio.ensure_future(self._run())
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.sleep(self.interval * 2)  # let the timer observe the last stall
+        self._task.cancel()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def timed(coro_fn, latencies, burst_start):
+    """Latency as seen by a client whose request arrived with the rest of the burst"""
+    result = await coro_fn()
+    latencies.append(time.perf_counter() - burst_start)
+    return result
+
+
+async def run_blocking_baseline(base_url):
+    """Old pattern: a synchronous HTTP call on the event loop, one new connection each"""
+    latencies = []
+
+    async def call(i):
+        body = json.dumps({"contents": [{"role": "user", "parts": [{"text": f"q{i}"}]}]}).encode()
+        req = urllib.request.Request(base_url + "models/fake:generateContent", data=body,
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req) as resp:
+            return json.loads(resp.read())
+
+    async with LoopLagMonitor() as monitor:
+        start = time.perf_counter()
+        await asyncio.gather(*(timed(lambda i=i: call(i), latencies, start) for i in range(REQUESTS)))
+        elapsed = time.perf_counter() - start
+    return latencies, monitor.max_lag, elapsed
+
+
+async def run_transport(base_url):
+    client = server.GeminiClient("fake-key", ["fake-model"])
+    client.transport = server.GeminiTransport("fake-key", base_url=base_url)
+    client.initialized = True
+    await client.generate("warm-up")  # the pooled client is created once, at startup
+    latencies = []
+    async with LoopLagMonitor() as monitor:
+        start = time.perf_counter()
+        replies = await asyncio.gather(*(timed(lambda i=i: client.generate(f"q{i}"), latencies, start)
+                                         for i in range(REQUESTS)))
+        elapsed = time.perf_counter() - start
+    streamed = "".join([c async for c in client.generate_stream("stream me")])
+    audio = await client.synthesize_speech("hello")
+    await client.aclose()
+    return latencies, monitor.max_lag, elapsed, replies, streamed, audio
+
+
+def report(name, latencies, max_lag, elapsed, connections):
+    print(f"📊 {name}: p50={statistics.median(latencies) * 1000:.0f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.0f}ms total={elapsed:.2f}s "
+          f"max loop stall={max_lag * 1000:.0f}ms connections={connections}")
+
+
+async def main():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FakeGeminiHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{httpd.server_address[1]}/v1beta/"
+    ok = True
+
+    FakeGeminiHandler.connections = 0
+    lat, lag, elapsed = await run_blocking_baseline(base_url)
+    report("blocking on loop", lat, lag, elapsed, FakeGeminiHandler.connections)
+    baseline_lag = lag
+
+    FakeGeminiHandler.connections = 0
+    lat, lag, elapsed, replies, streamed, audio = await run_transport(base_url)
+    report("async transport ", lat, lag, elapsed, FakeGeminiHandler.connections)
+
+    if replies == [f"echo: q{i}" for i in range(REQUESTS)] and streamed == "echo: stream me":
+        print("✅ Text and streaming replies decoded correctly")
+    else:
+        print(f"❌ Unexpected replies: {replies[:3]} / {streamed}")
+        ok = False
+    if audio[:4] == b"RIFF":
+        print(f"✅ TTS PCM wrapped as WAV ({len(audio)} bytes)")
+    else:
+        print("❌ TTS audio is not WAV")
+        ok = False
+    if FakeGeminiHandler.connections <= server.LLM_MAX_CONCURRENCY + 1:
+        print(f"✅ {REQUESTS + 3} requests reused {FakeGeminiHandler.connections} pooled connections")
+    else:
+        print(f"❌ Connections were not reused ({FakeGeminiHandler.connections})")
+        ok = False
+    if lag < baseline_lag / 4:
+        print(f"✅ Max loop stall dropped from {baseline_lag * 1000:.0f}ms to {lag * 1000:.0f}ms")
+    else:
+        print("❌ Event loop was still blocked")
+        ok = False
+
+    httpd.shutdown()
+    print("🎉 All transport tests passed" if ok else "❌ Transport tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing async Gemini transport against a local stand-in server...")
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Offline test for the TTS audio cache: repeated replies are spoken from memory
+or disk instead of being synthesized again, identical audio is stored once,
+and chat log rows point at the shared blob.
+"""
+
+import asyncio
+import csv
+import os
+import tempfile
+from types import SimpleNamespace
+
+import server
+
+REPLY = "Sure! The capital of France is Paris."
+
+
+class FakeModels:
+    def generate_content(self, model, contents):
+        return SimpleNamespace(text=REPLY)
+
+
+class FakeTTS:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, text, model=server.TTS_MODEL):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return b"RIFF" + text.encode()
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.state = SimpleNamespace(name="OPEN")
+        self.frames = []
+
+    async def send(self, message):
+        self.frames.append(message)
+
+
+async def main():
+    ok = True
+    audio_dir = tempfile.TemporaryDirectory()
+    server.AUDIO_LOG_DIR = audio_dir.name
+    store_dir = os.path.join(audio_dir.name, "tts_cache")
+    server.tts_cache = server.TTSAudioCache(store_dir)
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    server.history_store = None  # keep test rows out of the history index
+    os.close(fd)
+    server.TTS_PIPELINE_ENABLED = False
+
+    tts = FakeTTS()
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.client = SimpleNamespace(models=FakeModels())
+    client.initialized = True
+    client.synthesize_speech = tts
+    server.gemini_client = client
+
+    try:
+        for i in range(3):
+            await server.process_text_message(RecordingWebSocket(), f"capital of france? #{i}", f"s{i}",
+                                              enable_tts=True)
+        await server.chat_log.flush()
+        stats = server.tts_cache.stats()
+        if tts.calls == 1 and stats["hits"] == 2:
+            print(f"✅ Same reply spoken 3 times, synthesized once: {stats}")
+        else:
+            print(f"❌ Expected 1 synthesis, got {tts.calls}: {stats}")
+            ok = False
+
+        with open(server.LOG_FILE, encoding="utf-8") as f:
+            rows = [r for r in csv.reader(f) if r]
+        audio_files = {r[5] for r in rows}
+        blobs = [n for n in os.listdir(store_dir) if n.endswith(".wav")]
+        if len(audio_files) == 1 and len(blobs) == 1 and audio_files.pop() == os.path.join("tts_cache", blobs[0]):
+            print(f"✅ {len(rows)} log rows point at one shared blob: {blobs[0][:16]}...")
+        else:
+            print(f"❌ Log rows/blobs not shared: {audio_files} / {blobs}")
+            ok = False
+
+        # A fresh cache (as after a restart) answers from the disk tier
+        server.tts_cache = server.TTSAudioCache(store_dir)
+        audio_base64, error, audio_file = await server.generate_tts_with_gemini(REPLY, "s9")
+        if tts.calls == 1 and server.tts_cache.stats()["disk_hits"] == 1 and audio_file.endswith(blobs[0]):
+            print("✅ Audio survives a restart via the disk tier")
+        else:
+            print(f"❌ Disk tier missed: {server.tts_cache.stats()}")
+            ok = False
+
+        # Identical audio under another key (local backend) is not written twice
+        server.tts_pool = SimpleNamespace(synthesize=tts)
+        await server.text_to_speech(REPLY, "s10")
+        stats = server.tts_cache.stats()
+        blobs = [n for n in os.listdir(store_dir) if n.endswith(".wav")]
+        if tts.calls == 2 and len(blobs) == 1 and stats["blobs_deduplicated"] == 1:
+            print("✅ Identical audio from another backend is deduplicated on disk")
+        else:
+            print(f"❌ Duplicate blob written: {blobs} {stats}")
+            ok = False
+
+        cache = server.TTSAudioCache(os.path.join(audio_dir.name, "small"), max_memory_bytes=100)
+        for i in range(10):
+            cache.store(f"k{i}", bytes(30))
+        stats = cache.stats()
+        if stats["memory_bytes"] <= 100 and stats["evictions"] == 7 and stats["blobs_written"] == 1:
+            print(f"✅ Memory tier stays within its byte budget: {stats}")
+        else:
+            print(f"❌ Memory tier over budget: {stats}")
+            ok = False
+    finally:
+        os.unlink(server.LOG_FILE)
+        audio_dir.cleanup()
+
+    print("🎉 All TTS cache tests passed" if ok else "❌ TTS cache tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing TTS audio cache...")
+    asyncio.run(main())
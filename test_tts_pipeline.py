@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Offline test for sentence-pipelined TTS: audio for the first sentence is sent
+while the rest of the reply is still being generated, in sentence order, and
+the turn reaches the chat log even when the client leaves mid-reply.
+Uses a fake streaming LLM and a fake TTS backend with configurable latency.
+"""
+
+import asyncio
+import base64
+import csv
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import server
+
+SENTENCES = [
+    "Sure, here is the first part of the answer. ",
+    "The second sentence takes a little longer to generate. ",
+    "Then a third one explains some more details. ",
+    "And finally we wrap everything up nicely.",
+]
+CHUNK_DELAY = 0.25  # LLM delay per chunk
+TTS_SECONDS_PER_CHAR = 0.004  # fake TTS latency grows with text length
+
+
+class FakeModels:
+    def generate_content_stream(self, model, contents):
+        for sentence in SENTENCES:
+            # two chunks per sentence, so sentence boundaries fall mid-chunk
+            half = len(sentence) // 2
+            for piece in (sentence[:half], sentence[half:]):
+                time.sleep(CHUNK_DELAY / 2)
+                yield SimpleNamespace(text=piece)
+
+    def generate_content(self, model, contents):
+        time.sleep(CHUNK_DELAY * len(SENTENCES))
+        return SimpleNamespace(text="".join(SENTENCES))
+
+
+async def fake_synthesize_speech(text, model=server.TTS_MODEL):
+    await asyncio.sleep(0.2 + TTS_SECONDS_PER_CHAR * len(text))
+    return b"RIFF" + text.encode()
+
+
+class RecordingWebSocket:
+    def __init__(self):
+        self.state = SimpleNamespace(name="OPEN")
+        self.frames = []
+        self.start = time.perf_counter()
+
+    async def send(self, message):
+        self.frames.append((time.perf_counter() - self.start, json.loads(message)))
+
+
+class LeavingWebSocket(RecordingWebSocket):
+    """Disconnects as soon as the first audio arrives"""
+    async def send(self, message):
+        await super().send(message)
+        if self.frames[-1][1].get("audio"):
+            self.state = SimpleNamespace(name="CLOSED")
+
+
+def install_fakes():
+    client = server.GeminiClient("fake-key", server.PREFERRED_GEMINI_MODELS)
+    client.client = SimpleNamespace(models=FakeModels())
+    client.initialized = True
+    client.synthesize_speech = fake_synthesize_speech
+    server.gemini_client = client
+
+
+async def run(pipeline_enabled):
+    server.TTS_PIPELINE_ENABLED = pipeline_enabled
+    websocket = RecordingWebSocket()
+    await server.process_text_message(websocket, "tell me a story", f"s{int(pipeline_enabled)}", enable_tts=True)
+    audio_times = [t for t, f in websocket.frames if f.get("audio")]
+    return websocket.frames, audio_times[0] if audio_times else None
+
+
+async def main():
+    ok = True
+    install_fakes()
+    fd, server.LOG_FILE = tempfile.mkstemp(suffix=".csv")
+    server.history_store = None  # keep test rows out of the history index
+    os.close(fd)
+    audio_dir = tempfile.TemporaryDirectory()
+    server.AUDIO_LOG_DIR = audio_dir.name
+    server.tts_cache = server.TTSAudioCache(os.path.join(audio_dir.name, "tts_cache"))
+
+    try:
+        _, whole_first_audio = await run(pipeline_enabled=False)
+        frames, first_audio = await run(pipeline_enabled=True)
+        await server.process_text_message(LeavingWebSocket(), "then leave", "s-gone", enable_tts=True)
+        await server.chat_log.flush()
+        with open(server.LOG_FILE, newline="", encoding="utf-8") as f:
+            logged = [row for row in csv.reader(f) if row[1:3] == ["s-gone", "then leave"]]
+    finally:
+        await asyncio.sleep(0.1)
+        os.unlink(server.LOG_FILE)
+        audio_dir.cleanup()
+
+    print(f"⏱️  Time to first audio: whole reply {whole_first_audio:.2f}s, pipelined {first_audio:.2f}s")
+    if first_audio < whole_first_audio / 2:
+        print("✅ First sentence is spoken before the reply finishes generating")
+    else:
+        print("❌ Pipelining did not reduce time to first audio")
+        ok = False
+
+    chunks = [f for _, f in frames if f["type"] == "audio_chunk"]
+    spoken = [base64.b64decode(f["audio"])[4:].decode() for f in chunks if f.get("audio")]
+    if [c["seq"] for c in chunks] == list(range(len(chunks))) and chunks[-1].get("final") \
+            and " ".join(spoken) == "".join(SENTENCES).strip():
+        print(f"✅ {len(spoken)} audio_chunk frames arrived in sentence order, then a final marker")
+    else:
+        print(f"❌ Audio chunks out of order or incomplete: {spoken}")
+        ok = False
+
+    text_frames = [f for _, f in frames if f["type"] == "text"]
+    if text_frames and text_frames[0].get("audio_stream") and "audio" not in text_frames[0]:
+        print("✅ Final text frame points at the audio stream instead of embedding audio")
+    else:
+        print(f"❌ Unexpected text frame: {text_frames}")
+        ok = False
+
+    if len(logged) == 1 and logged[0][3].startswith(SENTENCES[0].strip()):
+        print("✅ A client that left mid-reply still has its turn in the chat log")
+    else:
+        print(f"❌ Chat log rows for the abandoned turn: {logged}")
+        ok = False
+
+    print("🎉 All TTS pipeline tests passed" if ok else "❌ TTS pipeline tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing sentence-pipelined TTS...")
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Offline test for the local TTS worker pool, using a fake engine so no speech
+drivers are needed: throughput scales with workers, audio comes back in
+memory, and crashed or hung workers are replaced.
+"""
+
+import asyncio
+import os
+import time
+import wave
+
+from tts_worker import TTSWorkerError, TTSWorkerPool
+
+JOB_SECONDS = 0.2  # CPU time the fake engine burns per job
+
+
+class FakeEngine:
+    """Mimics the pyttsx3 save_to_file/runAndWait API; burns CPU like a real synthesizer"""
+    def __init__(self):
+        self.pending = None
+
+    def save_to_file(self, text, path):
+        self.pending = (text, path)
+
+    def runAndWait(self):
+        text, path = self.pending
+        if text == "crash":
+            os._exit(1)
+        if text == "hang":
+            time.sleep(3600)
+        deadline = time.process_time() + JOB_SECONDS
+        while time.process_time() < deadline:
+            pass
+        with wave.open(path, 'wb') as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(16000)
+            wf.writeframes(b"\x00\x00" * 160 * len(text))
+
+
+def fake_engine_factory(rate, volume):
+    return FakeEngine()
+
+
+async def throughput(workers, jobs=8):
+    pool = TTSWorkerPool(workers=workers, engine_factory=fake_engine_factory)
+    await pool.start()
+    start = time.perf_counter()
+    audio = await asyncio.gather(*(pool.synthesize(f"sentence number {i}") for i in range(jobs)))
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    return elapsed, audio
+
+
+async def main():
+    ok = True
+    cores = os.cpu_count() or 1
+    workers = max(2, min(4, cores))
+
+    one, audio = await throughput(1)
+    many, _ = await throughput(workers)
+    print(f"📊 8 jobs: 1 worker {one:.2f}s, {workers} workers {many:.2f}s ({one / many:.1f}x, {cores} cores)")
+    if all(a[:4] == b"RIFF" for a in audio):
+        print("✅ Audio returned in memory as WAV bytes")
+    else:
+        print("❌ Unexpected audio payload")
+        ok = False
+    if cores == 1 or many < one * 0.75:
+        print("✅ Throughput scales with worker processes")
+    else:
+        print("❌ More workers did not increase throughput")
+        ok = False
+
+    pool = TTSWorkerPool(workers=2, job_timeout=1.0, engine_factory=fake_engine_factory)
+    for poison in ["crash", "hang"]:
+        try:
+            await pool.synthesize(poison)
+            print(f"❌ '{poison}' job did not fail")
+            ok = False
+        except TTSWorkerError as e:
+            print(f"📨 '{poison}' job failed as expected: {e}")
+    unsendable = 0
+    for _ in range(3):  # more jobs than workers: a worker kept out of the pool would hang the last one
+        try:
+            await asyncio.wait_for(pool.synthesize(lambda: None), 5.0)
+        except asyncio.TimeoutError:
+            break
+        except Exception:
+            unsendable += 1
+    try:
+        results = await asyncio.wait_for(asyncio.gather(*(pool.synthesize("still working") for _ in range(4))), 30.0)
+    except asyncio.TimeoutError:
+        results = []
+    stats = pool.stats()
+    pool.shutdown()
+    if stats["recycled"] == 2 and stats["workers"] == 2 and len(results) == 4:
+        print(f"✅ Crashed and hung workers were replaced: {stats}")
+    else:
+        print(f"❌ Worker recycling failed: {stats}")
+        ok = False
+    if unsendable == 3 and stats["idle"] == 2:
+        print("✅ Jobs that cannot be sent to a worker fail without losing the worker")
+    else:
+        print(f"❌ {unsendable}/3 unsendable jobs failed cleanly, {stats['idle']} idle workers left")
+        ok = False
+
+    print("🎉 All TTS worker tests passed" if ok else "❌ TTS worker tests failed")
+
+
+if __name__ == "__main__":
+    print("🧪 Testing TTS worker pool...")
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Local text-to-speech worker pool.
+
+pyttsx3 engines are not thread-safe, so instead of sharing one engine across
+threads each worker process owns its own engine and handles one job at a time.
+The shared WorkerPool hands jobs to idle workers, enforces a per-job timeout,
+and replaces workers that crash or hang. Audio comes back over the worker's
+pipe as bytes.
+"""
+
+import logging
+import os
+import tempfile
+
+from worker_pool import WorkerPool
+
+log = logging.getLogger("voicebot.tts")
+
+
+class TTSWorkerError(Exception):
+    """A TTS job failed, timed out, or the worker died while running it."""
+
+
+def create_pyttsx3_engine(rate, volume):
+    """Default engine factory: a configured pyttsx3 engine"""
+    import pyttsx3
+    engine = pyttsx3.init()
+    engine.setProperty('rate', rate)  # Speed of speech
+    engine.setProperty('volume', volume)  # Volume level (0.0 to 1.0)
+
+    # Get available voices and set a good one
+    voices = engine.getProperty('voices')
+    if voices:
+        # Try to find a female voice, otherwise use the first available
+        for voice in voices:
+            if 'female' in voice.name.lower() or 'zira' in voice.name.lower():
+                engine.setProperty('voice', voice.id)
+                break
+        else:
+            engine.setProperty('voice', voices[0].id)
+    return engine
+
+
+def worker_main(conn, engine_factory, rate, volume):
+    """Worker process loop: build one engine, then synthesize jobs until told to stop"""
+    try:
+        engine = engine_factory(rate, volume)
+    except Exception as e:
+        conn.send(("ready", False, f"Error initializing TTS engine: {e}"))
+        return
+    conn.send(("ready", True, None))
+
+    # pyttsx3 can only render to a file; each worker reuses one private scratch
+    # file and ships the bytes back over the pipe
+    scratch_path = os.path.join(tempfile.gettempdir(), f"tts_worker_{os.getpid()}.wav")
+    try:
+        while True:
+            try:
+                job = conn.recv()
+            except EOFError:
+                break
+            if job is None:
+                break
+            job_id, text = job
+            try:
+                engine.save_to_file(text, scratch_path)
+                engine.runAndWait()
+                with open(scratch_path, 'rb') as audio_file:
+                    conn.send((job_id, audio_file.read(), None))
+            except Exception as e:
+                conn.send((job_id, None, f"Error in text-to-speech: {e}"))
+    finally:
+        try:
+            os.unlink(scratch_path)
+        except OSError:
+            pass
+
+
+class TTSWorkerPool(WorkerPool):
+    """Pool of TTS worker processes, each owning one pyttsx3 engine."""
+    label = "TTS"
+    error_type = TTSWorkerError
+    log = log
+
+    def __init__(self, workers: int = 2, job_timeout: float = 30.0, rate: int = 150, volume: float = 0.9,
+                 engine_factory=create_pyttsx3_engine, start_timeout: float = 30.0, start_method: str = None):
+        super().__init__(workers, job_timeout, start_timeout, start_method, thread_name_prefix="tts-worker-io")
+        self.rate = rate
+        self.volume = volume
+        self.engine_factory = engine_factory
+        self.jobs_done = 0
+
+    def _worker_target(self):
+        return worker_main, (self.engine_factory, self.rate, self.volume)
+
+    async def synthesize(self, text: str) -> bytes:
+        """Render text to WAV bytes on an idle worker"""
+        audio, error = await self._submit(text)
+        if error:
+            raise TTSWorkerError(error)
+        self.jobs_done += 1
+        return audio
+
+    def stats(self) -> dict:
+        return {**super().stats(), "jobs_done": self.jobs_done}
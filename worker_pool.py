@@ -0,0 +1,232 @@
+"""
+Shared machinery of the local worker-process pools (TTS, STT, audio decoding).
+
+Each pool runs a few long-lived processes that set up their engine, model or
+decoder once and then serve jobs over a Pipe. WorkerPool starts them on
+first use, hands jobs to idle workers, runs the blocking pipe round-trip on
+a private I/O thread per worker so the event loop never blocks, and kills
+and replaces a worker that times out or crashes before it takes another
+job. Subclasses name the worker entry point and its arguments and add the
+public job method; Worker subclasses change the wire format of a job.
+
+A worker entry point is called as target(conn, *args). It reports
+("ready", True, detail) or ("ready", False, error) once set up, then answers
+each (job_id, payload) with (job_id, result, error) until it receives None.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+
+class WorkerError(Exception):
+    """A job failed, timed out, or the worker died while running it."""
+
+
+class Worker:
+    """Parent-side handle of one worker process."""
+    job_name = "job"  # what a request is called in error messages
+
+    def __init__(self, ctx, target, args, label: str = "Worker", error_type=WorkerError):
+        self.label = label[:1].upper() + label[1:]
+        self.error_type = error_type
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=target, args=(child_conn,) + tuple(args), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.detail = None  # what the worker reported once ready
+
+    def wait_ready(self, timeout):
+        if not self.conn.poll(timeout):
+            raise self.error_type(f"{self.label} worker did not start in time")
+        _, ok, detail = self.conn.recv()
+        if not ok:
+            raise self.error_type(detail)
+        self.detail = detail
+
+    def request(self, job_id, payload, timeout):
+        """Blocking round-trip for one job; raises error_type on timeout or crash"""
+        try:
+            self._send_job(job_id, payload)
+            if not self.conn.poll(timeout):
+                raise self.error_type(f"{self.label} {self.job_name} timed out after {timeout:.0f}s")
+            reply_id, result, error = self._recv_reply()
+        except (EOFError, OSError) as e:
+            raise self.error_type(f"{self.label} worker died: {str(e) or 'connection closed'}")
+        if reply_id != job_id:
+            raise self.error_type(f"{self.label} worker answered the wrong {self.job_name}")
+        return result, error
+
+    def _send_job(self, job_id, payload):
+        self.conn.send((job_id, payload))
+
+    def _recv_reply(self):
+        return self.conn.recv()
+
+    def stop(self, timeout=1.0):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1.0)
+        self.conn.close()
+
+
+class WorkerPool:
+    """Pool of worker processes with an idle queue, timeouts and recycling.
+
+    Subclasses set label, error_type and log, implement _worker_target()
+    returning (target, args), and may set worker_type to a Worker subclass.
+    """
+    label = "Worker"
+    error_type = WorkerError
+    worker_type = Worker
+    log = logging.getLogger("voicebot")
+
+    def __init__(self, workers: int, job_timeout: float, start_timeout: float, start_method: str = None,
+                 thread_name_prefix: str = "worker-io"):
+        self.size = workers
+        self.job_timeout = job_timeout
+        self.start_timeout = start_timeout
+        self._ctx = multiprocessing.get_context(start_method)
+        self._io = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix)
+        self._idle = None
+        self._workers = []
+        self._start_lock = None
+        self._job_ids = itertools.count()
+        self.error = None  # set if no worker can be started at all
+        self.recycled = 0
+
+    def _worker_target(self):
+        raise NotImplementedError
+
+    def _describe(self) -> str:
+        """How the workers are named in the start-up log line"""
+        return self.label
+
+    def _spawn(self):
+        target, args = self._worker_target()
+        worker = self.worker_type(self._ctx, target, args, self.label, self.error_type)
+        try:
+            worker.wait_ready(self.start_timeout)
+        except Exception:
+            worker.kill()
+            raise
+        return worker
+
+    async def start(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._idle is not None or self.error:
+                return
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(*(loop.run_in_executor(self._io, self._spawn)
+                                             for _ in range(self.size)), return_exceptions=True)
+            workers = [r for r in results if isinstance(r, Worker)]
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                for worker in workers:
+                    worker.stop()
+                self.error = str(errors[0])
+                self.log.error("Error starting %s workers: %s", self.label, self.error)
+                return
+            self._workers = workers
+            self._idle = asyncio.Queue()
+            for worker in workers:
+                self._idle.put_nowait(worker)
+            self._started()
+            self.log.info("Started %d %s worker processes", self.size, self._describe())
+
+    def _started(self):
+        """Called once the workers are up, before the pool takes jobs"""
+
+    @property
+    def available(self) -> bool:
+        return not self.error
+
+    async def _submit(self, payload):
+        """Run one job on an idle worker; returns the worker's (result, error)"""
+        await self.start()
+        if self.error:
+            raise self.error_type(self.error)
+        worker = await self._idle.get()
+        if worker is None:
+            # Every worker is gone; pass the wake-up on to the next waiter
+            self._idle.put_nowait(None)
+            raise self.error_type(self.error)
+        job = asyncio.get_running_loop().run_in_executor(
+            self._io, worker.request, next(self._job_ids), payload, self.job_timeout)
+        try:
+            reply = await asyncio.shield(job)
+        except asyncio.CancelledError:
+            # The worker is still busy with this job; return it to the pool once it is done
+            asyncio.ensure_future(self._release(worker, job))
+            raise
+        except self.error_type:
+            await self._release(worker, job)
+            raise
+        except Exception:
+            # The job never reached the worker (e.g. its payload could not be pickled)
+            await self._release(worker, job)
+            raise
+        self._idle.put_nowait(worker)
+        return reply
+
+    async def _release(self, worker, job):
+        """Put a worker back after its job finished, replacing it if the job killed or hung it"""
+        try:
+            await job
+        except self.error_type as e:
+            worker = await self._recycle(worker, e)
+        except Exception:
+            pass
+        self._return(worker)
+
+    async def _recycle(self, worker, error):
+        """Replace a worker that timed out or crashed; returns the new worker, or None"""
+        self.log.warning("Recycling %s worker %s: %s", self.label, worker.process.pid, error)
+        return await asyncio.get_running_loop().run_in_executor(self._io, self._replace, worker)
+
+    def _return(self, worker):
+        if worker is not None:
+            self._idle.put_nowait(worker)
+        elif self.error:
+            self._idle.put_nowait(None)
+
+    def _replace(self, worker):
+        worker.kill()
+        self._workers.remove(worker)
+        self.recycled += 1
+        try:
+            new_worker = self._spawn()
+        except Exception as e:
+            # Keep serving with fewer workers rather than failing every job
+            self.log.error("Could not replace %s worker: %s", self.label, e)
+            if not self._workers:
+                self.error = f"All {self.label} workers failed: {e}"
+            return None
+        self._workers.append(new_worker)
+        return new_worker
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "recycled": self.recycled,
+            "error": self.error,
+        }
+
+    def shutdown(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        self._io.shutdown(wait=False)